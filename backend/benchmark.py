@@ -0,0 +1,548 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the analysis pipeline
+قياس أداء خط التحليل
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from models.analyzer import SpermAnalyzer
+from models.detectors import DetectionBatch
+from models.trackers import TRACKERS, create_tracker
+from utils.cpu_budget import plan_cpu_budget
+from utils.frame_store import load_frame_store
+from utils.worker_pool import AnalysisWorkerPool, run_video_analysis
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def benchmark_batch_sizes(video_path, batch_sizes, model_path='yolov8n.pt', max_frames=120,
+                          backend='ultralytics'):
+    """
+    Measure detector throughput (frames/s) for each batch size
+    
+    Args:
+        video_path: Path to the benchmark video
+        batch_sizes: Batch sizes to compare
+        model_path: Model weights
+        max_frames: Number of frames to decode for the benchmark
+        backend: Detector backend (ultralytics, onnx, openvino)
+    """
+    analyzer = SpermAnalyzer(model_path=model_path, detector_backend=backend)
+    return analyzer.benchmark_batch_sizes(video_path, batch_sizes, max_frames=max_frames)
+
+def synthetic_tracks(num_cells=30, num_frames=300, width=640, height=480, box_size=12,
+                     speed=3.0, dropout=0.05, jitter=1.0, seed=0):
+    """
+    Generate ground-truth cell trajectories with noisy, partially missing detections
+    
+    Args:
+        num_cells: Number of simulated cells
+        num_frames: Number of frames
+        width: Frame width
+        height: Frame height
+        box_size: Cell box size in pixels
+        speed: Mean cell speed in pixels per frame
+        dropout: Probability that a detection is missed
+        jitter: Standard deviation of the box noise in pixels
+        seed: Random seed
+    """
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform([box_size, box_size], [width - box_size, height - box_size], (num_cells, 2))
+    headings = rng.uniform(0, 2 * np.pi, num_cells)
+    half = box_size / 2
+    
+    frames = []
+    for _ in range(num_frames):
+        # Smooth random walk that bounces off the frame borders
+        headings += rng.normal(0, 0.2, num_cells)
+        positions += speed * np.stack([np.cos(headings), np.sin(headings)], axis=1)
+        for axis, limit in ((0, width), (1, height)):
+            outside = (positions[:, axis] < half) | (positions[:, axis] > limit - half)
+            headings[outside] = np.pi - headings[outside] if axis == 0 else -headings[outside]
+            positions[:, axis] = np.clip(positions[:, axis], half, limit - half)
+        
+        image = np.full((height, width, 3), 40, dtype=np.uint8)
+        for cell_id, (x, y) in enumerate(positions):
+            cv2.ellipse(image, (int(x), int(y)), (int(half), int(half * 0.6)),
+                        np.degrees(headings[cell_id]), 0, 360, (200, 200, 200), -1)
+        
+        ground_truth = np.flatnonzero(rng.random(num_cells) >= dropout)
+        centers = positions[ground_truth] + rng.normal(0, jitter, (len(ground_truth), 2))
+        detections = DetectionBatch(np.concatenate([centers - half, centers + half], axis=1),
+                                    rng.uniform(0.6, 0.95, len(ground_truth)))
+        frames.append((image, detections, ground_truth))
+    
+    return frames
+
+def count_id_switches(assignments):
+    """
+    Count identity switches: a ground-truth cell matched to a different track than before
+    
+    Args:
+        assignments: Per frame, a dict mapping ground-truth id to track id
+    """
+    last_track = {}
+    switches = 0
+    for frame_assignments in assignments:
+        for cell_id, track_id in frame_assignments.items():
+            if cell_id in last_track and last_track[cell_id] != track_id:
+                switches += 1
+            last_track[cell_id] = track_id
+    return switches
+
+def benchmark_trackers(trackers, num_cells=30, num_frames=300, seed=0):
+    """
+    Compare tracker throughput and identity switches on synthetic trajectories
+    
+    Args:
+        trackers: Tracker names (deepsort, iou)
+        num_cells: Number of simulated cells
+        num_frames: Number of frames
+        seed: Random seed
+    """
+    frames = synthetic_tracks(num_cells=num_cells, num_frames=num_frames, seed=seed)
+    report = []
+    
+    for name in trackers:
+        tracker = create_tracker(name)
+        assignments = []
+        track_updates = 0
+        track_ids = set()
+        
+        start_time = time.perf_counter()
+        for image, detections, ground_truth in frames:
+            tracks = tracker.update(detections, image)
+            track_updates += len(tracks)
+            
+            # Match each confirmed track to the nearest ground-truth detection
+            frame_assignments = {}
+            if tracks and len(detections):
+                centers = np.array([(t.ltrb[:2] + t.ltrb[2:]) / 2 for t in tracks])
+                distance = np.linalg.norm(centers[:, None] - detections.centers[None], axis=2)
+                for track_index, det_index in enumerate(distance.argmin(axis=1)):
+                    if distance[track_index, det_index] < 6:
+                        cell_id = int(ground_truth[det_index])
+                        frame_assignments[cell_id] = tracks[track_index].track_id
+            assignments.append(frame_assignments)
+            track_ids.update(t.track_id for t in tracks)
+        elapsed = time.perf_counter() - start_time
+        
+        report.append({
+            'tracker': name,
+            'frames': len(frames),
+            'cells': num_cells,
+            'unique_track_ids': len(track_ids),
+            'id_switches': count_id_switches(assignments),
+            'processing_time': round(elapsed, 3),
+            'frames_per_second': round(len(frames) / elapsed, 2) if elapsed > 0 else 0,
+            'tracks_per_second': round(track_updates / elapsed, 2) if elapsed > 0 else 0
+        })
+        logger.info(f"Tracker {name}: {report[-1]['tracks_per_second']} tracks/s, "
+                    f"{report[-1]['id_switches']} ID switches")
+    
+    return report
+
+def write_synthetic_video(path, num_cells=30, num_frames=150, fps=30.0, seed=0):
+    """
+    Write a video of simulated moving cells
+    
+    Args:
+        path: Output path (.avi)
+        num_cells: Number of simulated cells
+        num_frames: Number of frames
+        fps: Frame rate
+        seed: Random seed
+    """
+    frames = synthetic_tracks(num_cells=num_cells, num_frames=num_frames, seed=seed)
+    height, width = frames[0][0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+    for image, _, _ in frames:
+        writer.write(image)
+    writer.release()
+    return path
+
+def frame_columns(results):
+    """Per-frame columns of an analysis, read from its frames file"""
+    frame_store = load_frame_store(results.get('frames_path'))
+    if frame_store is None:
+        return {}
+    return {name: column.tolist() for name, column in frame_store.columns().items()}
+
+def comparable_results(results):
+    """Analysis output without timing fields, for comparing runs"""
+    return {
+        'summary': results['summary'],
+        'tracks': results['tracks'],
+        'frames': frame_columns(results),
+        'statistics': results['statistics']
+    }
+
+def benchmark_sessions(jobs=4, videos=None, model_path='yolov8n.pt', backend='ultralytics',
+                       tracker='iou', confidence=0.25, num_frames=150):
+    """
+    Run several analyses at once on one analyzer and check them against serial runs
+    
+    Each job runs in its own AnalysisSession; the results of the concurrent
+    runs must be identical to the same videos analyzed one after another.
+    
+    Args:
+        jobs: Number of concurrent analyses
+        videos: Videos to analyze (default: synthetic videos, one per job)
+        model_path: Model weights
+        backend: Detector backend
+        tracker: Tracker name
+        confidence: Detection confidence threshold
+        num_frames: Frames per synthetic video
+    """
+    with tempfile.TemporaryDirectory(prefix='sessions_') as temp_dir:
+        if not videos:
+            videos = [
+                write_synthetic_video(os.path.join(temp_dir, f'synthetic_{seed}.avi'),
+                                      num_frames=num_frames, seed=seed)
+                for seed in range(jobs)
+            ]
+        videos = [videos[i % len(videos)] for i in range(jobs)]
+        
+        analyzer = SpermAnalyzer(model_path=model_path, detector_backend=backend,
+                                 tracker=tracker, confidence_threshold=confidence)
+        # Job-specific parameters: a leaked setting would show up as a mismatch
+        parameters = [{'confidence_threshold': confidence, 'track_window': 0,
+                       'batch_size': 1 + i % 4} for i in range(jobs)]
+        
+        # Serial reference (the first run also loads the model)
+        serial = []
+        serial_start = time.perf_counter()
+        for i, (video, params) in enumerate(zip(videos, parameters)):
+            serial.append(analyzer.analyze_video(
+                video, params, frames_path=os.path.join(temp_dir, f'serial_{i}_frames.npz')))
+        serial_time = time.perf_counter() - serial_start
+        
+        frames_paths = [os.path.join(temp_dir, f'concurrent_{i}_frames.npz') for i in range(jobs)]
+        concurrent_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            concurrent = list(executor.map(analyzer.analyze_video, videos, parameters, frames_paths))
+        concurrent_time = time.perf_counter() - concurrent_start
+        
+        mismatches = [
+            i for i, (a, b) in enumerate(zip(serial, concurrent))
+            if comparable_results(a) != comparable_results(b)
+        ]
+    frames = sum(result['summary']['total_frames'] for result in serial)
+    report = {
+        'jobs': jobs,
+        'tracker': tracker,
+        'frames': frames,
+        'tracks': [len(result['tracks']) for result in serial],
+        'matches_serial': not mismatches,
+        'mismatched_jobs': mismatches,
+        'serial_time': round(serial_time, 3),
+        'concurrent_time': round(concurrent_time, 3),
+        'serial_frames_per_second': round(frames / serial_time, 2) if serial_time > 0 else 0,
+        'concurrent_frames_per_second': round(frames / concurrent_time, 2) if concurrent_time > 0 else 0
+    }
+    logger.info(f"{jobs} concurrent sessions: results "
+                f"{'match' if not mismatches else 'DO NOT match'} serial runs")
+    return report
+
+async def _run_pool(pool, videos, parameters):
+    """Warm up a worker pool, then analyze all videos through it at once"""
+    await pool.warm_up()
+    start_time = time.perf_counter()
+    results = await asyncio.gather(*[
+        pool.run_analysis(run_video_analysis, video, parameters) for video in videos
+    ])
+    return results, time.perf_counter() - start_time
+
+def benchmark_scaling(job_counts, videos=None, model_path='yolov8n.pt', backend='ultralytics',
+                      tracker='iou', videos_per_job=2, num_frames=150, pin=True):
+    """
+    Aggregate frames/s versus the number of concurrent analyses under the CPU budget
+    
+    For each job count, a process pool with one core slice per worker
+    analyzes videos_per_job videos per worker concurrently.
+    
+    Args:
+        job_counts: Numbers of concurrent analyses to compare
+        videos: Videos to analyze (default: synthetic videos)
+        model_path: Model weights
+        backend: Detector backend
+        tracker: Tracker name
+        videos_per_job: Videos queued per worker
+        num_frames: Frames per synthetic video
+        pin: Pin each worker to its cores
+    """
+    # Worker processes read their settings from the environment
+    os.environ['SPERM_MODEL_PATH'] = model_path
+    os.environ['SPERM_DETECTOR_BACKEND'] = backend
+    os.environ['SPERM_TRACKER'] = tracker
+    
+    report = []
+    with tempfile.TemporaryDirectory(prefix='scaling_') as temp_dir:
+        if not videos:
+            videos = [
+                write_synthetic_video(os.path.join(temp_dir, f'synthetic_{seed}.avi'),
+                                      num_frames=num_frames, seed=seed)
+                for seed in range(2)
+            ]
+        
+        for jobs in job_counts:
+            plan = plan_cpu_budget(jobs=jobs)
+            pool = AnalysisWorkerPool(executor_type='process', preload_models=True,
+                                      cpu_plan=plan, pin_cores=pin)
+            queued = [videos[i % len(videos)] for i in range(jobs * videos_per_job)]
+            try:
+                results, elapsed = asyncio.run(_run_pool(pool, queued, {'tracker': tracker}))
+            finally:
+                pool.shutdown()
+            
+            frames = sum(result['summary']['total_frames'] for result in results)
+            report.append({
+                'jobs': jobs,
+                'threads_per_job': [cpu_slice['threads'] for cpu_slice in plan['slices']],
+                'cores': [cpu_slice['cores'] for cpu_slice in plan['slices']],
+                'videos': len(queued),
+                'frames': frames,
+                'processing_time': round(elapsed, 3),
+                'frames_per_second': round(frames / elapsed, 2) if elapsed > 0 else 0
+            })
+            logger.info(f"{jobs} concurrent jobs: {report[-1]['frames_per_second']} frames/s")
+    
+    return report
+
+def _max_differences(serial, segmented):
+    """Largest absolute difference per summary field and per-frame column"""
+    summary = {
+        key: round(abs(value - segmented['summary'][key]), 4)
+        for key, value in serial['summary'].items()
+        if isinstance(value, (int, float)) and value != segmented['summary'][key]
+    }
+    serial_frames = frame_columns(serial)
+    segmented_frames = frame_columns(segmented)
+    series = {
+        key: round(float(np.abs(np.subtract(values, segmented_frames[key])).max()), 4)
+        for key, values in serial_frames.items()
+        if values and len(values) == len(segmented_frames.get(key, ()))
+    }
+    return summary, series
+
+def benchmark_segments(segment_counts, videos=None, model_path='yolov8n.pt', backend='ultralytics',
+                       tracker='iou', confidence=0.25, num_frames=600, threads=False):
+    """
+    Segment-parallel analysis of one video versus a serial run
+    
+    The segments only detect and one tracker runs over their detections
+    in frame order, so the merged result must be identical to the serial
+    run for any number of segments; the report still lists the largest
+    differences and the track counts.
+    
+    Args:
+        segment_counts: Numbers of segments to compare
+        videos: Videos to analyze (default: one synthetic video)
+        model_path: Model weights
+        backend: Detector backend
+        tracker: Tracker name
+        confidence: Detection confidence threshold
+        num_frames: Frames of the synthetic video
+        threads: Run segments in threads instead of processes
+    """
+    report = []
+    with tempfile.TemporaryDirectory(prefix='segments_') as temp_dir:
+        if not videos:
+            videos = [write_synthetic_video(os.path.join(temp_dir, 'synthetic.avi'),
+                                            num_frames=num_frames)]
+        
+        analyzer = SpermAnalyzer(model_path=model_path, detector_backend=backend,
+                                 tracker=tracker, confidence_threshold=confidence)
+        for video in videos:
+            serial_start = time.perf_counter()
+            serial = analyzer.analyze_video(video, {},
+                                            frames_path=os.path.join(temp_dir, 'serial_frames.npz'))
+            serial_time = time.perf_counter() - serial_start
+            
+            for segments in segment_counts:
+                parameters = {'segments': segments}
+                frames_path = os.path.join(temp_dir, f'segmented_{segments}_frames.npz')
+                start_time = time.perf_counter()
+                if threads:
+                    with ThreadPoolExecutor(max_workers=segments) as executor:
+                        segmented = analyzer.analyze_video_segments(video, parameters,
+                                                                    frames_path=frames_path,
+                                                                    executor=executor)
+                else:
+                    segmented = analyzer.analyze_video_segments(video, parameters,
+                                                                frames_path=frames_path)
+                elapsed = time.perf_counter() - start_time
+                
+                summary_diff, series_diff = _max_differences(serial, segmented)
+                frames = serial['summary']['total_frames']
+                report.append({
+                    'video': os.path.basename(video),
+                    'segments': len(segmented['performance']['segments']),
+                    'frames': frames,
+                    'identical': comparable_results(serial) == comparable_results(segmented),
+                    'serial_tracks': serial['summary']['total_sperm_detected'],
+                    'segmented_tracks': segmented['summary']['total_sperm_detected'],
+                    'tracking_time': segmented['performance']['tracking_time'],
+                    'summary_differences': summary_diff,
+                    'frame_differences': series_diff,
+                    'serial_time': round(serial_time, 3),
+                    'segmented_time': round(elapsed, 3),
+                    'serial_frames_per_second': round(frames / serial_time, 2) if serial_time > 0 else 0,
+                    'segmented_frames_per_second': round(frames / elapsed, 2) if elapsed > 0 else 0
+                })
+                logger.info(f"{segments} segments: {report[-1]['segmented_tracks']} tracks "
+                            f"(serial {report[-1]['serial_tracks']}), "
+                            f"{report[-1]['segmented_frames_per_second']} frames/s")
+    
+    return report
+
+def benchmark_reanalysis(thresholds, videos=None, model_path='yolov8n.pt', backend='ultralytics',
+                         tracker='iou', confidence=0.25, num_frames=300):
+    """
+    Re-deriving results from the raw detections versus a full analysis
+    
+    Re-deriving with the analysis parameters must reproduce the analysis;
+    with each other motility threshold it must match a full analysis run
+    with that threshold.
+    
+    Args:
+        thresholds: Motility thresholds to re-derive with
+        videos: Videos to analyze (default: one synthetic video)
+        model_path: Model weights
+        backend: Detector backend
+        tracker: Tracker name
+        confidence: Detection confidence threshold
+        num_frames: Frames of the synthetic video
+    """
+    report = []
+    with tempfile.TemporaryDirectory(prefix='reanalysis_') as temp_dir:
+        if not videos:
+            videos = [write_synthetic_video(os.path.join(temp_dir, 'synthetic.avi'),
+                                            num_frames=num_frames)]
+        
+        analyzer = SpermAnalyzer(model_path=model_path, detector_backend=backend,
+                                 tracker=tracker, confidence_threshold=confidence)
+        raw_path = os.path.join(temp_dir, 'raw.npz')
+        for video in videos:
+            for threshold in [None, *thresholds]:
+                parameters = {} if threshold is None else {'motility_threshold': threshold}
+                start_time = time.perf_counter()
+                full = analyzer.analyze_video(video, parameters,
+                                              frames_path=os.path.join(temp_dir, 'full_frames.npz'),
+                                              raw_path=raw_path if threshold is None else None)
+                full_time = time.perf_counter() - start_time
+                
+                start_time = time.perf_counter()
+                derived = analyzer.reanalyze(raw_path, parameters,
+                                             frames_path=os.path.join(temp_dir, 'derived_frames.npz'))
+                derive_time = time.perf_counter() - start_time
+                
+                summary_diff, series_diff = _max_differences(full, derived)
+                report.append({
+                    'video': os.path.basename(video),
+                    'motility_threshold': threshold,
+                    'raw_bytes': os.path.getsize(raw_path),
+                    'average_motility_percentage': derived['summary']['average_motility_percentage'],
+                    'summary_differences': summary_diff,
+                    'frame_differences': series_diff,
+                    'analysis_time': round(full_time, 3),
+                    'reanalysis_time': round(derive_time, 4),
+                    'speedup': round(full_time / derive_time, 1) if derive_time > 0 else 0
+                })
+                logger.info(f"Motility threshold {threshold}: re-derived in "
+                            f"{report[-1]['reanalysis_time']}s (analysis {report[-1]['analysis_time']}s)")
+    
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sperm analysis pipeline")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    
+    batch_parser = subparsers.add_parser('batch-sizes', help='Frames/s per detector batch size')
+    batch_parser.add_argument('video', type=str, help='Benchmark video')
+    batch_parser.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='Batch sizes')
+    batch_parser.add_argument('--weights', type=str, default='yolov8n.pt', help='Model weights')
+    batch_parser.add_argument('--max-frames', type=int, default=120, help='Frames to benchmark')
+    batch_parser.add_argument('--backend', type=str, default='ultralytics', help='Detector backend')
+    
+    tracker_parser = subparsers.add_parser('trackers', help='Tracks/s and ID switches per tracker')
+    tracker_parser.add_argument('--trackers', type=str, nargs='+', default=list(TRACKERS), help='Trackers')
+    tracker_parser.add_argument('--cells', type=int, default=30, help='Simulated cells')
+    tracker_parser.add_argument('--frames', type=int, default=300, help='Simulated frames')
+    tracker_parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    
+    session_parser = subparsers.add_parser('sessions', help='Concurrent analyses vs serial runs')
+    session_parser.add_argument('videos', type=str, nargs='*', help='Videos (default: synthetic)')
+    session_parser.add_argument('--jobs', type=int, default=4, help='Concurrent analyses')
+    session_parser.add_argument('--weights', type=str, default='yolov8n.pt', help='Model weights')
+    session_parser.add_argument('--backend', type=str, default='ultralytics', help='Detector backend')
+    session_parser.add_argument('--tracker', type=str, default='iou', help='Tracker')
+    session_parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    session_parser.add_argument('--frames', type=int, default=150, help='Frames per synthetic video')
+    
+    scaling_parser = subparsers.add_parser('scaling', help='Aggregate frames/s per number of concurrent jobs')
+    scaling_parser.add_argument('videos', type=str, nargs='*', help='Videos (default: synthetic)')
+    scaling_parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4], help='Concurrent jobs')
+    scaling_parser.add_argument('--weights', type=str, default='yolov8n.pt', help='Model weights')
+    scaling_parser.add_argument('--backend', type=str, default='ultralytics', help='Detector backend')
+    scaling_parser.add_argument('--tracker', type=str, default='iou', help='Tracker')
+    scaling_parser.add_argument('--videos-per-job', type=int, default=2, help='Videos queued per job')
+    scaling_parser.add_argument('--frames', type=int, default=150, help='Frames per synthetic video')
+    scaling_parser.add_argument('--no-pin', action='store_true', help='Do not pin workers to cores')
+    
+    segment_parser = subparsers.add_parser('segments', help='Segment-parallel analysis vs a serial run')
+    segment_parser.add_argument('videos', type=str, nargs='*', help='Videos (default: synthetic)')
+    segment_parser.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4], help='Segment counts')
+    segment_parser.add_argument('--weights', type=str, default='yolov8n.pt', help='Model weights')
+    segment_parser.add_argument('--backend', type=str, default='ultralytics', help='Detector backend')
+    segment_parser.add_argument('--tracker', type=str, default='iou', help='Tracker')
+    segment_parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    segment_parser.add_argument('--frames', type=int, default=600, help='Frames of the synthetic video')
+    segment_parser.add_argument('--threads', action='store_true', help='Run segments in threads')
+    
+    reanalysis_parser = subparsers.add_parser('reanalysis', help='Re-derived results vs full analyses')
+    reanalysis_parser.add_argument('videos', type=str, nargs='*', help='Videos (default: synthetic)')
+    reanalysis_parser.add_argument('--thresholds', type=float, nargs='+', default=[10, 40],
+                                   help='Motility thresholds')
+    reanalysis_parser.add_argument('--weights', type=str, default='yolov8n.pt', help='Model weights')
+    reanalysis_parser.add_argument('--backend', type=str, default='ultralytics', help='Detector backend')
+    reanalysis_parser.add_argument('--tracker', type=str, default='iou', help='Tracker')
+    reanalysis_parser.add_argument('--conf', type=float, default=0.25, help='Confidence threshold')
+    reanalysis_parser.add_argument('--frames', type=int, default=300, help='Frames of the synthetic video')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'batch-sizes':
+        report = benchmark_batch_sizes(args.video, args.sizes, args.weights, args.max_frames,
+                                       args.backend)
+    elif args.command == 'trackers':
+        report = benchmark_trackers(args.trackers, args.cells, args.frames, args.seed)
+    elif args.command == 'sessions':
+        report = benchmark_sessions(args.jobs, args.videos, args.weights, args.backend,
+                                    args.tracker, args.conf, args.frames)
+    elif args.command == 'scaling':
+        report = benchmark_scaling(args.jobs, args.videos, args.weights, args.backend, args.tracker,
+                                   args.videos_per_job, args.frames, not args.no_pin)
+    elif args.command == 'segments':
+        report = benchmark_segments(args.segments, args.videos, args.weights, args.backend,
+                                    args.tracker, args.conf, args.frames, args.threads)
+    elif args.command == 'reanalysis':
+        report = benchmark_reanalysis(args.thresholds, args.videos, args.weights, args.backend,
+                                      args.tracker, args.conf, args.frames)
+    
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    """
+    إعدادات التطبيق (يمكن تجاوزها بمتغيرات البيئة بالبادئة SPERM_)
+    """
+    model_config = SettingsConfigDict(env_prefix="SPERM_", env_file=".env", extra="ignore",
+                                      protected_namespaces=())
+
+    # Analysis worker pool
+    analysis_workers: int = 0  # concurrent analyses, 0 = from the host core count
+    analysis_executor: str = "process"  # process | thread
+    io_workers: int = 4
+
+    # CPU budget: each analysis worker gets a slice of cores and matching
+    # torch/OpenCV/BLAS thread counts
+    cpu_threads_per_job: int = 0  # 0 = automatic
+    cpu_reserved_cores: int = 0  # cores left to the API process
+    cpu_pinning: bool = True
+
+    # Detector
+    model_path: str = "yolov8n.pt"
+    detector_backend: str = "ultralytics"  # ultralytics | onnx | onnx-int8 | openvino
+    detector_threads: int = 0  # intra-op threads, 0 = backend default
+
+    # Model registry: configured models are loaded and warmed up in every
+    # analysis worker at startup; idle models are unloaded LRU past the budget
+    preload_models: bool = True
+    model_warmup_runs: int = 1
+    model_memory_budget_mb: int = 0  # 0 = no limit
+
+    # Calibrate the inference resolution per video (can be overridden per
+    # analysis with the "auto_resolution" parameter)
+    auto_resolution: bool = False
+
+    # Video decoding: ffmpeg subprocess (multithreaded) when installed,
+    # OpenCV otherwise. ffmpeg threads follow the worker's core slice.
+    video_decoder: str = "auto"  # auto | ffmpeg | opencv
+    decoder_threads: int = 0  # 0 = ffmpeg default
+    # Annotated videos (the "render_video" parameter) are encoded to H.264
+    # by an ffmpeg process fed through a pipe, mp4v through OpenCV otherwise
+    video_encoder: str = "auto"  # auto | ffmpeg | opencv
+
+    # Split each video into time segments whose detection runs in parallel
+    # on the workers; one tracker then runs over all detections in order,
+    # so results equal a serial run (can be overridden per analysis with
+    # the "segments" parameter)
+    analysis_segments: int = 0  # 0 or 1 = whole video in one job
+
+    # Results of identical uploads (same video content, model and
+    # parameters) are reused instead of analyzing again
+    result_cache_mb: int = 2048  # 0 = disabled
+    result_cache_dir: str = "results/cache"
+    
+    # Raw detections and track trajectories, keyed by video content, model
+    # and detection parameters; analyses that only change post-processing
+    # parameters (motility threshold, buckets, density) are re-derived from
+    # them without running detection
+    raw_results_mb: int = 4096  # 0 = disabled
+    raw_results_dir: str = "results/raw"
+    
+    # Live camera streams (/ws/live) are analyzed in the API process; frames
+    # arriving while one is analyzed replace the waiting frame
+    live_max_streams: int = 2
+    live_track_window: int = 300  # frames of track history kept per stream
+    
+    # Tracker (can be overridden per analysis with the "tracker" parameter)
+    tracker: str = "deepsort"  # deepsort | iou
+
+    # Per-frame results move to memory-mapped files past this many frames
+    frame_spill_rows: int = 100000
+    frame_spill_dir: Optional[str] = None  # None = system temp directory
+
+settings = Settings()
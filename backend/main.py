@@ -1,22 +1,37 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
 import uuid
 import shutil
 import asyncio
+import time
+from contextlib import ExitStack
+from functools import lru_cache
 from typing import List, Optional
 import pandas as pd
 import json
 from datetime import datetime
 import logging
+from pydantic import ValidationError
 
-from models.analyzer import SpermAnalyzer
-from models.schemas import AnalysisResult, AnalysisStatus
-from utils.video_processor import VideoProcessor
+from config import settings
+from models.raw_results import OUTPUT_PARAMETERS, POSTPROCESSING_PARAMETERS
+from models.schemas import AnalysisRequest, AnalysisResult, AnalysisStatus, ReanalysisRequest
 from utils.file_handler import FileHandler
 from utils.database import Database
+from utils.cpu_budget import plan_cpu_budget
+from utils.frame_store import load_frame_store
+from utils.metrics import QUEUE_DEPTH_BUCKETS, MetricsRegistry
+from utils.result_cache import ResultCache, link_or_copy
+from utils.live_stream import (
+    LIVE_FORMATS, H264StreamDecoder, LatestFrameSlot, LiveFrame, RateMeter, analyze_live_frame
+)
+from utils.worker_pool import (
+    AnalysisWorkerPool, open_live_session, read_json, read_results, run_reanalysis,
+    run_video_analysis, run_video_processing, write_json
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -43,14 +58,100 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize components
-sperm_analyzer = SpermAnalyzer()
-video_processor = VideoProcessor()
+cpu_plan = plan_cpu_budget(
+    jobs=settings.analysis_workers,
+    threads_per_job=settings.cpu_threads_per_job,
+    reserved_cores=settings.cpu_reserved_cores
+)
+worker_pool = AnalysisWorkerPool(
+    executor_type=settings.analysis_executor,
+    io_workers=settings.io_workers,
+    preload_models=settings.preload_models,
+    cpu_plan=cpu_plan,
+    pin_cores=settings.cpu_pinning,
+    live_workers=settings.live_max_streams
+)
 file_handler = FileHandler()
 db = Database()
+result_cache = ResultCache(settings.result_cache_dir, settings.result_cache_mb * 1024 * 1024)
+raw_cache = ResultCache(settings.raw_results_dir, settings.raw_results_mb * 1024 * 1024)
 
 # In-memory storage for analysis status
 analysis_status = {}
 
+# Open live camera streams
+live_streams = {"active": 0}
+
+# Model warm-up state reported by /ready
+model_readiness = {"status": "starting", "workers": [], "error": None}
+
+# Prometheus metrics (/metrics). Analysis sessions time their stages in
+# their own process and return histogram snapshots with the results
+metrics = MetricsRegistry()
+frames_processed = metrics.counter(
+    "sperm_frames_processed_total", "Frames analyzed", ["source"])
+live_frames_dropped = metrics.counter(
+    "sperm_live_frames_dropped_total", "Live frames replaced by a newer frame before analysis")
+analyses_finished = metrics.counter(
+    "sperm_analyses_total", "Finished analyses by outcome", ["outcome"])
+analysis_fps = metrics.gauge(
+    "sperm_analysis_frames_per_second", "Frames per second of the last finished video analysis")
+stage_seconds = metrics.histogram(
+    "sperm_stage_duration_seconds",
+    "Stage time per frame (decode, tracking, metrics, render), per batch (inference) "
+    "or per job (video_processing, analysis, reanalysis, persist)", ["stage"])
+queue_depth = metrics.histogram(
+    "sperm_pipeline_queue_depth", "Items waiting in the pipeline queues, sampled every frame",
+    ["queue"], buckets=QUEUE_DEPTH_BUCKETS)
+metrics.gauge(
+    "sperm_active_jobs", "Analyses pending or processing",
+    collect=lambda: {(): sum(1 for status in list(analysis_status.values())
+                             if status["status"] in ("pending", "processing"))})
+metrics.gauge(
+    "sperm_live_streams", "Open live camera streams", collect=lambda: {(): live_streams["active"]})
+
+def cache_samples(field: str) -> dict:
+    """قيمة من إحصائيات الذاكرتين المؤقتتين لكل منهما"""
+    return {("results",): result_cache.stats()[field], ("raw",): raw_cache.stats()[field]}
+
+for field, help_text in [("hits", "Cache lookups that found an entry"),
+                         ("misses", "Cache lookups without an entry"),
+                         ("evictions", "Entries evicted to stay under the size limit")]:
+    metrics.counter(f"sperm_cache_{field}_total", help_text, ["cache"],
+                    collect=lambda field=field: cache_samples(field))
+for field, help_text in [("entries", "Cached entries"), ("bytes", "Size of the cached files")]:
+    metrics.gauge(f"sperm_cache_{field}", help_text, ["cache"],
+                  collect=lambda field=field: cache_samples(field))
+
+def record_instrumentation(instrumentation: Optional[dict]):
+    """
+    دمج مدرجات مراحل جلسة تحليل في مقاييس /metrics
+    
+    Args:
+        instrumentation: نسخ المدرجات (AnalysisSession.instrumentation) أو None
+    """
+    if not instrumentation:
+        return
+    for stage, snapshot in instrumentation["stages"].items():
+        stage_seconds.merge(snapshot, stage=stage)
+    for name, snapshot in instrumentation["queue_depth"].items():
+        queue_depth.merge(snapshot, queue=name)
+
+async def warm_up_models():
+    """Load and warm up the configured models in every analysis worker"""
+    model_readiness["status"] = "warming_up"
+    try:
+        model_readiness["workers"] = await worker_pool.warm_up()
+        if not worker_pool.workers_ready:
+            raise RuntimeError(f"Only {len(model_readiness['workers'])} of "
+                               f"{worker_pool.max_workers} analysis workers warmed up")
+        model_readiness["status"] = "ready"
+        logger.info("Models warmed up in all analysis workers")
+    except Exception as e:
+        logger.error(f"Error warming up models: {str(e)}")
+        model_readiness["status"] = "failed"
+        model_readiness["error"] = str(e)
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
@@ -64,8 +165,22 @@ async def startup_event():
     # Initialize database
     await db.init_db()
     
+    # Start analysis workers
+    worker_pool.start()
+    
+    # Warm up models in the background; /health answers meanwhile, /ready waits
+    if settings.preload_models:
+        app.state.warmup_task = asyncio.create_task(warm_up_models())
+    else:
+        model_readiness["status"] = "ready"
+    
     logger.info("Application started successfully")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools on shutdown"""
+    worker_pool.shutdown(wait=False)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -78,7 +193,9 @@ async def root():
             "status": "/status/{analysis_id}",
             "results": "/results/{analysis_id}",
             "download": "/download/{analysis_id}",
-            "history": "/history"
+            "history": "/history",
+            "live": "/ws/live",
+            "ready": "/ready"
         }
     }
 
@@ -87,6 +204,153 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    جاهزية الخادم: النماذج محملة ومحماة في جميع عمال التحليل
+    
+    Returns:
+        200 عند الجاهزية، 503 أثناء الإحماء أو عند فشله
+    """
+    ready = model_readiness["status"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": model_readiness["status"],
+            "workers": model_readiness["workers"],
+            "error": model_readiness["error"],
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+@app.get("/admin/cpu-plan")
+async def cpu_plan_report():
+    """
+    خطة توزيع الأنوية على عمال التحليل
+    
+    Returns:
+        الخطة وشرائح الأنوية المطبقة في كل عامل (بعد الإحماء)
+    """
+    return worker_pool.cpu_report()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """
+    مقاييس الخادم بصيغة Prometheus النصية
+    
+    Returns:
+        العدادات والمدرجات التكرارية (أزمنة المراحل، أعماق الطوابير، الذاكرة المؤقتة)
+    """
+    return PlainTextResponse(metrics.render(), media_type=MetricsRegistry.CONTENT_TYPE)
+
+@app.get("/admin/cache")
+async def result_cache_report():
+    """
+    إحصائيات ذاكرة النتائج المؤقتة
+    
+    Returns:
+        عدد المدخلات والحجم والإصابات والإخفاقات (raw = الكشوفات الخام)
+    """
+    return {**result_cache.stats(), "raw": raw_cache.stats()}
+
+@app.delete("/admin/cache")
+async def clear_result_cache():
+    """
+    حذف جميع النتائج المخزنة مؤقتاً
+    
+    Returns:
+        تأكيد الحذف
+    """
+    await worker_pool.run_io(result_cache.clear)
+    await worker_pool.run_io(raw_cache.clear)
+    return {"message": "تم مسح الذاكرة المؤقتة"}
+
+@lru_cache(maxsize=4)
+def weights_hash(path: str, mtime_ns: int, size: int) -> str:
+    """hash ملف الأوزان (يعاد حسابه عند تغير توقيت التعديل أو الحجم)"""
+    return file_handler.calculate_file_hash(path)
+
+def model_version() -> str:
+    """إصدار النموذج في مفتاح الذاكرة المؤقتة: المحرك وhash ملف الأوزان"""
+    weights = settings.model_path
+    if os.path.exists(weights):
+        # Weights replaced in place get a new hash without a restart
+        stat = os.stat(weights)
+        weights = weights_hash(weights, stat.st_mtime_ns, stat.st_size)
+    return f"{settings.detector_backend}:{weights}"
+
+def analysis_cache_key(video_hash: str, parameters: dict) -> str:
+    """
+    مفتاح الذاكرة المؤقتة لتحليل (تعمل داخل مجمع الإدخال/الإخراج)
+    
+    Args:
+        video_hash: hash محتوى الفيديو
+        parameters: معاملات الطلب
+        
+    Returns:
+        المفتاح
+    """
+    # Settings that change the results count as parameters (make_key drops
+    # the cache flag and the other UNCACHED_PARAMETERS). The ffmpeg and
+    # OpenCV readers can decode slightly different pixels, so the decoder
+    # counts; decoder_threads does not, decoding is exact at any thread count
+    effective = {
+        "tracker": settings.tracker,
+        "auto_resolution": settings.auto_resolution,
+        "segments": settings.analysis_segments,
+        "video_decoder": settings.video_decoder,
+        **parameters
+    }
+    return ResultCache.make_key(video_hash, model_version(), effective)
+
+def raw_results_key(video_hash: str, parameters: dict) -> str:
+    """
+    مفتاح الكشوفات الخام لتحليل (تعمل داخل مجمع الإدخال/الإخراج)
+    
+    Post-processing and output parameters are left out, so analyses that
+    differ only in those share the same detections and tracks.
+    
+    Args:
+        video_hash: hash محتوى الفيديو
+        parameters: معاملات الطلب
+        
+    Returns:
+        المفتاح
+    """
+    detection_parameters = {
+        name: value for name, value in parameters.items()
+        if name not in POSTPROCESSING_PARAMETERS and name not in OUTPUT_PARAMETERS
+    }
+    return analysis_cache_key(video_hash, detection_parameters)
+
+def restore_cached_analysis(entry: dict, analysis_id: str) -> str:
+    """
+    إنشاء ملفات تحليل جديد من نتائج مخزنة (تعمل داخل مجمع الإدخال/الإخراج)
+    
+    Args:
+        entry: مدخل الذاكرة المؤقتة
+        analysis_id: معرف التحليل الجديد
+        
+    Returns:
+        مسار نتائج JSON
+    """
+    paths = result_cache.restore(entry, {
+        "frames": f"results/{analysis_id}_frames.npz",
+        "annotated": f"results/{analysis_id}_annotated.mp4",
+        "raw": f"results/{analysis_id}_raw.npz"
+    })
+    results = result_cache.read_results(entry)
+    results.update(
+        analysis_id=analysis_id,
+        frames_path=paths.get("frames"),
+        annotated_video_path=paths.get("annotated"),
+        raw_path=paths.get("raw"),
+        cached_from=entry["source"]
+    )
+    results_path = f"results/{analysis_id}_results.json"
+    write_json(results_path, results)
+    return results_path
+
 @app.post("/analyze")
 async def analyze_video(
     background_tasks: BackgroundTasks,
@@ -111,14 +375,6 @@ async def analyze_video(
                 detail="نوع الملف غير مدعوم. يرجى استخدام .mp4 أو .avi أو .mov"
             )
         
-        # Generate unique analysis ID
-        analysis_id = str(uuid.uuid4())
-        
-        # Save uploaded video
-        video_path = f"uploads/{analysis_id}_{video.filename}"
-        with open(video_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-        
         # Parse parameters
         analysis_params = {}
         if parameters:
@@ -127,6 +383,55 @@ async def analyze_video(
             except json.JSONDecodeError:
                 logger.warning(f"Invalid parameters format: {parameters}")
         
+        # Invalid values are rejected before the upload is stored
+        try:
+            AnalysisRequest.model_validate(analysis_params)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+        
+        # Generate unique analysis ID
+        analysis_id = str(uuid.uuid4())
+        
+        # Save uploaded video, hashing it while it is written
+        video_path = f"uploads/{analysis_id}_{video.filename}"
+        video_hash = await worker_pool.run_io(file_handler.save_upload_stream, video.file, video_path)
+        
+        # Same video, model and parameters: reuse the stored results
+        cache_key = None
+        if result_cache.enabled and analysis_params.get("cache", True):
+            cache_key = await worker_pool.run_io(analysis_cache_key, video_hash, analysis_params)
+            entry = result_cache.lookup(cache_key)
+            if entry is not None:
+                try:
+                    results_path = await worker_pool.run_io(restore_cached_analysis, entry, analysis_id)
+                    analysis_status[analysis_id] = {
+                        "status": "completed",
+                        "progress": 100,
+                        "message": "تم استرجاع نتائج تحليل سابق لنفس الفيديو",
+                        "created_at": datetime.now().isoformat(),
+                        "video_path": video_path,
+                        "parameters": analysis_params,
+                        "results_path": results_path,
+                        "cached_from": entry["source"]
+                    }
+                    analyses_finished.inc(outcome="cached")
+                    logger.info(f"Analysis {analysis_id} served from cache ({entry['source']})")
+                    return {
+                        "analysis_id": analysis_id,
+                        "status": "completed",
+                        "message": "تم استرجاع نتائج تحليل سابق لنفس الفيديو",
+                        "estimated_time": "0",
+                        "cached": True
+                    }
+                except Exception as e:
+                    # Evicted meanwhile: analyze as usual
+                    logger.error(f"Error restoring cached results: {str(e)}")
+        
+        # Detections and tracks of the same video and detection parameters
+        raw_key = None
+        if raw_cache.enabled:
+            raw_key = await worker_pool.run_io(raw_results_key, video_hash, analysis_params)
+        
         # Initialize analysis status
         analysis_status[analysis_id] = {
             "status": "pending",
@@ -142,7 +447,9 @@ async def analyze_video(
             run_analysis,
             analysis_id,
             video_path,
-            analysis_params
+            analysis_params,
+            cache_key,
+            raw_key
         )
         
         return {
@@ -152,6 +459,8 @@ async def analyze_video(
             "estimated_time": "5-10 دقائق"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in analyze_video: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحليل الفيديو: {str(e)}")
@@ -194,15 +503,12 @@ async def get_analysis_results(analysis_id: str):
             detail="التحليل لم يكتمل بعد"
         )
     
-    # Load results from file
+    # Load results from file (per-frame records built from the frames file)
     results_path = f"results/{analysis_id}_results.json"
     if not os.path.exists(results_path):
         raise HTTPException(status_code=404, detail="نتائج التحليل غير موجودة")
     
-    with open(results_path, "r", encoding="utf-8") as f:
-        results = json.load(f)
-    
-    return results
+    return await worker_pool.run_io(read_results, results_path)
 
 @app.get("/download/{analysis_id}")
 async def download_results(analysis_id: str, format: str = "json"):
@@ -211,7 +517,7 @@ async def download_results(analysis_id: str, format: str = "json"):
     
     Args:
         analysis_id: معرف التحليل
-        format: نوع الملف (json, csv, xlsx)
+        format: نوع الملف (json, csv, xlsx, mp4)
         
     Returns:
         ملف النتائج
@@ -229,11 +535,11 @@ async def download_results(analysis_id: str, format: str = "json"):
     
     try:
         if format == "json":
-            file_path = f"results/{analysis_id}_results.json"
-            return FileResponse(
-                file_path,
-                media_type="application/json",
-                filename=f"sperm_analysis_{analysis_id}.json"
+            # Stored results plus the per-frame records of the frames file
+            results = await worker_pool.run_io(read_results, f"results/{analysis_id}_results.json")
+            return JSONResponse(
+                content=results,
+                headers={"Content-Disposition": f'attachment; filename="sperm_analysis_{analysis_id}.json"'}
             )
         
         elif format == "csv":
@@ -243,7 +549,11 @@ async def download_results(analysis_id: str, format: str = "json"):
                 with open(f"results/{analysis_id}_results.json", "r", encoding="utf-8") as f:
                     results = json.load(f)
                 
-                df = pd.DataFrame(results["detections"])
+                frame_store = load_frame_store(f"results/{analysis_id}_frames.npz")
+                if frame_store is not None:
+                    df = frame_store.to_dataframe()
+                else:
+                    df = pd.DataFrame(results.get("detections", []))
                 df.to_csv(file_path, index=False, encoding="utf-8")
             
             return FileResponse(
@@ -265,7 +575,11 @@ async def download_results(analysis_id: str, format: str = "json"):
                     summary_df.to_excel(writer, sheet_name="ملخص", index=False)
                     
                     # Detections sheet
-                    detections_df = pd.DataFrame(results["detections"])
+                    frame_store = load_frame_store(f"results/{analysis_id}_frames.npz")
+                    if frame_store is not None:
+                        detections_df = frame_store.to_dataframe()
+                    else:
+                        detections_df = pd.DataFrame(results.get("detections", []))
                     detections_df.to_excel(writer, sheet_name="الكشوفات", index=False)
                     
                     # Statistics sheet
@@ -278,9 +592,23 @@ async def download_results(analysis_id: str, format: str = "json"):
                 filename=f"sperm_analysis_{analysis_id}.xlsx"
             )
         
+        elif format == "mp4":
+            # Annotated video rendered during the analysis (render_video)
+            file_path = f"results/{analysis_id}_annotated.mp4"
+            if not os.path.exists(file_path):
+                raise HTTPException(status_code=404, detail="لم يتم إنشاء فيديو مرسوم لهذا التحليل")
+            return FileResponse(
+                file_path,
+                media_type="video/mp4",
+                filename=f"sperm_analysis_{analysis_id}.mp4"
+            )
+        
         else:
             raise HTTPException(status_code=400, detail="نوع الملف غير مدعوم")
     
+    except HTTPException:
+        raise
+    
     except Exception as e:
         logger.error(f"Error in download_results: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في تحميل النتائج: {str(e)}")
@@ -337,6 +665,11 @@ async def delete_analysis(analysis_id: str):
             if os.path.exists(file_path):
                 os.remove(file_path)
         
+        for file_path in [f"results/{analysis_id}_frames.npz", f"results/{analysis_id}_annotated.mp4",
+                          f"results/{analysis_id}_raw.npz"]:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        
         # Remove from status
         del analysis_status[analysis_id]
         
@@ -346,7 +679,217 @@ async def delete_analysis(analysis_id: str):
         logger.error(f"Error in delete_analysis: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في حذف التحليل: {str(e)}")
 
-async def run_analysis(analysis_id: str, video_path: str, parameters: dict):
+@app.post("/reanalyze/{analysis_id}")
+async def reanalyze_analysis(analysis_id: str, request: ReanalysisRequest):
+    """
+    إعادة حساب نتائج تحليل مكتمل بمعاملات ما بعد المعالجة جديدة
+    
+    The summary, statistics and time series are recomputed from the raw
+    detections and tracks of the analysis, without running detection.
+    The result is stored as a new analysis.
+    
+    Args:
+        analysis_id: معرف التحليل الأصلي
+        request: معاملات ما بعد المعالجة الجديدة
+        
+    Returns:
+        نتائج التحليل الجديد
+    """
+    if analysis_id not in analysis_status:
+        raise HTTPException(status_code=404, detail="معرف التحليل غير موجود")
+    
+    status = analysis_status[analysis_id]
+    if status["status"] != "completed":
+        raise HTTPException(status_code=400, detail="التحليل لم يكتمل بعد")
+    
+    source_raw_path = f"results/{analysis_id}_raw.npz"
+    if not os.path.exists(source_raw_path):
+        raise HTTPException(status_code=404, detail="الكشوفات الخام غير متوفرة لهذا التحليل")
+    
+    try:
+        source = await worker_pool.run_io(read_json, f"results/{analysis_id}_results.json")
+        parameters = {**status["parameters"], **request.model_dump(exclude_none=True)}
+        
+        # The new analysis owns its copy of the raw file (a hard link)
+        new_id = str(uuid.uuid4())
+        raw_path = f"results/{new_id}_raw.npz"
+        frames_path = f"results/{new_id}_frames.npz"
+        await worker_pool.run_io(link_or_copy, source_raw_path, raw_path)
+        with stage_seconds.time(stage="reanalysis"):
+            results = await worker_pool.run_io(run_reanalysis, raw_path, parameters, frames_path)
+        
+        final_results = {
+            "analysis_id": new_id,
+            "video_info": source.get("video_info"),
+            "summary": results["summary"],
+            "statistics": results["statistics"],
+            "performance": results["performance"],
+            "frames_path": results.get("frames_path"),
+            "raw_path": raw_path,
+            "parameters": parameters,
+            "reanalyzed_from": analysis_id,
+            "timestamp": datetime.now().isoformat()
+        }
+        results_path = f"results/{new_id}_results.json"
+        with stage_seconds.time(stage="persist"):
+            await worker_pool.run_io(write_json, results_path, final_results)
+        analyses_finished.inc(outcome="reanalyzed")
+        
+        # The video belongs to the original analysis (not deleted with this one)
+        analysis_status[new_id] = {
+            "status": "completed",
+            "progress": 100,
+            "message": "تمت إعادة حساب النتائج من الكشوفات الخام",
+            "created_at": datetime.now().isoformat(),
+            "video_path": None,
+            "parameters": parameters,
+            "results_path": results_path,
+            "reanalyzed_from": analysis_id
+        }
+        logger.info(f"Analysis {new_id} re-derived from {analysis_id} "
+                    f"in {results['performance']['processing_time']}s")
+        return await worker_pool.run_io(read_results, results_path)
+    
+    except Exception as e:
+        logger.error(f"Error in reanalyze_analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"خطأ في إعادة حساب النتائج: {str(e)}")
+
+@app.websocket("/ws/live")
+async def live_analysis(websocket: WebSocket):
+    """
+    تحليل مباشر لإطارات الكاميرا أثناء التصوير
+    
+    Protocol: the client first sends a JSON start message
+    {"format": "jpeg" | "h264", "fps": 30, "width": .., "height": ..,
+    "parameters": {..}} (width/height only for h264), then binary
+    messages: one JPEG image per frame, or H.264 Annex-B chunks. A JSON
+    {"type": "stop"} ends the stream; text that is not JSON is answered
+    with {"type": "error", ...} and ignored. The server answers every analyzed
+    frame with {"type": "metrics", ...}, including the achieved frames/s
+    and the dropped frame count, and ends with {"type": "summary", ...}.
+    
+    Only the newest frame waits for the analysis; frames arriving
+    meanwhile replace it, so the latency stays about one frame's
+    analysis time under any load.
+    """
+    await websocket.accept()
+    if live_streams["active"] >= settings.live_max_streams:
+        await websocket.send_json({"type": "error", "message": "تم الوصول للحد الأقصى للبث المباشر"})
+        await websocket.close(code=1013)
+        return
+    
+    live_streams["active"] += 1
+    loop = asyncio.get_running_loop()
+    slot = LatestFrameSlot()
+    processed_rate = RateMeter()
+    decoder = None
+    session = None
+    processed = 0
+    started_at = time.monotonic()
+    
+    with ExitStack() as stack:
+        try:
+            config = await websocket.receive_json()
+            stream_format = config.get("format", "jpeg")
+            if stream_format not in LIVE_FORMATS:
+                raise ValueError(f"Unsupported stream format: {stream_format}")
+            fps = float(config.get("fps") or 30.0)
+            
+            # Models are borrowed for the whole stream (loading may block)
+            session = await worker_pool.run_live(
+                stack.enter_context,
+                open_live_session(config.get("parameters") or {}, settings.live_track_window)
+            )
+            if stream_format == "h264":
+                decoded = {"frames": 0}
+                
+                def on_frame(frame):
+                    slot.put_threadsafe(loop, LiveFrame(decoded["frames"], frame, time.monotonic()))
+                    decoded["frames"] += 1
+                
+                decoder = H264StreamDecoder(int(config["width"]), int(config["height"]), on_frame,
+                                            threads=settings.decoder_threads)
+                stack.callback(decoder.close)
+            await websocket.send_json({"type": "ready", "format": stream_format, "fps": fps})
+            
+            async def receive_frames():
+                try:
+                    while True:
+                        message = await websocket.receive()
+                        if message["type"] == "websocket.disconnect":
+                            break
+                        if message.get("bytes") is not None:
+                            if decoder is not None:
+                                await worker_pool.run_io(decoder.feed, message["bytes"])
+                            else:
+                                slot.put(LiveFrame(slot.received, message["bytes"], time.monotonic()))
+                        elif message.get("text"):
+                            # Malformed control messages are reported and skipped, like bad JPEGs
+                            try:
+                                control = json.loads(message["text"])
+                            except json.JSONDecodeError:
+                                await websocket.send_json({"type": "error", "message": "رسالة تحكم غير صالحة"})
+                                continue
+                            if isinstance(control, dict) and control.get("type") == "stop":
+                                break
+                finally:
+                    if decoder is not None:
+                        await worker_pool.run_io(decoder.close)
+                    slot.close()
+            
+            receiver = asyncio.create_task(receive_frames())
+            try:
+                while (frame := await slot.get()) is not None:
+                    result = await worker_pool.run_live(analyze_live_frame, session, frame, fps)
+                    if result is None:
+                        continue
+                    processed += 1
+                    processed_rate.tick()
+                    frames_processed.inc(source="live")
+                    await websocket.send_json({
+                        "type": "metrics",
+                        "frame_number": frame.frame_number,
+                        **result,
+                        "latency_ms": round((time.monotonic() - frame.received_at) * 1000, 1),
+                        "fps": round(processed_rate.rate(), 2),
+                        "received_frames": slot.received,
+                        "dropped_frames": slot.dropped
+                    })
+            except BaseException:
+                receiver.cancel()
+                await asyncio.gather(receiver, return_exceptions=True)
+                raise
+            await receiver
+            
+            elapsed = time.monotonic() - started_at
+            await websocket.send_json({
+                "type": "summary",
+                "summary": session.running_summary.summary(),
+                "received_frames": slot.received,
+                "processed_frames": processed,
+                "dropped_frames": slot.dropped,
+                "fps": round(processed / elapsed, 2) if elapsed > 0 else 0
+            })
+            await websocket.close()
+        
+        except WebSocketDisconnect:
+            logger.info("Live stream client disconnected")
+        except Exception as e:
+            logger.error(f"Error in live_analysis: {str(e)}")
+            try:
+                await websocket.send_json({"type": "error", "message": str(e)})
+                await websocket.close(code=1011)
+            except Exception:
+                pass
+        finally:
+            live_streams["active"] -= 1
+            live_frames_dropped.inc(slot.dropped)
+            if session is not None:
+                record_instrumentation(session.instrumentation())
+            await worker_pool.run_live(stack.close)
+
+async def run_analysis(analysis_id: str, video_path: str, parameters: dict,
+                       cache_key: Optional[str] = None, raw_key: Optional[str] = None):
     """
     تشغيل التحليل في الخلفية
     
@@ -354,6 +897,8 @@ async def run_analysis(analysis_id: str, video_path: str, parameters: dict):
         analysis_id: معرف التحليل
         video_path: مسار الفيديو
         parameters: معاملات التحليل
+        cache_key: مفتاح حفظ النتائج في الذاكرة المؤقتة أو None
+        raw_key: مفتاح الكشوفات الخام أو None
     """
     try:
         # Update status
@@ -365,13 +910,55 @@ async def run_analysis(analysis_id: str, video_path: str, parameters: dict):
         analysis_status[analysis_id]["progress"] = 30
         analysis_status[analysis_id]["message"] = "معالجة الفيديو..."
         
-        video_info = await video_processor.process_video(video_path)
+        with stage_seconds.time(stage="video_processing"):
+            video_info = await worker_pool.run_io(run_video_processing, video_path)
         
         # Run AI analysis
         analysis_status[analysis_id]["progress"] = 60
         analysis_status[analysis_id]["message"] = "تشغيل نموذج الذكاء الاصطناعي..."
         
-        results = await sperm_analyzer.analyze_video(video_path, parameters)
+        # Per-frame columns are saved by the worker next to the JSON results
+        frames_path = f"results/{analysis_id}_frames.npz"
+        render_path = f"results/{analysis_id}_annotated.mp4" if parameters.get("render_video") else None
+        raw_path = f"results/{analysis_id}_raw.npz" if raw_key is not None else None
+        segment_parameters = {
+            "segments": settings.analysis_segments,
+            **parameters
+        }
+        
+        # Same detections already stored: only the post-processing runs
+        # (rendering still needs the decoded frames)
+        analysis_start = time.perf_counter()
+        analysis_stage = "analysis"
+        results = None
+        raw_entry = raw_cache.lookup(raw_key) if raw_key is not None and not render_path else None
+        if raw_entry is not None:
+            try:
+                await worker_pool.run_io(raw_cache.restore, raw_entry, {"raw": raw_path})
+                results = await worker_pool.run_io(run_reanalysis, raw_path, parameters, frames_path)
+                analysis_stage = "reanalysis"
+                logger.info(f"Analysis {analysis_id} re-derived from raw results ({raw_entry['source']})")
+            except Exception as e:
+                # Evicted meanwhile: analyze as usual
+                logger.error(f"Error re-deriving from raw results: {str(e)}")
+        
+        if results is None and int(segment_parameters["segments"] or 0) > 1:
+            # Long videos: time segments run on several workers at once
+            if render_path:
+                logger.warning("Annotated video rendering is not supported with segments, skipping")
+            results = await worker_pool.run_segmented_analysis(video_path, segment_parameters,
+                                                               frames_path, raw_path)
+        elif results is None:
+            results = await worker_pool.run_analysis(run_video_analysis, video_path, parameters,
+                                                     frames_path, render_path, raw_path)
+        stage_seconds.observe(time.perf_counter() - analysis_start, stage=analysis_stage)
+        
+        # Frames and stage timings of a detection run (not of a re-derived result)
+        instrumentation = results.pop("instrumentation", None)
+        if instrumentation is not None:
+            record_instrumentation(instrumentation)
+            frames_processed.inc(results["summary"]["total_frames"], source="video")
+            analysis_fps.set(results.get("performance", {}).get("frames_per_second", 0))
         
         # Generate comprehensive results
         analysis_status[analysis_id]["progress"] = 90
@@ -381,16 +968,31 @@ async def run_analysis(analysis_id: str, video_path: str, parameters: dict):
             "analysis_id": analysis_id,
             "video_info": video_info,
             "summary": results["summary"],
-            "detections": results["detections"],
             "statistics": results["statistics"],
+            "performance": results.get("performance", {}),
+            "frames_path": results.get("frames_path"),
+            "annotated_video_path": results.get("annotated_video_path"),
+            "raw_path": results.get("raw_path"),
             "parameters": parameters,
             "timestamp": datetime.now().isoformat()
         }
         
         # Save results
         results_path = f"results/{analysis_id}_results.json"
-        with open(results_path, "w", encoding="utf-8") as f:
-            json.dump(final_results, f, ensure_ascii=False, indent=2)
+        persist_start = time.perf_counter()
+        await worker_pool.run_io(write_json, results_path, final_results)
+        if raw_key is not None and final_results["raw_path"]:
+            await worker_pool.run_io(raw_cache.store, raw_key, {"raw": final_results["raw_path"]},
+                                     analysis_id)
+        if cache_key is not None:
+            await worker_pool.run_io(result_cache.store, cache_key, {
+                "results": results_path,
+                "frames": final_results["frames_path"],
+                "annotated": final_results["annotated_video_path"],
+                "raw": final_results["raw_path"]
+            }, analysis_id)
+        stage_seconds.observe(time.perf_counter() - persist_start, stage="persist")
+        analyses_finished.inc(outcome="completed")
         
         # Update final status
         analysis_status[analysis_id]["status"] = "completed"
@@ -402,6 +1004,7 @@ async def run_analysis(analysis_id: str, video_path: str, parameters: dict):
         
     except Exception as e:
         logger.error(f"Error in run_analysis: {str(e)}")
+        analyses_finished.inc(outcome="failed")
         analysis_status[analysis_id]["status"] = "failed"
         analysis_status[analysis_id]["message"] = f"خطأ في التحليل: {str(e)}"
 
@@ -1,77 +1,114 @@
 import cv2
 import numpy as np
 import torch
-from ultralytics import YOLO
-from deep_sort_realtime import DeepSort
 import logging
-from typing import Dict, List, Tuple, Optional
-from datetime import datetime
+import threading
+from typing import Callable, Dict, List, Tuple, Optional
 import os
-import asyncio
+import time
 import json
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from itertools import repeat
 from pathlib import Path
 
+from models.detectors import BaseDetector, DetectionBatch, create_detector
+from models.raw_results import load_raw_results, rederive_results
+from models.registry import ModelRegistry
+from models.segments import merge_segments, prepare_video_segments
+from models.session import AnalysisSession
+from utils.frame_store import FrameStore, load_frame_store
+
 logger = logging.getLogger(__name__)
 
+# Analyzer of a segment worker process started by analyze_video_segments
+_segment_analyzer = None
+
+def _analyze_segment_in_process(config: Dict, video_path: str, parameters: Dict,
+                                segment: Dict) -> Dict:
+    """تحليل مقطع داخل عملية عامل (المحلل يُنشأ مرة واحدة لكل عملية)"""
+    global _segment_analyzer
+    if _segment_analyzer is None:
+        from utils import worker_pool
+        # Detector threads follow the core slice the worker initializer applied
+        cpu_slice = worker_pool._worker_cpu_slice
+        if not config.get('detector_threads') and cpu_slice is not None:
+            config = {**config, 'detector_threads': cpu_slice['threads']}
+        _segment_analyzer = SpermAnalyzer(**config)
+    return _segment_analyzer.analyze_segment(video_path, parameters, segment)
+
 class SpermAnalyzer:
     """
-    محلل الحيوانات المنوية باستخدام YOLOv8 و DeepSORT
+    محلل الحيوانات المنوية باستخدام YOLOv8 ومتتبع قابل للاختيار (DeepSORT أو IoU/Kalman)
+    
+    The analyzer only holds configuration and read-only models; every
+    analyze_video() call runs in its own AnalysisSession, so one analyzer
+    can serve several analyses at the same time.
     """
     
-    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5):
+    def __init__(self, model_path: str = "yolov8n.pt", confidence_threshold: float = 0.5,
+                 batch_size: int = 8, queue_size: int = 16,
+                 detector_backend: str = "ultralytics", detector_threads: int = 0,
+                 tracker: str = "deepsort", frame_spill_rows: int = 100000,
+                 frame_spill_dir: Optional[str] = None,
+                 registry: Optional[ModelRegistry] = None, auto_resolution: bool = False,
+                 video_decoder: str = "auto", decoder_threads: int = 0,
+                 video_encoder: str = "auto"):
         """
         تهيئة محلل الحيوانات المنوية
         
         Args:
             model_path: مسار نموذج YOLOv8
             confidence_threshold: حد الثقة للكشف
+            batch_size: عدد الإطارات المرسلة للنموذج في استدعاء واحد
+            queue_size: أقصى عدد إطارات منتظرة بين مراحل خط المعالجة
+            detector_backend: محرك الكشف (ultralytics, onnx, onnx-int8, openvino)
+            detector_threads: عدد خيوط الاستدلال لمحرك الكشف (0 = الافتراضي)
+            tracker: المتتبع الافتراضي (deepsort أو iou)
+            frame_spill_rows: عدد الإطارات الذي تنتقل بعده نتائج الإطارات إلى ملفات مربوطة بالذاكرة
+            frame_spill_dir: مجلد ملفات نتائج الإطارات المؤقتة
+            registry: سجل النماذج المشتركة (None = يحمّل المحلل نموذجه الخاص)
+            auto_resolution: معايرة دقة الاستدلال لكل فيديو (الافتراضي)
+            video_decoder: مفكك ترميز الفيديو (auto أو ffmpeg أو opencv)
+            decoder_threads: خيوط فك الترميز لـ ffmpeg (0 = تلقائي)
+            video_encoder: مرمز الفيديو المرسوم (auto أو ffmpeg أو opencv)
         """
         self.model_path = model_path
         self.confidence_threshold = confidence_threshold
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.detector_backend = detector_backend
+        self.detector_threads = detector_threads
+        self.tracker_name = tracker
+        self.frame_spill_rows = frame_spill_rows
+        self.frame_spill_dir = frame_spill_dir
+        self.registry = registry
+        self.auto_resolution = auto_resolution
+        self.video_decoder = video_decoder
+        self.decoder_threads = decoder_threads
+        self.video_encoder = video_encoder
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
-        # Initialize models
-        self.yolo_model = None
-        self.deep_sort = None
+        # Initialize models (per-analysis state lives in AnalysisSession)
+        self.detector = None
+        # Guards loading and, for backends that are not thread-safe, inference
+        self._detector_lock = threading.Lock()
         self.class_names = ['sperm']
         
-        # Tracking variables
-        self.track_history = {}
-        self.sperm_count = 0
-        self.motility_data = []
-        self.density_data = []
-        
         logger.info(f"SpermAnalyzer initialized with device: {self.device}")
     
     def load_model(self):
         """تحميل نموذج YOLOv8"""
         try:
-            # Load YOLOv8 model
-            if os.path.exists(self.model_path):
-                self.yolo_model = YOLO(self.model_path)
-                logger.info(f"Loaded custom model from {self.model_path}")
-            else:
-                # Use pretrained model and retrain for sperm detection
-                self.yolo_model = YOLO('yolov8n.pt')
-                logger.info("Loaded pretrained YOLOv8 model")
-            
-            # Initialize DeepSORT
-            self.deep_sort = DeepSort(
-                max_age=50,
-                n_init=3,
-                nms_max_overlap=1.0,
-                max_cosine_distance=0.3,
-                nn_budget=None,
-                override_track_class=None,
-                embedder="mobilenet",
-                half=True,
-                bgr=True,
-                embedder_gpu=torch.cuda.is_available(),
-                embedder_model_name=None,
-                embedder_wts=None,
-                polygon=False,
-                today=None
+            # Load YOLOv8 model through the configured backend
+            self.detector = create_detector(
+                self.detector_backend,
+                model_path=self.model_path,
+                num_threads=self.detector_threads
             )
+            self.detector.load()
+            logger.info(f"Loaded detector backend: {self.detector_backend}")
             
             logger.info("Models loaded successfully")
             return True
@@ -80,414 +117,373 @@ class SpermAnalyzer:
             logger.error(f"Error loading models: {str(e)}")
             return False
     
-    async def analyze_video(self, video_path: str, parameters: Dict = None) -> Dict:
+    def analyze_video(self, video_path: str, parameters: Dict = None,
+                      frames_path: Optional[str] = None,
+                      progress_callback: Optional[Callable[[int, int, Dict], None]] = None,
+                      render_path: Optional[str] = None, raw_path: Optional[str] = None) -> Dict:
         """
-        تحليل فيديو الحيوانات المنوية
+        تحليل فيديو الحيوانات المنوية في جلسة مستقلة
         
         Args:
             video_path: مسار الفيديو
             parameters: معاملات التحليل
+            frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
+            progress_callback: دالة تستدعى كل 30 إطاراً بـ (الإطارات المعالجة، إجمالي الإطارات، الملخص الحالي)
+            render_path: مسار فيديو MP4 المرسوم أثناء التحليل (اختياري)
+            raw_path: مسار حفظ الكشوفات الخام ومسارات التتبع (اختياري)
             
         Returns:
             نتائج التحليل الكاملة
         """
-        try:
-            # Load models if not already loaded
-            if not self.yolo_model or not self.deep_sort:
-                if not self.load_model():
-                    raise Exception("Failed to load models")
-            
-            # Set parameters
-            if parameters:
-                self.confidence_threshold = parameters.get('confidence_threshold', 0.5)
-            
-            # Open video
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                raise Exception(f"Cannot open video file: {video_path}")
-            
-            # Get video properties
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            duration = total_frames / fps if fps > 0 else 0
-            
-            logger.info(f"Video properties: {width}x{height}, {fps} FPS, {duration:.2f}s")
-            
-            # Initialize tracking variables
-            self.track_history = {}
-            self.sperm_count = 0
-            self.motility_data = []
-            self.density_data = []
-            
-            frame_results = []
-            frame_count = 0
-            
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                # Run detection
-                detections = self.detect_sperm(frame)
-                
-                # Run tracking
-                tracks = self.track_sperm(detections, frame)
-                
-                # Calculate metrics
-                frame_metrics = self.calculate_frame_metrics(tracks, frame_count, fps)
-                
-                # Store results
-                frame_results.append({
-                    'frame_number': frame_count,
-                    'timestamp': frame_count / fps,
-                    'detections': len(detections),
-                    'tracks': len(tracks),
-                    'metrics': frame_metrics
-                })
-                
-                frame_count += 1
-                
-                # Progress update (for real-time monitoring)
-                if frame_count % 30 == 0:  # Every 30 frames
-                    progress = (frame_count / total_frames) * 100
-                    logger.info(f"Processing progress: {progress:.1f}%")
-            
-            cap.release()
-            
-            # Generate final analysis
-            final_results = self.generate_final_analysis(frame_results, fps, duration)
-            
-            logger.info("Video analysis completed successfully")
-            return final_results
-            
-        except Exception as e:
-            logger.error(f"Error in analyze_video: {str(e)}")
-            raise
+        parameters = parameters or {}
+        if int(parameters.get('segments') or 0) > 1:
+            if render_path:
+                logger.warning("Annotated video rendering is not supported with segments, skipping")
+            return self.analyze_video_segments(video_path, parameters, frames_path=frames_path,
+                                               raw_path=raw_path)
+        
+        tracker_name = parameters.get('tracker') or self.tracker_name
+        with self.borrow_models(tracker_name) as (detector, detector_lock, embedder):
+            session = self.create_session(detector, parameters, detector_lock, embedder)
+            return session.run(video_path, frames_path=frames_path,
+                               progress_callback=progress_callback, render_path=render_path,
+                               raw_path=raw_path)
     
-    def detect_sperm(self, frame: np.ndarray) -> List[Dict]:
+    def analyze_video_segments(self, video_path: str, parameters: Dict,
+                               frames_path: Optional[str] = None,
+                               executor: Optional[Executor] = None,
+                               raw_path: Optional[str] = None) -> Dict:
         """
-        كشف الحيوانات المنوية في الإطار
+        تحليل فيديو طويل بتقسيمه إلى مقاطع زمنية تُحلل بالتوازي
+        
+        Each segment runs detection in its own process (its own detector
+        and core slice); the tracker then runs once over the detections of
+        all segments in frame order, so the result equals a serial run.
         
         Args:
-            frame: إطار الفيديو
+            video_path: مسار الفيديو
+            parameters: معاملات التحليل (segments = عدد المقاطع)
+            frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
+            executor: منفذ لتشغيل المقاطع (None = مجمع عمليات مؤقت)
+            raw_path: مسار حفظ الكشوفات الخام ومسارات التتبع (اختياري)
             
         Returns:
-            قائمة الكشوفات
+            نتائج التحليل الكاملة
         """
-        try:
-            # Run YOLOv8 detection
-            results = self.yolo_model(frame, conf=self.confidence_threshold, verbose=False)
-            
-            detections = []
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Extract box coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = box.conf[0].cpu().numpy()
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        # Calculate center and dimensions
-                        center_x = (x1 + x2) / 2
-                        center_y = (y1 + y2) / 2
-                        width = x2 - x1
-                        height = y2 - y1
-                        
-                        detections.append({
-                            'bbox': [x1, y1, x2, y2],
-                            'confidence': float(confidence),
-                            'class_id': class_id,
-                            'center': [center_x, center_y],
-                            'size': [width, height]
-                        })
-            
-            return detections
-            
-        except Exception as e:
-            logger.error(f"Error in detect_sperm: {str(e)}")
-            return []
+        plan = self.prepare_segments(video_path, parameters)
+        start_time = time.perf_counter()
+        arguments = (repeat(self.segment_config()), repeat(video_path), repeat(parameters), plan)
+        if executor is not None:
+            results = list(executor.map(_analyze_segment_in_process, *arguments))
+        else:
+            from utils.cpu_budget import plan_cpu_budget
+            from utils.worker_pool import _init_worker
+            
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=len(plan), mp_context=context,
+                                     initializer=_init_worker,
+                                     initargs=(context.Value('i', 0),
+                                               plan_cpu_budget(jobs=len(plan)))) as pool:
+                results = list(pool.map(_analyze_segment_in_process, *arguments))
+        
+        return self.merge_segment_results(parameters, results, frames_path=frames_path,
+                                          elapsed=time.perf_counter() - start_time,
+                                          raw_path=raw_path)
     
-    def track_sperm(self, detections: List[Dict], frame: np.ndarray) -> List[Dict]:
+    def prepare_segments(self, video_path: str, parameters: Dict) -> List[Dict]:
         """
-        تتبع الحيوانات المنوية
+        تخطيط مقاطع الفيديو (مع قرارات بوابة الحركة عند تفعيلها)
         
         Args:
-            detections: قائمة الكشوفات
-            frame: إطار الفيديو
+            video_path: مسار الفيديو
+            parameters: معاملات التحليل
             
         Returns:
-            قائمة التتبع
+            قائمة المقاطع
         """
-        try:
-            # Prepare detections for DeepSORT
-            detection_list = []
-            for det in detections:
-                x1, y1, x2, y2 = det['bbox']
-                confidence = det['confidence']
-                detection_list.append([[x1, y1, x2, y2], confidence, 'sperm'])
-            
-            # Update tracker
-            tracks = self.deep_sort.update_tracks(detection_list, frame=frame)
-            
-            # Process tracks
-            track_results = []
-            for track in tracks:
-                if not track.is_confirmed():
-                    continue
-                
-                # Get track information
-                track_id = track.track_id
-                ltrb = track.to_ltrb()
-                
-                # Calculate center and velocity
-                center_x = (ltrb[0] + ltrb[2]) / 2
-                center_y = (ltrb[1] + ltrb[3]) / 2
-                
-                # Update track history
-                if track_id not in self.track_history:
-                    self.track_history[track_id] = {
-                        'positions': [],
-                        'velocities': [],
-                        'first_seen': datetime.now(),
-                        'last_seen': datetime.now()
-                    }
-                
-                # Add current position
-                self.track_history[track_id]['positions'].append([center_x, center_y])
-                self.track_history[track_id]['last_seen'] = datetime.now()
-                
-                # Calculate velocity
-                velocity = self.calculate_velocity(track_id)
-                
-                track_results.append({
-                    'track_id': track_id,
-                    'bbox': ltrb,
-                    'center': [center_x, center_y],
-                    'velocity': velocity,
-                    'confidence': getattr(track, 'confidence', 0.0)
-                })
+        parameters = parameters or {}
+        # Calibration needs the detector, never the embedder
+        with self.borrow_models('iou') as (detector, detector_lock, _):
+            session = self.create_session(detector, {**parameters, 'tracker': 'iou'}, detector_lock)
+            return prepare_video_segments(session, video_path, parameters)
+    
+    def analyze_segment(self, video_path: str, parameters: Dict, segment: Dict) -> Dict:
+        """
+        كشف الحيوانات المنوية في مقطع واحد من الفيديو
+        
+        Args:
+            video_path: مسار الفيديو
+            parameters: معاملات التحليل
+            segment: المقطع (prepare_segments)
             
-            return track_results
+        Returns:
+            نتيجة المقطع
+        """
+        parameters = parameters or {}
+        tracker_name = parameters.get('tracker') or self.tracker_name
+        with self.borrow_models(tracker_name) as (detector, detector_lock, embedder):
+            session = self.create_session(detector, parameters, detector_lock, embedder)
+            return session.detect_segment(video_path, segment)
+    
+    def merge_segment_results(self, parameters: Dict, results: List[Dict],
+                              frames_path: Optional[str] = None,
+                              elapsed: Optional[float] = None,
+                              raw_path: Optional[str] = None) -> Dict:
+        """
+        دمج نتائج المقاطع وتتبع كشوفاتها بالترتيب
+        
+        Args:
+            parameters: معاملات التحليل
+            results: نتائج المقاطع
+            frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
+            elapsed: الزمن الكلي للتحليل بالثواني
+            raw_path: مسار حفظ الكشوفات الخام والمسارات المدمجة (اختياري)
             
-        except Exception as e:
-            logger.error(f"Error in track_sperm: {str(e)}")
-            return []
+        Returns:
+            نتائج التحليل الكاملة
+        """
+        parameters = parameters or {}
+        tracker_name = parameters.get('tracker') or self.tracker_name
+        # The segments computed the appearance features; the shared embedder
+        # only saves DeepSORT from building its own
+        with self.borrow_models(tracker_name) as (detector, detector_lock, embedder):
+            session = self.create_session(detector, parameters, detector_lock, embedder)
+            return merge_segments(session, results, frames_path=frames_path, elapsed=elapsed,
+                                  raw_path=raw_path)
     
-    def calculate_velocity(self, track_id: int) -> float:
+    def reanalyze(self, raw_path: str, parameters: Optional[Dict] = None,
+                  frames_path: Optional[str] = None) -> Dict:
         """
-        حساب سرعة الحيوان المنوي
+        إعادة حساب النتائج من ملف الكشوفات الخام بمعاملات جديدة
+        
+        Only the post-processing parameters (motility threshold, buckets,
+        density normalization) change the result; no model is loaded.
         
         Args:
-            track_id: معرف التتبع
+            raw_path: مسار ملف النتائج الخام (.npz)
+            parameters: معاملات التحليل
+            frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
             
         Returns:
-            السرعة بالبكسل في الثانية
+            نتائج التحليل الكاملة
         """
-        try:
-            positions = self.track_history[track_id]['positions']
-            if len(positions) < 2:
-                return 0.0
+        start_time = time.perf_counter()
+        # No tracking, so no embedder
+        session = self.create_session(None, {**(parameters or {}), 'tracker': 'iou'})
+        results = rederive_results(session, load_raw_results(raw_path), frames_path=frames_path)
+        results['raw_path'] = raw_path
+        results['performance'] = {
+            'reanalyzed': True,
+            'processing_time': round(time.perf_counter() - start_time, 4)
+        }
+        return results
+    
+    def segment_config(self) -> Dict:
+        """إعدادات المحلل اللازمة لإنشاء محلل مماثل في عملية عامل"""
+        return {
+            'model_path': self.model_path,
+            'confidence_threshold': self.confidence_threshold,
+            'batch_size': self.batch_size,
+            'queue_size': self.queue_size,
+            'detector_backend': self.detector_backend,
+            'detector_threads': self.detector_threads,
+            'tracker': self.tracker_name,
+            'frame_spill_rows': self.frame_spill_rows,
+            'frame_spill_dir': self.frame_spill_dir,
+            'auto_resolution': self.auto_resolution,
+            'video_decoder': self.video_decoder,
+            'decoder_threads': self.decoder_threads,
+            'video_encoder': self.video_encoder
+        }
+    
+    def create_session(self, detector: BaseDetector, parameters: Optional[Dict] = None,
+                       detector_lock=None, embedder=None) -> AnalysisSession:
+        """
+        إنشاء جلسة تحليل بإعدادات المحلل الافتراضية
+        
+        Args:
+            detector: محرك الكشف المحمّل
+            parameters: معاملات التحليل
+            detector_lock: قفل الاستدلال أو None
+            embedder: شبكة التضمين المشتركة أو None
             
-            # Calculate distance between last two positions
-            p1 = positions[-2]
-            p2 = positions[-1]
-            distance = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
+        Returns:
+            جلسة التحليل
+        """
+        return AnalysisSession(
+            detector,
+            parameters,
+            detector_lock=detector_lock,
+            embedder=embedder,
+            tracker=self.tracker_name,
+            confidence_threshold=self.confidence_threshold,
+            batch_size=self.batch_size,
+            queue_size=self.queue_size,
+            frame_spill_rows=self.frame_spill_rows,
+            frame_spill_dir=self.frame_spill_dir,
+            auto_resolution=self.auto_resolution,
+            video_decoder=self.video_decoder,
+            decoder_threads=self.decoder_threads,
+            video_encoder=self.video_encoder
+        )
+    
+    @contextmanager
+    def live_session(self, parameters: Optional[Dict] = None, track_window: int = 300):
+        """
+        جلسة تحليل لبث مباشر (process_live_frame لكل إطار)
+        
+        The models stay borrowed while the stream is open. The track store
+        keeps only the last track_window frames, so memory stays bounded
+        however long the stream runs.
+        
+        Args:
+            parameters: معاملات التحليل
+            track_window: عدد الإطارات الأخيرة المحفوظة في سجل المسارات
             
-            # Assume 30 FPS for time calculation
-            time_diff = 1.0 / 30.0
-            velocity = distance / time_diff
+        Yields:
+            جلسة التحليل
+        """
+        parameters = parameters or {}
+        # Never unbounded (track_window 0) for a stream
+        parameters = {**parameters, 'track_window': int(parameters.get('track_window') or track_window)}
+        tracker_name = parameters.get('tracker') or self.tracker_name
+        with self.borrow_models(tracker_name) as (detector, detector_lock, embedder):
+            yield self.create_session(detector, parameters, detector_lock, embedder)
+    
+    @contextmanager
+    def borrow_models(self, tracker_name: str):
+        """
+        تجهيز النماذج لتحليل واحد
+        
+        With a registry the detector (and the DeepSORT embedder) are borrowed
+        ready and warmed up for the duration of the analysis; otherwise the
+        analyzer loads its own detector once and shares it between sessions.
+        
+        Args:
+            tracker_name: اسم المتتبع
             
-            return velocity
+        Yields:
+            (محرك الكشف، قفل الاستدلال أو None، شبكة التضمين المشتركة أو None)
+        """
+        if self.registry is None:
+            with self._detector_lock:
+                if not self.detector:
+                    if not self.load_model():
+                        raise Exception("Failed to load models")
+            yield self.detector, None if self.detector.thread_safe else self._detector_lock, None
+            return
+        
+        with ExitStack() as stack:
+            entry = stack.enter_context(self.registry.borrow_detector(
+                self.detector_backend, self.model_path, self.detector_threads))
+            embedder = None
+            if tracker_name == 'deepsort':
+                embedder = stack.enter_context(self.registry.borrow_embedder()).model
+            
+            # Backends that are not thread-safe are shared through the entry lock
+            yield entry.model, None if entry.model.thread_safe else entry.lock, embedder
+    
+    def detect_sperm(self, frame: np.ndarray) -> DetectionBatch:
+        """
+        كشف الحيوانات المنوية في الإطار
+        
+        Args:
+            frame: إطار الفيديو
             
-        except Exception as e:
-            logger.error(f"Error calculating velocity: {str(e)}")
-            return 0.0
+        Returns:
+            دفعة الكشوفات (to_dicts() للحصول على قواميس JSON)
+        """
+        return self.detect_sperm_batch([frame])[0]
     
-    def calculate_frame_metrics(self, tracks: List[Dict], frame_number: int, fps: float) -> Dict:
+    def detect_sperm_batch(self, frames: List[np.ndarray],
+                           tiling: Optional[Dict] = None) -> List[DetectionBatch]:
         """
-        حساب مقاييس الإطار
+        كشف الحيوانات المنوية في دفعة من الإطارات باستدعاء واحد للنموذج
         
         Args:
-            tracks: قائمة التتبع
-            frame_number: رقم الإطار
-            fps: معدل الإطارات في الثانية
+            frames: قائمة إطارات الفيديو
+            tiling: إعدادات الكشف بالبلاطات المتداخلة (None = الإطار كاملاً)
             
         Returns:
-            مقاييس الإطار
+            دفعة الكشوفات لكل إطار بنفس ترتيب الإطارات
         """
         try:
-            # Count active sperm
-            active_sperm = len(tracks)
-            
-            # Calculate motility metrics
-            motile_sperm = 0
-            total_velocity = 0
-            
-            for track in tracks:
-                velocity = track['velocity']
-                if velocity > 20:  # Threshold for motile sperm (pixels/second)
-                    motile_sperm += 1
-                total_velocity += velocity
-            
-            # Calculate motility percentage
-            motility_percentage = (motile_sperm / active_sperm * 100) if active_sperm > 0 else 0
-            
-            # Calculate average velocity
-            avg_velocity = total_velocity / active_sperm if active_sperm > 0 else 0
-            
-            # Calculate density (sperm per unit area)
-            # Assume frame size for density calculation
-            frame_area = 640 * 480  # Standard assumption
-            density = active_sperm / frame_area * 10000  # Per 10K pixels
-            
-            metrics = {
-                'active_sperm': active_sperm,
-                'motile_sperm': motile_sperm,
-                'motility_percentage': motility_percentage,
-                'average_velocity': avg_velocity,
-                'density': density,
-                'timestamp': frame_number / fps
-            }
-            
-            return metrics
+            # Run YOLOv8 detection on the whole batch
+            if tiling:
+                return self.detector.predict_tiled(frames, conf=self.confidence_threshold, **tiling)
+            return self.detector.predict(frames, conf=self.confidence_threshold)
             
         except Exception as e:
-            logger.error(f"Error calculating frame metrics: {str(e)}")
-            return {}
+            logger.error(f"Error in detect_sperm: {str(e)}")
+            return [DetectionBatch() for _ in frames]
     
-    def generate_final_analysis(self, frame_results: List[Dict], fps: float, duration: float) -> Dict:
+    def benchmark_batch_sizes(self, video_path: str, batch_sizes: List[int],
+                              max_frames: int = 120) -> List[Dict]:
         """
-        إنشاء التحليل النهائي
+        قياس سرعة الكشف (إطار/ثانية) لكل حجم دفعة
         
         Args:
-            frame_results: نتائج الإطارات
-            fps: معدل الإطارات في الثانية
-            duration: مدة الفيديو
+            video_path: مسار الفيديو
+            batch_sizes: أحجام الدفعات المراد قياسها
+            max_frames: أقصى عدد إطارات يتم قياسها
             
         Returns:
-            التحليل النهائي الكامل
+            قائمة بنتائج القياس لكل حجم دفعة
         """
-        try:
-            # Extract metrics data
-            sperm_counts = [frame['metrics'].get('active_sperm', 0) for frame in frame_results]
-            motility_percentages = [frame['metrics'].get('motility_percentage', 0) for frame in frame_results]
-            velocities = [frame['metrics'].get('average_velocity', 0) for frame in frame_results]
-            densities = [frame['metrics'].get('density', 0) for frame in frame_results]
-            
-            # Calculate summary statistics
-            total_sperm_detected = len(self.track_history)
-            max_concurrent_sperm = max(sperm_counts) if sperm_counts else 0
-            avg_sperm_count = np.mean(sperm_counts) if sperm_counts else 0
-            
-            # Motility analysis
-            avg_motility = np.mean(motility_percentages) if motility_percentages else 0
-            max_motility = max(motility_percentages) if motility_percentages else 0
-            
-            # Velocity analysis
-            avg_velocity = np.mean(velocities) if velocities else 0
-            max_velocity = max(velocities) if velocities else 0
-            
-            # Density analysis
-            avg_density = np.mean(densities) if densities else 0
-            max_density = max(densities) if densities else 0
-            
-            # Generate detailed track analysis
-            track_analysis = []
-            for track_id, track_data in self.track_history.items():
-                positions = track_data['positions']
-                if len(positions) > 1:
-                    # Calculate total distance traveled
-                    total_distance = 0
-                    for i in range(1, len(positions)):
-                        p1 = positions[i-1]
-                        p2 = positions[i]
-                        distance = np.sqrt((p2[0] - p1[0])**2 + (p2[1] - p1[1])**2)
-                        total_distance += distance
-                    
-                    # Calculate track duration
-                    track_duration = len(positions) / fps
-                    
-                    # Calculate average speed
-                    avg_speed = total_distance / track_duration if track_duration > 0 else 0
-                    
-                    track_analysis.append({
-                        'track_id': track_id,
-                        'duration': track_duration,
-                        'total_distance': total_distance,
-                        'average_speed': avg_speed,
-                        'positions_count': len(positions),
-                        'is_motile': avg_speed > 20
-                    })
-            
-            # Generate time series data for charts
-            time_series = []
-            for i, frame in enumerate(frame_results):
-                time_series.append({
-                    'time': i / fps,
-                    'sperm_count': frame['metrics'].get('active_sperm', 0),
-                    'motility': frame['metrics'].get('motility_percentage', 0),
-                    'velocity': frame['metrics'].get('average_velocity', 0),
-                    'density': frame['metrics'].get('density', 0)
-                })
-            
-            # Final results
-            final_results = {
-                'summary': {
-                    'total_sperm_detected': total_sperm_detected,
-                    'max_concurrent_sperm': max_concurrent_sperm,
-                    'average_sperm_count': round(avg_sperm_count, 2),
-                    'average_motility_percentage': round(avg_motility, 2),
-                    'max_motility_percentage': round(max_motility, 2),
-                    'average_velocity': round(avg_velocity, 2),
-                    'max_velocity': round(max_velocity, 2),
-                    'average_density': round(avg_density, 4),
-                    'max_density': round(max_density, 4),
-                    'video_duration': round(duration, 2),
-                    'total_frames': len(frame_results),
-                    'fps': fps
-                },
-                'detections': frame_results,
-                'tracks': track_analysis,
-                'time_series': time_series,
-                'statistics': {
-                    'motility_distribution': {
-                        'low': len([x for x in motility_percentages if x < 30]),
-                        'medium': len([x for x in motility_percentages if 30 <= x < 70]),
-                        'high': len([x for x in motility_percentages if x >= 70])
-                    },
-                    'velocity_distribution': {
-                        'slow': len([x for x in velocities if x < 20]),
-                        'medium': len([x for x in velocities if 20 <= x < 50]),
-                        'fast': len([x for x in velocities if x >= 50])
-                    },
-                    'density_statistics': {
-                        'min': min(densities) if densities else 0,
-                        'max': max(densities) if densities else 0,
-                        'mean': np.mean(densities) if densities else 0,
-                        'std': np.std(densities) if densities else 0
-                    }
-                }
-            }
-            
-            return final_results
-            
-        except Exception as e:
-            logger.error(f"Error generating final analysis: {str(e)}")
-            raise
+        if not self.detector:
+            if not self.load_model():
+                raise Exception("Failed to load models")
+        
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {video_path}")
+        
+        frames = []
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        
+        if not frames:
+            raise Exception(f"No frames decoded from: {video_path}")
+        
+        # Warm-up so the first measured batch size does not pay allocation cost
+        self.detect_sperm_batch(frames[:1])
+        
+        report = []
+        for batch_size in batch_sizes:
+            start_time = time.perf_counter()
+            for i in range(0, len(frames), batch_size):
+                self.detect_sperm_batch(frames[i:i + batch_size])
+            elapsed = time.perf_counter() - start_time
+            
+            report.append({
+                'batch_size': batch_size,
+                'frames': len(frames),
+                'processing_time': round(elapsed, 3),
+                'frames_per_second': round(len(frames) / elapsed, 2) if elapsed > 0 else 0
+            })
+            logger.info(f"Batch size {batch_size}: {report[-1]['frames_per_second']} frames/s")
+        
+        return report
     
     def save_analysis_video(self, video_path: str, output_path: str, results: Dict):
         """
         حفظ فيديو التحليل مع التصورات
         
+        Decodes the video a second time and only draws the frame counters;
+        analyze_video(render_path=...) renders boxes, ids and trails in the
+        same pass as the analysis.
+        
         Args:
             video_path: مسار الفيديو الأصلي
             output_path: مسار الفيديو المحفوظ
-            results: نتائج التحليل
+            results: نتائج التحليل (تُقرأ نتائج الإطارات من frames_path)
         """
         try:
+            frame_store = load_frame_store(results.get('frames_path'))
             cap = cv2.VideoCapture(video_path)
             fps = cap.get(cv2.CAP_PROP_FPS)
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -504,7 +500,7 @@ class SpermAnalyzer:
                     break
                 
                 # Add visualizations
-                frame = self.add_visualizations(frame, results, frame_count)
+                frame = self.add_visualizations(frame, frame_store, frame_count)
                 
                 out.write(frame)
                 frame_count += 1
@@ -517,13 +513,14 @@ class SpermAnalyzer:
         except Exception as e:
             logger.error(f"Error saving analysis video: {str(e)}")
     
-    def add_visualizations(self, frame: np.ndarray, results: Dict, frame_index: int) -> np.ndarray:
+    def add_visualizations(self, frame: np.ndarray, frame_store: Optional[FrameStore],
+                           frame_index: int) -> np.ndarray:
         """
         إضافة التصورات للإطار
         
         Args:
             frame: الإطار الأصلي
-            results: نتائج التحليل
+            frame_store: مخزن نتائج الإطارات أو None
             frame_index: رقم الإطار
             
         Returns:
@@ -531,20 +528,21 @@ class SpermAnalyzer:
         """
         try:
             # Get frame results
-            if frame_index < len(results['detections']):
-                frame_result = results['detections'][frame_index]
-                metrics = frame_result['metrics']
+            if frame_store is not None and frame_index < len(frame_store):
+                active_sperm = frame_store.column('active_sperm')[frame_index]
+                motility = frame_store.column('motility_percentage')[frame_index]
+                velocity = frame_store.column('average_velocity')[frame_index]
                 
                 # Add text overlay
-                cv2.putText(frame, f"Sperm Count: {metrics.get('active_sperm', 0)}", 
+                cv2.putText(frame, f"Sperm Count: {active_sperm}", 
                            (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(frame, f"Motility: {metrics.get('motility_percentage', 0):.1f}%", 
+                cv2.putText(frame, f"Motility: {motility:.1f}%", 
                            (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(frame, f"Avg Velocity: {metrics.get('average_velocity', 0):.1f}", 
+                cv2.putText(frame, f"Avg Velocity: {velocity:.1f}", 
                            (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
             return frame
             
         except Exception as e:
             logger.error(f"Error adding visualizations: {str(e)}")
-            return frame
\ No newline at end of file
+            return frame
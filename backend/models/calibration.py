@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+import logging
+import time
+from contextlib import nullcontext
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models.detectors import BaseDetector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INFERENCE_SIZES = (320, 480, 640, 960, 1280)
+
+def scaled_size(width: int, height: int, long_side: int) -> Tuple[int, int]:
+    """
+    أبعاد الإطار بعد تصغير الضلع الأطول إلى long_side (بدون تكبير)
+
+    Returns:
+        (العرض، الارتفاع)
+    """
+    scale = min(1.0, long_side / max(width, height))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+def resize_frame(frame: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """تصغير الإطار إلى (العرض، الارتفاع) إذا اختلف عن أبعاده"""
+    if (frame.shape[1], frame.shape[0]) == size:
+        return frame
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+def sample_frames(cap, count: int) -> List[np.ndarray]:
+    """
+    قراءة إطارات موزعة على طول الفيديو ثم إعادة القارئ إلى البداية
+
+    Args:
+        cap: قارئ الفيديو (cv2.VideoCapture أو قارئ من open_video)
+        count: عدد الإطارات
+
+    Returns:
+        الإطارات المقروءة
+    """
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    indices = np.linspace(0, max(total - 1, 0), num=max(1, count)).astype(int)
+    frames = []
+    for index in sorted(set(indices.tolist())):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = cap.read()
+        if ret:
+            # Readers may reuse their frame buffers
+            frames.append(frame.copy())
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    return frames
+
+def calibrate_inference_size(detector: BaseDetector, frames: List[np.ndarray], conf: float,
+                             sizes: Sequence[int] = DEFAULT_INFERENCE_SIZES,
+                             tolerance: float = 0.05, detector_lock=None) -> Dict:
+    """
+    اختيار أصغر دقة استدلال تحافظ على عدد الكشوفات
+
+    The sampled frames are downscaled to each candidate long side (never
+    above the native resolution) and detected with a matching model input
+    size. The smallest size whose detection count stays within tolerance
+    of the largest candidate is chosen. The baseline timing is the default
+    path (native frames resized inside the model) to estimate the speedup.
+
+    Args:
+        detector: محرك الكشف المحمّل
+        frames: إطارات العينة بالدقة الأصلية
+        conf: حد الثقة
+        sizes: أحجام الضلع الأطول المرشحة
+        tolerance: الفرق النسبي المسموح في عدد الكشوفات
+        detector_lock: قفل الاستدلال أو None
+
+    Returns:
+        نتيجة المعايرة (inference_size = None إذا تعذر الاختيار)
+    """
+    height, width = frames[0].shape[:2]
+    native = max(width, height)
+    stride = getattr(detector, 'stride', 32)
+
+    # Candidate long sides, rounded to the model stride and capped at native
+    candidates = sorted({min(native, max(stride, -(-int(size) // stride) * stride))
+                         for size in sizes if size > 0})
+
+    def timed_detection(batch: List[np.ndarray], imgsz: Optional[int]) -> Tuple[int, float]:
+        start = time.perf_counter()
+        with detector_lock or nullcontext():
+            detections = detector.predict(batch, conf=conf, imgsz=imgsz)
+        return sum(len(d) for d in detections), time.perf_counter() - start
+
+    # Default path, also warms up the model before the timed candidates
+    baseline_count, baseline_time = timed_detection(frames, None)
+
+    results = []
+    for size in candidates:
+        target = scaled_size(width, height, size)
+        resized = [resize_frame(frame, target) for frame in frames]
+        input_size = -(-max(target) // stride) * stride
+        try:
+            count, elapsed = timed_detection(resized, input_size)
+        except Exception as e:
+            logger.error(f"Error calibrating inference size {size}: {str(e)}")
+            continue
+        results.append({'size': size, 'frame_size': list(target), 'input_size': input_size,
+                        'detections': count, 'time': round(elapsed, 4)})
+
+    report = {
+        'native_size': [width, height],
+        'sampled_frames': len(frames),
+        'tolerance': tolerance,
+        'baseline': {'detections': baseline_count, 'time': round(baseline_time, 4)},
+        'candidates': results,
+        'inference_size': None,
+        'input_size': None,
+        'frame_size': [width, height],
+        'scale': 1.0,
+        'expected_speedup': 1.0
+    }
+    if not results:
+        return report
+
+    reference = results[-1]['detections']
+    if reference == 0:
+        # Nothing detected at any size: keep the default path
+        logger.info("Resolution calibration found no detections; keeping the default input size")
+        return report
+
+    chosen = next(r for r in results if abs(r['detections'] - reference) <= tolerance * reference)
+    report.update({
+        'inference_size': chosen['size'],
+        'input_size': chosen['input_size'],
+        'frame_size': chosen['frame_size'],
+        'scale': round(chosen['frame_size'][0] / width, 6),
+        'expected_speedup': round(baseline_time / chosen['time'], 2) if chosen['time'] > 0 else 1.0
+    })
+    logger.info(f"Calibrated inference size {chosen['size']} "
+                f"({chosen['detections']} vs {reference} detections, "
+                f"expected speedup {report['expected_speedup']}x)")
+    return report
@@ -0,0 +1,688 @@
+import cv2
+import numpy as np
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.cpu_budget import available_cores
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEIGHTS = 'yolov8n.pt'
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float,
+                        metric: str = 'iou', groups: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    إزالة الصناديق المتداخلة (NMS) بعمليات مصفوفات
+
+    Args:
+        boxes: الصناديق بصيغة (N, 4) xyxy
+        scores: درجات الثقة (N,)
+        iou_threshold: حد التداخل
+        metric: مقياس التداخل: iou، أو ios (التقاطع على مساحة الصندوق الأصغر)
+            والذي يزيل أجزاء الصناديق المقطوعة عند حدود البلاطات
+        groups: مجموعة كل صندوق (N,) أو None؛ لا يزيل صندوق صندوقاً من مجموعته
+
+    Returns:
+        مؤشرات الصناديق المحتفظ بها مرتبة حسب الثقة
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    order = np.argsort(-scores, kind='stable')
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        if metric == 'ios':
+            iou = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        else:
+            iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+
+        suppressed = iou > iou_threshold
+        if groups is not None:
+            suppressed &= groups[rest] != groups[i]
+        order = rest[~suppressed]
+
+    return np.asarray(keep, dtype=np.int64)
+
+class DetectionBatch:
+    """
+    كشوفات إطار واحد مخزنة في مصفوفات
+
+    Boxes (xyxy), confidences and class ids stay in NumPy arrays all the way
+    to the tracker; per-detection dicts are only built by to_dicts() where a
+    JSON representation is needed.
+    """
+
+    __slots__ = ('boxes', 'confidences', 'class_ids')
+
+    def __init__(self, boxes: Optional[np.ndarray] = None, confidences: Optional[np.ndarray] = None,
+                 class_ids: Optional[np.ndarray] = None):
+        """
+        تهيئة دفعة الكشوفات
+
+        Args:
+            boxes: الصناديق بصيغة (N, 4) xyxy
+            confidences: درجات الثقة (N,)
+            class_ids: معرفات الفئات (N,)
+        """
+        self.boxes = np.asarray(boxes if boxes is not None else (), dtype=np.float32).reshape(-1, 4)
+        count = len(self.boxes)
+        self.confidences = (np.asarray(confidences, dtype=np.float32).reshape(count)
+                            if confidences is not None else np.ones(count, dtype=np.float32))
+        self.class_ids = (np.asarray(class_ids, dtype=np.int64).reshape(count)
+                          if class_ids is not None else np.zeros(count, dtype=np.int64))
+
+    @classmethod
+    def from_array(cls, data: np.ndarray) -> 'DetectionBatch':
+        """
+        إنشاء الدفعة من مصفوفة (N, 6) بصيغة x1, y1, x2, y2, confidence, class
+
+        Args:
+            data: المصفوفة (نفس ترتيب boxes.data في ultralytics)
+
+        Returns:
+            دفعة الكشوفات
+        """
+        data = np.asarray(data, dtype=np.float32).reshape(-1, 6)
+        return cls(data[:, :4], data[:, 4], data[:, 5].astype(np.int64))
+
+    @classmethod
+    def concatenate(cls, batches: List['DetectionBatch']) -> 'DetectionBatch':
+        """دمج عدة دفعات في دفعة واحدة"""
+        if not batches:
+            return cls()
+        return cls(np.concatenate([b.boxes for b in batches]),
+                   np.concatenate([b.confidences for b in batches]),
+                   np.concatenate([b.class_ids for b in batches]))
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    @property
+    def centers(self) -> np.ndarray:
+        """مراكز الصناديق (N, 2)"""
+        return (self.boxes[:, :2] + self.boxes[:, 2:]) / 2
+
+    @property
+    def sizes(self) -> np.ndarray:
+        """أبعاد الصناديق (N, 2) عرض وارتفاع"""
+        return self.boxes[:, 2:] - self.boxes[:, :2]
+
+    def select(self, indices: np.ndarray) -> 'DetectionBatch':
+        """اختيار كشوفات محددة (مؤشرات أو قناع منطقي)"""
+        return DetectionBatch(self.boxes[indices], self.confidences[indices], self.class_ids[indices])
+
+    def shifted(self, dx: float, dy: float) -> 'DetectionBatch':
+        """إزاحة الصناديق (من إحداثيات البلاطة إلى إحداثيات الإطار)"""
+        return DetectionBatch(self.boxes + np.array([dx, dy, dx, dy], dtype=np.float32),
+                              self.confidences, self.class_ids)
+
+    def to_dicts(self) -> List[Dict]:
+        """
+        تحويل الكشوفات إلى قواميس (bbox, confidence, class_id, center, size)
+
+        Returns:
+            قائمة قواميس الكشف
+        """
+        centers = self.centers.tolist()
+        sizes = self.sizes.tolist()
+        return [
+            {
+                'bbox': bbox,
+                'confidence': confidence,
+                'class_id': class_id,
+                'center': center,
+                'size': size
+            }
+            for bbox, confidence, class_id, center, size in zip(
+                self.boxes.tolist(), self.confidences.tolist(), self.class_ids.tolist(), centers, sizes
+            )
+        ]
+
+class BaseDetector:
+    """
+    الواجهة المشتركة لمحركات الكشف
+
+    Every backend returns, for each input frame, a DetectionBatch in frame
+    coordinates.
+    """
+
+    name = 'base'
+    # Whether predict() may be called from several threads at once
+    thread_safe = False
+
+    def __init__(self, model_path: str = DEFAULT_WEIGHTS, imgsz: int = 640,
+                 iou_threshold: float = 0.7, max_det: int = 300, num_threads: int = 0):
+        """
+        تهيئة محرك الكشف
+
+        Args:
+            model_path: مسار أوزان YOLOv8 (.pt)
+            imgsz: حجم صورة الإدخال للنموذج
+            iou_threshold: حد التداخل لإزالة الصناديق المكررة
+            max_det: أقصى عدد كشوفات لكل إطار
+            num_threads: عدد خيوط الاستدلال (0 = الافتراضي)
+        """
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+        self.num_threads = num_threads
+        # Tile thread pools by worker count, shared by the sessions using
+        # this detector; they are only shut down by close()
+        self._tile_executors: Dict[int, ThreadPoolExecutor] = {}
+        self._tile_executor_lock = threading.Lock()
+
+    def resolve_weights(self) -> str:
+        """تحديد ملف الأوزان الفعلي (النموذج المخصص أو النموذج المدرب مسبقاً)"""
+        if os.path.exists(self.model_path):
+            logger.info(f"Using custom model from {self.model_path}")
+            return self.model_path
+
+        logger.info("Custom model not found, using pretrained YOLOv8 model")
+        return DEFAULT_WEIGHTS
+
+    def load(self):
+        """تحميل النموذج"""
+        raise NotImplementedError
+
+    def close(self):
+        """تحرير موارد المحرك (خيوط البلاطات)"""
+        with self._tile_executor_lock:
+            executors = list(self._tile_executors.values())
+            self._tile_executors.clear()
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+    def predict(self, frames: List[np.ndarray], conf: float,
+                imgsz: Optional[int] = None) -> List[DetectionBatch]:
+        """
+        تشغيل الكشف على دفعة إطارات
+
+        Args:
+            frames: قائمة الإطارات (BGR)
+            conf: حد الثقة
+            imgsz: حجم إدخال النموذج لهذا الاستدعاء (None = self.imgsz)
+
+        Returns:
+            دفعة الكشوفات لكل إطار
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def tile_origins(length: int, tile_size: int, overlap: int) -> List[int]:
+        """
+        حساب بدايات البلاطات على محور واحد بحيث تغطي الإطار بالكامل
+
+        Args:
+            length: طول المحور
+            tile_size: حجم البلاطة
+            overlap: التداخل بين البلاطات المتجاورة
+
+        Returns:
+            قائمة بدايات البلاطات
+        """
+        if length <= tile_size:
+            return [0]
+
+        step = max(1, tile_size - overlap)
+        origins = list(range(0, length - tile_size, step))
+        origins.append(length - tile_size)
+        return origins
+
+    def default_tile_workers(self) -> int:
+        """عدد عمال البلاطات الافتراضي: أنوية العامل (شريحة CPU) مقسومة على خيوط الاستدلال"""
+        if not self.thread_safe or self.num_threads <= 0:
+            return 1
+        return max(1, len(available_cores()) // self.num_threads)
+
+    def tile_executor(self, workers: int) -> ThreadPoolExecutor:
+        """
+        مجمع خيوط البلاطات لعدد عمال معين (يُنشأ مرة واحدة)
+
+        Sessions running at the same time may ask for different worker
+        counts; each count keeps its own pool, so no pool is replaced or
+        shut down while another session submits to it.
+
+        Args:
+            workers: عدد الخيوط
+
+        Returns:
+            مجمع الخيوط
+        """
+        with self._tile_executor_lock:
+            executor = self._tile_executors.get(workers)
+            if executor is None:
+                executor = self._tile_executors[workers] = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='detector-tiles')
+            return executor
+
+    def predict_tiled(self, frames: List[np.ndarray], conf: float, tile_size: int = 640,
+                      overlap: int = 64, workers: int = 0) -> List[DetectionBatch]:
+        """
+        الكشف على بلاطات متداخلة بالدقة الكاملة ثم دمج النتائج
+
+        All tiles of all frames form one batch. A thread-safe backend splits
+        it across worker threads; the others (the default ultralytics model
+        among them) run it as a single predict() batch, which keeps their
+        intra-op threads busy instead. Boxes are shifted back to frame
+        coordinates and merged across tiles (merge_tile_detections).
+
+        Args:
+            frames: قائمة الإطارات
+            conf: حد الثقة
+            tile_size: حجم البلاطة بالبكسل
+            overlap: التداخل بين البلاطات بالبكسل
+            workers: عدد خيوط تشغيل البلاطات (0 = تلقائي، للمحركات الآمنة للخيوط فقط)
+
+        Returns:
+            دفعة الكشوفات لكل إطار بإحداثيات الإطار
+        """
+        tiles = []
+        owners = []
+        tile_rects = [[] for _ in frames]
+        for index, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            for y in self.tile_origins(h, tile_size, overlap):
+                for x in self.tile_origins(w, tile_size, overlap):
+                    tile = frame[y:y + tile_size, x:x + tile_size]
+                    tiles.append(tile)
+                    owners.append((index, len(tile_rects[index]), x, y))
+                    tile_rects[index].append((x, y, x + tile.shape[1], y + tile.shape[0]))
+
+        workers = workers or self.default_tile_workers()
+        if not self.thread_safe:
+            workers = 1
+
+        if workers > 1 and len(tiles) > 1:
+            executor = self.tile_executor(workers)
+            chunk = -(-len(tiles) // workers)
+            futures = [
+                executor.submit(self.predict, tiles[i:i + chunk], conf)
+                for i in range(0, len(tiles), chunk)
+            ]
+            tile_detections = [dets for future in futures for dets in future.result()]
+        else:
+            tile_detections = self.predict(tiles, conf)
+
+        # Shift tile boxes back to frame coordinates
+        per_frame = [[] for _ in frames]
+        per_frame_tiles = [[] for _ in frames]
+        for (index, tile_id, x, y), detections in zip(owners, tile_detections):
+            if len(detections):
+                per_frame[index].append(detections.shifted(x, y))
+                per_frame_tiles[index].append(np.full(len(detections), tile_id, dtype=np.int64))
+
+        merged = []
+        for batches, tile_ids, rects in zip(per_frame, per_frame_tiles, tile_rects):
+            detections = DetectionBatch.concatenate(batches)
+            if len(detections) == 0:
+                merged.append(detections)
+                continue
+            merged.append(self.merge_tile_detections(detections, np.concatenate(tile_ids),
+                                                     np.asarray(rects, dtype=np.float32)))
+
+        return merged
+
+    def merge_tile_detections(self, detections: DetectionBatch, tile_ids: np.ndarray,
+                              tile_rects: np.ndarray) -> DetectionBatch:
+        """
+        إزالة تكرار الكشوفات بين البلاطات المتجاورة
+
+        Per-tile NMS has already run, so only boxes lying in an overlap
+        band (intersecting a tile other than their own) are compared, and
+        only with boxes from other tiles. Intersection over the smaller box
+        also removes the partial copy of a cell cut at a tile border;
+        neighbouring cells detected within one tile are never merged.
+
+        Args:
+            detections: كشوفات جميع بلاطات الإطار بإحداثيات الإطار
+            tile_ids: رقم بلاطة كل كشف (N,)
+            tile_rects: مستطيلات البلاطات (T, 4) xyxy
+
+        Returns:
+            الكشوفات المدمجة مرتبة حسب الثقة
+        """
+        boxes = detections.boxes
+        w = (np.minimum(boxes[:, None, 2], tile_rects[None, :, 2])
+             - np.maximum(boxes[:, None, 0], tile_rects[None, :, 0]))
+        h = (np.minimum(boxes[:, None, 3], tile_rects[None, :, 3])
+             - np.maximum(boxes[:, None, 1], tile_rects[None, :, 1]))
+        touches = (w > 0) & (h > 0)
+        touches[np.arange(len(boxes)), tile_ids] = False
+        in_band = touches.any(axis=1)
+
+        band = np.flatnonzero(in_band)
+        offsets = detections.class_ids[band, None].astype(np.float32) * 7680
+        band_keep = band[non_max_suppression(boxes[band] + offsets, detections.confidences[band],
+                                             0.5, metric='ios', groups=tile_ids[band])]
+
+        keep = np.concatenate([np.flatnonzero(~in_band), band_keep])
+        keep = keep[np.argsort(-detections.confidences[keep], kind='stable')][:self.max_det]
+        return detections.select(keep)
+
+class UltralyticsDetector(BaseDetector):
+    """محرك الكشف باستخدام كائن YOLO من ultralytics (PyTorch)"""
+
+    name = 'ultralytics'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.model = None
+
+    def load(self):
+        """تحميل نموذج YOLOv8"""
+        from ultralytics import YOLO
+
+        if self.num_threads > 0:
+            import torch
+            torch.set_num_threads(self.num_threads)
+
+        self.model = YOLO(self.resolve_weights())
+
+    def predict(self, frames: List[np.ndarray], conf: float,
+                imgsz: Optional[int] = None) -> List[DetectionBatch]:
+        import torch
+
+        results = self.model(frames, conf=conf, iou=self.iou_threshold, imgsz=imgsz or self.imgsz,
+                             max_det=self.max_det, verbose=False)
+
+        # One host transfer for the whole batch: [x1, y1, x2, y2, conf, cls] rows
+        tensors = [result.boxes.data[:, :6] if result.boxes is not None else None for result in results]
+        counts = [len(t) if t is not None else 0 for t in tensors]
+        if sum(counts) == 0:
+            return [DetectionBatch() for _ in results]
+
+        data = torch.cat([t for t in tensors if t is not None]).cpu().numpy()
+        splits = np.cumsum(counts)[:-1]
+        return [DetectionBatch.from_array(rows) for rows in np.split(data, splits)]
+
+class ExportedModelDetector(BaseDetector):
+    """
+    أساس محركات الكشف التي تعمل على نموذج مُصدَّر (ONNX / OpenVINO)
+
+    Pre-processing (letterbox) and post-processing (NMS, box rescaling)
+    mirror ultralytics so the detections match the PyTorch backend.
+    """
+
+    export_format = ''
+    thread_safe = True
+    stride = 32
+
+    def exported_path(self, weights: str) -> Path:
+        """مسار النموذج المُصدَّر المخزن بجانب ملف .pt"""
+        raise NotImplementedError
+
+    def export_model(self, weights: str) -> Path:
+        """
+        تصدير الأوزان مرة واحدة وتخزين الناتج بجانب ملف .pt
+
+        Args:
+            weights: مسار ملف .pt
+
+        Returns:
+            مسار النموذج المُصدَّر
+        """
+        target = self.exported_path(weights)
+        if target.exists():
+            return target
+
+        from ultralytics import YOLO
+
+        logger.info(f"Exporting {weights} to {self.export_format} (one-time)")
+        exported = YOLO(weights).export(format=self.export_format, imgsz=self.imgsz, dynamic=True)
+        return Path(exported)
+
+    def letterbox(self, frame: np.ndarray,
+                  imgsz: Optional[int] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """
+        تغيير حجم الإطار مع الحشو بنفس طريقة ultralytics
+
+        Args:
+            frame: الإطار الأصلي
+            imgsz: حجم الإدخال (None = self.imgsz)
+
+        Returns:
+            (الإطار المحشو، أبعاد الإدخال)
+        """
+        imgsz = imgsz or self.imgsz
+        h, w = frame.shape[:2]
+        r = min(imgsz / h, imgsz / w)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+
+        # Minimum rectangle: pad only up to the next stride multiple
+        dw = np.mod(imgsz - new_w, self.stride) / 2
+        dh = np.mod(imgsz - new_h, self.stride) / 2
+
+        if (w, h) != (new_w, new_h):
+            frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+        frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                                   value=(114, 114, 114))
+        return frame, frame.shape[:2]
+
+    def preprocess(self, frames: List[np.ndarray],
+                   imgsz: Optional[int] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """تحويل الإطارات إلى موتر NCHW بقيم بين 0 و 1"""
+        padded = [self.letterbox(frame, imgsz)[0] for frame in frames]
+        batch = np.stack(padded)[..., ::-1].transpose(0, 3, 1, 2)
+        batch = np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+        return batch, batch.shape[2:]
+
+    def postprocess(self, output: np.ndarray, input_shape: Tuple[int, int],
+                    frame_shape: Tuple[int, int], conf: float) -> DetectionBatch:
+        """
+        فك مخرجات YOLOv8 لإطار واحد
+
+        Args:
+            output: مخرجات النموذج بصيغة (4 + nc, N)
+            input_shape: أبعاد إدخال النموذج
+            frame_shape: أبعاد الإطار الأصلي
+            conf: حد الثقة
+
+        Returns:
+            دفعة الكشوفات
+        """
+        predictions = output.T
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_scores)), class_ids]
+
+        mask = scores > conf
+        if not mask.any():
+            return DetectionBatch()
+
+        xywh = predictions[mask, :4]
+        scores = scores[mask]
+        class_ids = class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        # Class-aware NMS via per-class coordinate offsets
+        offsets = class_ids[:, None].astype(boxes.dtype) * 7680
+        keep = non_max_suppression(boxes + offsets, scores, self.iou_threshold)[:self.max_det]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Map boxes back to frame coordinates
+        gain = min(input_shape[0] / frame_shape[0], input_shape[1] / frame_shape[1])
+        pad_x = round((input_shape[1] - frame_shape[1] * gain) / 2 - 0.1)
+        pad_y = round((input_shape[0] - frame_shape[0] * gain) / 2 - 0.1)
+        boxes[:, [0, 2]] -= pad_x
+        boxes[:, [1, 3]] -= pad_y
+        boxes /= gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, frame_shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, frame_shape[0])
+
+        return DetectionBatch(boxes, scores, class_ids)
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        """تشغيل النموذج على موتر الإدخال"""
+        raise NotImplementedError
+
+    def predict(self, frames: List[np.ndarray], conf: float,
+                imgsz: Optional[int] = None) -> List[DetectionBatch]:
+        # Frames of different sizes cannot share one padded tensor
+        if len({frame.shape for frame in frames}) > 1:
+            return [self.predict([frame], conf, imgsz)[0] for frame in frames]
+
+        batch, input_shape = self.preprocess(frames, imgsz)
+        outputs = self.run(batch)
+
+        return [
+            self.postprocess(output, input_shape, frame.shape[:2], conf)
+            for output, frame in zip(outputs, frames)
+        ]
+
+class OnnxRuntimeDetector(ExportedModelDetector):
+    """محرك الكشف باستخدام ONNX Runtime على المعالج"""
+
+    name = 'onnx'
+    export_format = 'onnx'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = None
+        self.input_name = None
+
+    def exported_path(self, weights: str) -> Path:
+        return Path(weights).with_suffix('.onnx')
+
+    def resolve_model_file(self) -> Path:
+        """تحديد ملف ONNX المراد تحميله (يُصدَّر عند الحاجة)"""
+        weights = self.resolve_weights()
+        if weights.endswith('.onnx'):
+            return Path(weights)
+        return self.export_model(weights)
+
+    def load(self):
+        """إنشاء جلسة ONNX Runtime مع تحسينات الرسم البياني"""
+        import onnxruntime as ort
+
+        model_file = self.resolve_model_file()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if self.num_threads > 0:
+            options.intra_op_num_threads = self.num_threads
+
+        self.session = ort.InferenceSession(str(model_file), sess_options=options,
+                                            providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        logger.info(f"Loaded ONNX Runtime model from {model_file}")
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+class OnnxInt8Detector(OnnxRuntimeDetector):
+    """
+    محرك الكشف بنموذج ONNX مكمّم INT8
+
+    The quantized model is produced by model/quantize.py and stored next to
+    the .pt weights as <name>_int8.onnx.
+    """
+
+    name = 'onnx-int8'
+
+    def quantized_path(self, weights: str) -> Path:
+        """مسار النموذج المكمّم بجانب ملف .pt"""
+        weights = Path(weights)
+        return weights.parent / f"{weights.stem}_int8.onnx"
+
+    def resolve_model_file(self) -> Path:
+        weights = self.resolve_weights()
+        if weights.endswith('.onnx'):
+            return Path(weights)
+
+        model_file = self.quantized_path(weights)
+        if not model_file.exists():
+            raise FileNotFoundError(
+                f"Quantized model not found: {model_file}. Run model/quantize.py first."
+            )
+        return model_file
+
+class OpenVINODetector(ExportedModelDetector):
+    """
+    محرك الكشف باستخدام OpenVINO على المعالج
+
+    Calling the compiled model directly goes through one shared infer
+    request, so each calling thread gets its own request instead; the
+    compiled model itself is shared.
+    """
+
+    name = 'openvino'
+    export_format = 'openvino'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compiled_model = None
+        self._requests = threading.local()
+
+    def exported_path(self, weights: str) -> Path:
+        weights = Path(weights)
+        return weights.parent / f"{weights.stem}_openvino_model"
+
+    def load(self):
+        """تحميل نموذج OpenVINO IR وتجميعه للمعالج"""
+        from openvino.runtime import Core
+
+        model_dir = self.export_model(self.resolve_weights())
+        xml_path = next(Path(model_dir).glob('*.xml'))
+
+        config = {'PERFORMANCE_HINT': 'THROUGHPUT'}
+        if self.num_threads > 0:
+            config['INFERENCE_NUM_THREADS'] = str(self.num_threads)
+
+        core = Core()
+        self.compiled_model = core.compile_model(core.read_model(str(xml_path)), 'CPU', config)
+        self._requests = threading.local()
+        logger.info(f"Loaded OpenVINO model from {xml_path}")
+
+    def run(self, batch: np.ndarray) -> np.ndarray:
+        request = getattr(self._requests, 'request', None)
+        if request is None:
+            request = self._requests.request = self.compiled_model.create_infer_request()
+        return request.infer([batch])[self.compiled_model.output(0)]
+
+DETECTOR_BACKENDS = {
+    UltralyticsDetector.name: UltralyticsDetector,
+    OnnxRuntimeDetector.name: OnnxRuntimeDetector,
+    OnnxInt8Detector.name: OnnxInt8Detector,
+    OpenVINODetector.name: OpenVINODetector,
+}
+
+def create_detector(backend: str = 'ultralytics', **kwargs) -> BaseDetector:
+    """
+    إنشاء محرك كشف حسب الإعدادات
+
+    Args:
+        backend: اسم المحرك (ultralytics, onnx, onnx-int8, openvino)
+        kwargs: معاملات المحرك
+
+    Returns:
+        محرك الكشف (غير محمّل بعد)
+    """
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unsupported detector backend: {backend}. "
+                         f"Available: {', '.join(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[backend](**kwargs)
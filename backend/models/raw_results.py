@@ -0,0 +1,183 @@
+import numpy as np
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from models.detectors import DetectionBatch
+from models.track_store import TrackStore
+from utils.frame_store import FrameStore
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of the raw results file changes
+RAW_FORMAT_VERSION = 1
+
+# Parameters applied after detection and tracking (re-derivable from a raw file)
+POSTPROCESSING_PARAMETERS = ('motility_threshold', 'motility_buckets', 'velocity_buckets',
+                             'density_area', 'density_unit')
+
+# Parameters that only change what is written, not the detections and tracks
+OUTPUT_PARAMETERS = ('cache', 'summary_only', 'frame_spill_rows', 'render_video',
+                     'render_trail_length', 'video_encoder')
+
+class DetectionRecorder:
+    """
+    سجل كشوفات كل إطار أثناء التحليل
+
+    Boxes are kept in native video coordinates (float32) with their
+    confidences, frame after frame; a frame without a detector pass
+    (analysis stride, motion gate) records no detections.
+    """
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.boxes: List[np.ndarray] = []
+        self.confidences: List[np.ndarray] = []
+
+    def add(self, detections: Optional[DetectionBatch], box_scale: Optional[np.ndarray] = None):
+        """
+        إضافة كشوفات الإطار التالي
+
+        Args:
+            detections: دفعة الكشوفات أو None
+            box_scale: معامل تحويل الصناديق إلى دقة الفيديو الأصلية أو None
+        """
+        if detections is None or not len(detections.boxes):
+            self.counts.append(0)
+            return
+        boxes = detections.boxes
+        if box_scale is not None:
+            boxes = (boxes * box_scale).astype(np.float32)
+        self.counts.append(len(boxes))
+        self.boxes.append(boxes)
+        self.confidences.append(detections.confidences)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        الكشوفات المسجلة كمصفوفات
+
+        Returns:
+            عدد الكشوفات لكل إطار (F,) والصناديق (D, 4) ودرجات الثقة (D,)
+        """
+        boxes = np.concatenate(self.boxes) if self.boxes else np.empty((0, 4), dtype=np.float32)
+        confidences = (np.concatenate(self.confidences) if self.confidences
+                       else np.empty(0, dtype=np.float32))
+        return {
+            'det_counts': np.asarray(self.counts, dtype=np.int32),
+            'det_boxes': boxes,
+            'det_confidences': confidences
+        }
+
+def save_raw_results(path: str, trajectories: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+                     detections: Dict[str, np.ndarray], fps: float, duration: float,
+                     analysis_stride: int = 1, skipped_static_frames: int = 0):
+    """
+    حفظ الكشوفات الخام ومسارات التتبع كملف .npz
+
+    Everything the metrics are computed from: the trajectories of all
+    tracks and the per-frame detections. Frame indices of the trajectories
+    are frame numbers of the video.
+
+    Args:
+        path: مسار الملف
+        trajectories: مسارات التتبع (TrackStore.trajectories)
+        detections: الكشوفات (DetectionRecorder.arrays)
+        fps: معدل الإطارات في الثانية
+        duration: مدة الفيديو
+        analysis_stride: خطوة الكشف
+        skipped_static_frames: عدد الإطارات الساكنة التي تم تخطي كشفها
+    """
+    track_ids, offsets, positions, frames = trajectories
+    with open(path, 'wb') as f:
+        np.savez(
+            f,
+            format=RAW_FORMAT_VERSION,
+            track_ids=track_ids,
+            offsets=offsets,
+            positions=positions,
+            frames=frames,
+            **detections,
+            fps=fps,
+            duration=duration,
+            analysis_stride=analysis_stride,
+            skipped_static_frames=skipped_static_frames
+        )
+
+def load_raw_results(path: str) -> Dict:
+    """
+    تحميل ملف النتائج الخام
+
+    Args:
+        path: مسار ملف .npz
+
+    Returns:
+        المصفوفات والقيم المحفوظة
+    """
+    with np.load(path) as data:
+        if int(data['format']) != RAW_FORMAT_VERSION:
+            raise Exception(f"Unsupported raw results format in {path}")
+        raw = {name: data[name] for name in data.files}
+    for name in ('fps', 'duration'):
+        raw[name] = float(raw[name])
+    for name in ('analysis_stride', 'skipped_static_frames'):
+        raw[name] = int(raw[name])
+    return raw
+
+def rederive_results(session, raw: Dict, frames_path: Optional[str] = None) -> Dict:
+    """
+    إعادة حساب الملخص والإحصائيات ونتائج الإطارات من النتائج الخام
+
+    The per-frame metrics of calculate_frame_metrics are recomputed for
+    all frames at once: the velocity of every observation is its step from
+    the previous observation of the same track (0 for the first one), and
+    counts and sums per frame come from bincount over the frame indices.
+    Only the session's post-processing parameters are used; detection and
+    tracking are not run again.
+
+    Args:
+        session: جلسة التحليل بالمعاملات الجديدة (بدون كشف أو تتبع)
+        raw: النتائج الخام (load_raw_results)
+        frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
+
+    Returns:
+        نتائج التحليل
+    """
+    offsets = raw['offsets']
+    positions = raw['positions']
+    frames = raw['frames'].astype(np.int64)
+    det_counts = raw['det_counts']
+    fps = raw['fps']
+    frame_count = len(det_counts)
+
+    # Same arithmetic as calculate_velocity (30 FPS time base)
+    velocities = np.zeros(len(frames))
+    if len(frames) > 1:
+        steps = positions[1:] - positions[:-1]
+        velocities[1:] = np.hypot(steps[:, 0], steps[:, 1]) / (np.maximum(np.diff(frames), 1) / 30.0)
+        velocities[offsets] = 0.0
+
+    active = np.bincount(frames, minlength=frame_count)
+    motile = np.bincount(frames[velocities > session.motility_threshold], minlength=frame_count)
+    total_velocity = np.bincount(frames, weights=velocities, minlength=frame_count)
+    divisor = np.maximum(active, 1)
+    columns = {
+        'frame_number': np.arange(frame_count, dtype=np.int64),
+        'timestamp': np.arange(frame_count) / fps,
+        'detections': det_counts.astype(np.int64),
+        'tracks': active,
+        'active_sperm': active,
+        'motile_sperm': motile,
+        'motility_percentage': np.where(active > 0, motile / divisor * 100, 0.0),
+        'average_velocity': np.where(active > 0, total_velocity / divisor, 0.0),
+        'density': active / session.density_area * session.density_unit
+    }
+
+    running_summary = session.make_running_summary()
+    running_summary.update_columns(columns)
+    session.track_store = TrackStore.from_trajectories(raw['track_ids'], offsets, positions, raw['frames'])
+    final_results = session.generate_final_analysis(fps, raw['duration'], running_summary)
+    if frames_path and not session.summary_only:
+        FrameStore.from_columns(columns).save(frames_path)
+        final_results['frames_path'] = frames_path
+    final_results['summary']['analysis_stride'] = raw['analysis_stride']
+    final_results['summary']['skipped_static_frames'] = raw['skipped_static_frames']
+    return final_results
@@ -0,0 +1,282 @@
+import numpy as np
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from models.detectors import create_detector
+from models.trackers import create_embedder
+
+logger = logging.getLogger(__name__)
+
+def _process_rss() -> Optional[int]:
+    """ذاكرة العملية المقيمة بالبايت (None إذا لم تتوفر psutil)"""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+class ModelEntry:
+    """نموذج محمّل في السجل"""
+
+    __slots__ = ('key', 'model', 'lock', 'borrowers', 'uses', 'last_used',
+                 'memory_bytes', 'load_time', 'warmup_time')
+
+    def __init__(self, key: Tuple, model):
+        self.key = key
+        self.model = model
+        # Serializes predict() for backends that are not thread-safe
+        self.lock = threading.Lock()
+        self.borrowers = 0
+        self.uses = 0
+        self.last_used = time.time()
+        self.memory_bytes = 0
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+
+    def as_dict(self) -> Dict:
+        kind, *details = self.key
+        return {
+            'kind': kind,
+            'key': [str(part) for part in details],
+            'borrowers': self.borrowers,
+            'uses': self.uses,
+            'memory_mb': round(self.memory_bytes / (1024 * 1024), 1),
+            'load_time': round(self.load_time, 3),
+            'warmup_time': round(self.warmup_time, 3)
+        }
+
+class ModelRegistry:
+    """
+    سجل النماذج المشتركة داخل العملية
+
+    Detectors and the DeepSORT appearance embedder are loaded once per
+    process, warmed up on a dummy frame (so the first analysis does not pay
+    for lazy initialization, kernel selection and allocator growth) and
+    lent to analyses with borrow(). Models that are not borrowed are
+    unloaded least-recently-used first when the estimated memory of the
+    loaded models exceeds the budget.
+    """
+
+    def __init__(self, memory_budget_mb: int = 0, warmup_runs: int = 1,
+                 warmup_shape: Tuple[int, int] = (480, 640)):
+        """
+        تهيئة السجل
+
+        Args:
+            memory_budget_mb: حد ذاكرة النماذج المحملة بالميغابايت (0 = بدون حد)
+            warmup_runs: عدد استدلالات الإحماء لكل نموذج
+            warmup_shape: أبعاد إطار الإحماء (الارتفاع، العرض)
+        """
+        self.memory_budget = max(0, int(memory_budget_mb)) * 1024 * 1024
+        self.warmup_runs = max(0, int(warmup_runs))
+        self.warmup_shape = tuple(warmup_shape)
+        self.entries: 'OrderedDict[Tuple, ModelEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple, threading.Event] = {}
+        self.evictions = 0
+
+    @staticmethod
+    def detector_key(backend: str, model_path: str, num_threads: int = 0) -> Tuple:
+        return ('detector', backend, model_path, int(num_threads))
+
+    @staticmethod
+    def embedder_key() -> Tuple:
+        return ('embedder', 'mobilenet')
+
+    def _load(self, key: Tuple):
+        """تحميل نموذج حسب مفتاحه"""
+        kind = key[0]
+        if kind == 'detector':
+            _, backend, model_path, num_threads = key
+            detector = create_detector(backend, model_path=model_path, num_threads=num_threads)
+            detector.load()
+            return detector
+        if kind == 'embedder':
+            return create_embedder()
+        raise ValueError(f"Unknown model kind: {kind}")
+
+    def _warm_up(self, key: Tuple, model):
+        """تشغيل استدلالات على إطار فارغ"""
+        height, width = self.warmup_shape
+        for _ in range(self.warmup_runs):
+            if key[0] == 'detector':
+                model.predict([np.zeros((height, width, 3), dtype=np.uint8)], conf=0.5)
+            else:
+                model.predict([np.zeros((64, 32, 3), dtype=np.uint8)])
+
+    @staticmethod
+    def _estimate_size(key: Tuple, model) -> int:
+        """تقدير حجم النموذج من ملف الأوزان عند غياب قياس الذاكرة"""
+        if key[0] == 'detector' and os.path.exists(key[2]):
+            return os.path.getsize(key[2])
+        return 0
+
+    def _acquire(self, key: Tuple) -> ModelEntry:
+        """الحصول على نموذج محمّل (تحميله وإحماؤه عند الحاجة)"""
+        while True:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    entry.borrowers += 1
+                    entry.uses += 1
+                    entry.last_used = time.time()
+                    return entry
+                pending = self._loading.get(key)
+                if pending is None:
+                    self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading the same model
+            pending.wait()
+
+        try:
+            rss_before = _process_rss()
+            start = time.perf_counter()
+            model = self._load(key)
+            loaded = time.perf_counter()
+            self._warm_up(key, model)
+            entry = ModelEntry(key, model)
+            entry.load_time = loaded - start
+            entry.warmup_time = time.perf_counter() - loaded
+            rss_after = _process_rss()
+            if rss_before is not None and rss_after is not None and rss_after > rss_before:
+                entry.memory_bytes = rss_after - rss_before
+            else:
+                entry.memory_bytes = self._estimate_size(key, model)
+            logger.info(f"Model {key} loaded in {entry.load_time:.2f}s, "
+                        f"warmed up in {entry.warmup_time:.2f}s")
+
+            with self._lock:
+                entry.borrowers = 1
+                entry.uses = 1
+                self.entries[key] = entry
+                self._evict()
+            return entry
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def _evict(self):
+        """تفريغ النماذج غير المستعارة الأقدم استخداماً حتى العودة تحت الحد (يُستدعى مع القفل)"""
+        if not self.memory_budget:
+            return
+
+        for key in list(self.entries):
+            if self.memory_bytes <= self.memory_budget:
+                break
+            entry = self.entries[key]
+            if entry.borrowers > 0:
+                continue
+            self._unload(entry)
+
+    def _unload(self, entry: ModelEntry):
+        """حذف نموذج من السجل (يُستدعى مع القفل)"""
+        del self.entries[entry.key]
+        close = getattr(entry.model, 'close', None)
+        if close is not None:
+            close()
+        entry.model = None
+        self.evictions += 1
+        gc.collect()
+        logger.info(f"Model {entry.key} unloaded")
+
+    def _release(self, entry: ModelEntry):
+        with self._lock:
+            entry.borrowers -= 1
+            entry.last_used = time.time()
+            self._evict()
+
+    @contextmanager
+    def borrow(self, key: Tuple):
+        """
+        استعارة نموذج طوال مدة التحليل
+
+        Args:
+            key: مفتاح النموذج (detector_key أو embedder_key)
+
+        Yields:
+            سجل النموذج (model وقفل الاستدلال)
+        """
+        entry = self._acquire(key)
+        try:
+            yield entry
+        finally:
+            self._release(entry)
+
+    @contextmanager
+    def borrow_detector(self, backend: str, model_path: str, num_threads: int = 0):
+        """
+        استعارة محرك كشف
+
+        Yields:
+            سجل محرك الكشف
+        """
+        with self.borrow(self.detector_key(backend, model_path, num_threads)) as entry:
+            yield entry
+
+    @contextmanager
+    def borrow_embedder(self):
+        """
+        استعارة شبكة تضمين DeepSORT
+
+        Yields:
+            سجل شبكة التضمين
+        """
+        with self.borrow(self.embedder_key()) as entry:
+            yield entry
+
+    def preload(self, keys: List[Tuple]) -> Dict:
+        """
+        تحميل النماذج وإحماؤها مسبقاً
+
+        Args:
+            keys: مفاتيح النماذج
+
+        Returns:
+            حالة السجل
+        """
+        for key in keys:
+            with self.borrow(key):
+                pass
+        return self.status()
+
+    def unload(self, key: Tuple) -> bool:
+        """
+        تفريغ نموذج غير مستعار
+
+        Returns:
+            True إذا تم التفريغ
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.borrowers > 0:
+                return False
+            self._unload(entry)
+            return True
+
+    @property
+    def memory_bytes(self) -> int:
+        """الذاكرة التقديرية للنماذج المحملة"""
+        return sum(entry.memory_bytes for entry in self.entries.values())
+
+    def status(self) -> Dict:
+        """
+        حالة السجل
+
+        Returns:
+            النماذج المحملة واستخدام الذاكرة
+        """
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'models': [entry.as_dict() for entry in self.entries.values()],
+                'memory_mb': round(self.memory_bytes / (1024 * 1024), 1),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 1),
+                'evictions': self.evictions
+            }
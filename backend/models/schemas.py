@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 
+from utils.running_stats import bucket_edges
+
 class AnalysisStatus(str, Enum):
     """حالة التحليل"""
     PENDING = "pending"
@@ -51,6 +53,13 @@ class TrackAnalysis(BaseModel):
     average_speed: float = Field(..., description="متوسط السرعة")
     positions_count: int = Field(..., description="عدد المواضع")
     is_motile: bool = Field(..., description="هل متحرك")
+    vcl: float = Field(0.0, description="السرعة المنحنية VCL (بكسل/ثانية)")
+    vsl: float = Field(0.0, description="السرعة الخطية VSL (بكسل/ثانية)")
+    vap: float = Field(0.0, description="سرعة المسار المتوسط VAP (بكسل/ثانية)")
+    lin: float = Field(0.0, description="الخطية LIN = VSL/VCL")
+    str: float = Field(0.0, description="الاستقامة STR = VSL/VAP")
+    alh: float = Field(0.0, description="سعة الإزاحة الجانبية للرأس ALH (بكسل)")
+    bcf: float = Field(0.0, description="تردد عبور المسار المتوسط BCF (هرتز)")
 
 class TimeSeriesData(BaseModel):
     """بيانات السلسلة الزمنية"""
@@ -79,11 +88,22 @@ class DensityStatistics(BaseModel):
     mean: float = Field(..., description="المتوسط")
     std: float = Field(..., description="الانحراف المعياري")
 
+class CasaStatistics(BaseModel):
+    """متوسطات مقاييس CASA للمسارات"""
+    vcl: float = Field(0.0, description="متوسط السرعة المنحنية")
+    vsl: float = Field(0.0, description="متوسط السرعة الخطية")
+    vap: float = Field(0.0, description="متوسط سرعة المسار المتوسط")
+    lin: float = Field(0.0, description="متوسط الخطية")
+    str: float = Field(0.0, description="متوسط الاستقامة")
+    alh: float = Field(0.0, description="متوسط سعة الإزاحة الجانبية")
+    bcf: float = Field(0.0, description="متوسط تردد العبور")
+
 class Statistics(BaseModel):
     """الإحصائيات"""
     motility_distribution: MotilityDistribution = Field(..., description="توزيع الحركة")
     velocity_distribution: VelocityDistribution = Field(..., description="توزيع السرعة")
     density_statistics: DensityStatistics = Field(..., description="إحصائيات الكثافة")
+    casa: Optional[CasaStatistics] = Field(None, description="مقاييس CASA")
 
 class VideoInfo(BaseModel):
     """معلومات الفيديو"""
@@ -108,6 +128,8 @@ class AnalysisSummary(BaseModel):
     video_duration: float = Field(..., description="مدة الفيديو")
     total_frames: int = Field(..., description="إجمالي الإطارات")
     fps: float = Field(..., description="معدل الإطارات")
+    analysis_stride: int = Field(1, description="تشغيل الكشف على كل k إطار")
+    skipped_static_frames: int = Field(0, description="عدد الإطارات الساكنة التي تم تخطي كشفها")
 
 class AnalysisResult(BaseModel):
     """نتيجة التحليل"""
@@ -118,6 +140,9 @@ class AnalysisResult(BaseModel):
     tracks: List[TrackAnalysis] = Field(..., description="التتبعات")
     time_series: List[TimeSeriesData] = Field(..., description="بيانات السلسلة الزمنية")
     statistics: Statistics = Field(..., description="الإحصائيات")
+    performance: Dict[str, Any] = Field(default_factory=dict, description="مقاييس الأداء")
+    frames_path: Optional[str] = Field(None, description="ملف أعمدة نتائج الإطارات (.npz)")
+    raw_path: Optional[str] = Field(None, description="ملف الكشوفات الخام ومسارات التتبع (.npz) لإعادة الحساب")
     parameters: Dict[str, Any] = Field(..., description="معاملات التحليل")
     timestamp: str = Field(..., description="الطابع الزمني")
 
@@ -126,7 +151,55 @@ class AnalysisRequest(BaseModel):
     confidence_threshold: Optional[float] = Field(0.5, description="حد الثقة")
     max_detections: Optional[int] = Field(100, description="أقصى عدد كشوفات")
     tracking_max_age: Optional[int] = Field(50, description="أقصى عمر للتتبع")
+    tracker: Optional[str] = Field(None, description="المتتبع (deepsort أو iou، الافتراضي من الإعدادات)")
+    summary_only: Optional[bool] = Field(False, description="حساب الملخص فقط بدون حفظ نتائج كل إطار")
+    frame_spill_rows: Optional[int] = Field(None, description="عدد الإطارات الذي تنتقل بعده النتائج إلى ملفات مربوطة بالذاكرة")
+    track_window: Optional[int] = Field(0, description="عدد الإطارات الأخيرة المحفوظة في سجل المسارات (0 = الفيديو كاملاً)")
     motility_threshold: Optional[float] = Field(20.0, description="حد الحركة")
+    motility_buckets: Optional[List[float]] = Field(None, description="حدود فئات نسبة الحركة (منخفضة/متوسطة/عالية)، الافتراضي [30, 70]")
+    velocity_buckets: Optional[List[float]] = Field(None, description="حدود فئات السرعة (بطيئة/متوسطة/سريعة)، الافتراضي [20, 50]")
+    density_area: Optional[float] = Field(307200.0, description="مساحة الإطار المستخدمة لحساب الكثافة بالبكسل")
+    density_unit: Optional[float] = Field(10000.0, description="عدد البكسلات في وحدة الكثافة")
+    batch_size: Optional[int] = Field(8, description="عدد الإطارات في دفعة الكشف")
+    analysis_stride: Optional[int] = Field(1, description="تشغيل الكشف على كل k إطار")
+    tile_size: Optional[int] = Field(0, description="حجم بلاطة الكشف بالبكسل (0 = الإطار كاملاً)")
+    tile_overlap: Optional[int] = Field(64, description="التداخل بين البلاطات بالبكسل")
+    tile_workers: Optional[int] = Field(0, description="عدد خيوط تشغيل البلاطات (0 = تلقائي)")
+    motion_gate: Optional[bool] = Field(False, description="تخطي الكشف في الإطارات الساكنة")
+    motion_threshold: Optional[float] = Field(0.0001, description="نسبة البكسلات المتغيرة التي تعتبر حركة")
+    auto_resolution: Optional[bool] = Field(None, description="معايرة دقة الاستدلال لكل فيديو (الافتراضي من الإعدادات)")
+    inference_sizes: Optional[List[int]] = Field(None, description="أحجام الضلع الأطول المرشحة للمعايرة")
+    resolution_tolerance: Optional[float] = Field(0.05, description="الفرق النسبي المسموح في عدد الكشوفات")
+    calibration_frames: Optional[int] = Field(5, description="عدد إطارات عينة المعايرة")
+    video_decoder: Optional[str] = Field(None, description="مفكك ترميز الفيديو: auto أو ffmpeg أو opencv (الافتراضي من الإعدادات)")
+    segments: Optional[int] = Field(None, description="عدد المقاطع الزمنية المحللة بالتوازي (الافتراضي من الإعدادات)")
+    cache: Optional[bool] = Field(True, description="استخدام نتائج تحليل سابق لنفس الفيديو والمعاملات")
+    render_video: Optional[bool] = Field(False, description="إنتاج فيديو MP4 مرسوم بالمربعات والمعرفات والمسارات أثناء التحليل")
+    render_trail_length: Optional[int] = Field(30, description="عدد المواقع الأخيرة المرسومة لكل مسار")
+    video_encoder: Optional[str] = Field(None, description="مرمز الفيديو المرسوم: auto أو ffmpeg أو opencv (الافتراضي من الإعدادات)")
+
+    @field_validator('motility_buckets', 'velocity_buckets')
+    @classmethod
+    def check_bucket_edges(cls, value: Optional[List[float]],
+                          info: ValidationInfo) -> Optional[List[float]]:
+        """حدان تصاعديان غير سالبين لفئات الملخص الثلاث"""
+        return None if value is None else list(bucket_edges(value, info.field_name))
+    
+class ReanalysisRequest(BaseModel):
+    """طلب إعادة حساب النتائج من الكشوفات الخام بمعاملات ما بعد المعالجة"""
+    motility_threshold: Optional[float] = Field(None, description="حد الحركة")
+    motility_buckets: Optional[List[float]] = Field(None, description="حدود فئات نسبة الحركة")
+    velocity_buckets: Optional[List[float]] = Field(None, description="حدود فئات السرعة")
+    density_area: Optional[float] = Field(None, description="مساحة الإطار المستخدمة لحساب الكثافة بالبكسل")
+    density_unit: Optional[float] = Field(None, description="عدد البكسلات في وحدة الكثافة")
+    summary_only: Optional[bool] = Field(None, description="حساب الملخص فقط بدون نتائج كل إطار")
+
+    @field_validator('motility_buckets', 'velocity_buckets')
+    @classmethod
+    def check_bucket_edges(cls, value: Optional[List[float]],
+                          info: ValidationInfo) -> Optional[List[float]]:
+        """حدان تصاعديان غير سالبين لفئات الملخص الثلاث"""
+        return None if value is None else list(bucket_edges(value, info.field_name))
     
 class AnalysisStatusResponse(BaseModel):
     """استجابة حالة التحليل"""
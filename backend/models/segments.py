@@ -0,0 +1,320 @@
+import numpy as np
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from models.detectors import DetectionBatch
+from models.raw_results import DetectionRecorder, save_raw_results
+from utils.frame_store import FrameStore
+from utils.video_decoder import probe_video
+
+logger = logging.getLogger(__name__)
+
+# Shortest segment worth a process of its own
+MIN_SEGMENT_FRAMES = 30
+
+class DetectionLog:
+    """
+    سجل ما يستقبله المتتبع في كل إطار من مقطع
+
+    Frame after frame: the detections (boxes in inference coordinates, as
+    the tracker receives them) or a count of -1 for a frame without a
+    detector pass, where the tracker only predicts. For trackers that use
+    appearance the features of the detections are kept as well, so the
+    merge never needs the frames again.
+    """
+
+    def __init__(self, skip_frames: int = 0):
+        """
+        Args:
+            skip_frames: عدد الإطارات الأولى غير المسجلة (قبل بداية المقطع)
+        """
+        self.skip_frames = skip_frames
+        self.counts: List[int] = []
+        self.boxes: List[np.ndarray] = []
+        self.confidences: List[np.ndarray] = []
+        self.class_ids: List[np.ndarray] = []
+        self.embedding_counts: List[int] = []
+        self.embeddings: List[np.ndarray] = []
+        self.appearance = False
+
+    def add(self, detections: Optional[DetectionBatch], embeddings: Optional[np.ndarray] = None):
+        """
+        إضافة مدخلات المتتبع للإطار التالي
+
+        Args:
+            detections: دفعة الكشوفات أو None (تنبؤ فقط)
+            embeddings: ميزات المظهر للكشوفات (BaseTracker.embed) أو None
+        """
+        if self.skip_frames:
+            self.skip_frames -= 1
+            return
+        if detections is None:
+            self.counts.append(-1)
+            self.embedding_counts.append(0)
+            return
+        self.counts.append(len(detections))
+        self.appearance = self.appearance or embeddings is not None
+        self.boxes.append(detections.boxes)
+        self.confidences.append(detections.confidences)
+        self.class_ids.append(detections.class_ids)
+        count = len(embeddings) if embeddings is not None else 0
+        self.embedding_counts.append(count)
+        if count:
+            self.embeddings.append(embeddings)
+
+    def arrays(self) -> Dict[str, Optional[np.ndarray]]:
+        """
+        السجل كمصفوفات
+
+        Returns:
+            counts (F,)، boxes (D, 4)، confidences (D,)، class_ids (D,)،
+            embedding_counts (F,) و embeddings (E, K)، أو None لمتتبع بدون مظهر
+        """
+        embeddings = None
+        if self.embeddings:
+            embeddings = np.concatenate(self.embeddings)
+        elif self.appearance:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        return {
+            'counts': np.asarray(self.counts, dtype=np.int32),
+            'boxes': np.concatenate(self.boxes) if self.boxes else np.empty((0, 4), dtype=np.float32),
+            'confidences': (np.concatenate(self.confidences) if self.confidences
+                            else np.empty(0, dtype=np.float32)),
+            'class_ids': (np.concatenate(self.class_ids) if self.class_ids
+                          else np.empty(0, dtype=np.int64)),
+            'embedding_counts': np.asarray(self.embedding_counts, dtype=np.int32),
+            'embeddings': embeddings
+        }
+
+def iterate_detections(detections: Dict[str, np.ndarray], embeddings: Optional[np.ndarray] = None):
+    """
+    مدخلات المتتبع إطاراً بإطار من سجل مقطع
+
+    Args:
+        detections: السجل (DetectionLog.arrays بدون embeddings)
+        embeddings: ميزات المظهر للمقطع أو None
+
+    Yields:
+        (دفعة الكشوفات أو None، ميزات المظهر أو None)
+    """
+    counts = detections['counts']
+    ends = np.cumsum(np.maximum(counts, 0)).tolist()
+    embedding_ends = np.cumsum(detections['embedding_counts']).tolist()
+    start = embedding_start = 0
+    for count, end, embedding_end in zip(counts.tolist(), ends, embedding_ends):
+        if count < 0:
+            yield None, None
+            continue
+        batch = DetectionBatch(detections['boxes'][start:end], detections['confidences'][start:end],
+                               detections['class_ids'][start:end])
+        features = None
+        if embeddings is not None:
+            features = np.asarray(embeddings[embedding_start:embedding_end])
+        yield batch, features
+        start, embedding_start = end, embedding_end
+
+def plan_segments(total_frames: int, segments: int, stride: int = 1,
+                  min_frames: int = MIN_SEGMENT_FRAMES) -> List[Dict]:
+    """
+    تقسيم الفيديو إلى مقاطع زمنية متجاورة
+
+    Each segment owns the frames [start, end). Boundaries are multiples of
+    the analysis stride, so every segment detects on the same frames as a
+    serial run. Segments shorter than min_frames are not worth a process;
+    fewer segments are planned.
+
+    Args:
+        total_frames: عدد إطارات الفيديو
+        segments: عدد المقاطع المطلوب
+        stride: خطوة الكشف (analysis_stride)
+        min_frames: أقل عدد إطارات في المقطع
+
+    Returns:
+        قائمة المقاطع (index, start, end)
+    """
+    total_frames = max(0, int(total_frames))
+    stride = max(1, int(stride))
+    segments = max(1, min(int(segments), total_frames // max(1, int(min_frames)) or 1))
+
+    size = -(-total_frames // segments)
+    size = max(stride, -(-size // stride) * stride)
+    plan = []
+    for start in range(0, max(total_frames, 1), size):
+        plan.append({
+            'index': len(plan),
+            'start': start,
+            'end': min(total_frames, start + size)
+        })
+    return plan
+
+def plan_video_segments(video_path: str, parameters: Dict) -> List[Dict]:
+    """
+    تخطيط مقاطع التحليل المتوازي لفيديو
+
+    Args:
+        video_path: مسار الفيديو
+        parameters: معاملات التحليل (segments, analysis_stride)
+
+    Returns:
+        قائمة المقاطع
+    """
+    info = probe_video(video_path)
+    if info is None:
+        raise Exception(f"Cannot open video file: {video_path}")
+    return plan_segments(
+        info['frame_count'],
+        int(parameters.get('segments') or 1),
+        stride=int(parameters.get('analysis_stride', 1))
+    )
+
+def prepare_video_segments(session, video_path: str, parameters: Dict) -> List[Dict]:
+    """
+    تخطيط المقاطع وتجهيز ما يجب حسابه بالترتيب على كامل الفيديو
+
+    With auto_resolution the inference resolution is calibrated once, on
+    frames sampled over the whole video, and every segment uses it.
+    The motion gate decides from every earlier frame, so with a gate the
+    video is scanned once in order (no detection) and each segment gets
+    the decisions for its own stride frames. A segment that starts on a
+    static frame reuses detections from before its start: it starts at
+    the last frame the gate detected on (reference_frame) instead, and
+    its detection log leaves out the frames before start.
+
+    Args:
+        session: جلسة بمعاملات التحليل
+        video_path: مسار الفيديو
+        parameters: معاملات التحليل
+
+    Returns:
+        قائمة المقاطع (مع resolution: نتيجة المعايرة، و reference_frame و motion:
+        قرارات بوابة الحركة من reference_frame)
+    """
+    plan = plan_video_segments(video_path, parameters)
+    if session.auto_resolution:
+        session.calibrate_video(video_path)
+        if session.resolution is not None:
+            for segment in plan:
+                segment['resolution'] = session.resolution
+    if session.motion_gate is not None:
+        decisions = session.scan_motion(video_path).tolist()
+        stride = session.analysis_stride
+        for segment in plan:
+            first = segment['start'] // stride
+            last = first + -(-(segment['end'] - segment['start']) // stride)
+            reference = first
+            while 0 < reference < len(decisions) and not decisions[reference]:
+                reference -= 1
+            segment['reference_frame'] = reference * stride
+            segment['motion'] = decisions[reference:last]
+    return plan
+
+def merge_segments(session, results: List[Dict], frames_path: Optional[str] = None,
+                   elapsed: Optional[float] = None, raw_path: Optional[str] = None) -> Dict:
+    """
+    دمج نتائج المقاطع في نتيجة تحليل واحدة
+
+    The segments only detected. Their detections (and appearance
+    features) are fed, in frame order, to the tracker of the merge
+    session, which receives exactly what the tracker of a serial run
+    receives: tracks, metrics, frames file and raw file are the same as
+    run() would produce. Tracking is cheap next to detection, so the
+    serial replay costs little of the parallel gain.
+
+    Args:
+        session: جلسة التحليل بنفس المتتبع ومعاملات المقاطع
+        results: نتائج المقاطع (detect_segment) بأي ترتيب
+        frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (اختياري)
+        elapsed: الزمن الكلي للتحليل المتوازي بالثواني
+        raw_path: مسار حفظ الكشوفات الخام ومسارات التتبع بصيغة .npz (اختياري)
+
+    Returns:
+        نتائج التحليل الكاملة
+    """
+    results = sorted(results, key=lambda result: result['segment']['index'])
+    fps = results[0]['fps']
+    total_frames = results[0]['total_frames']
+    duration = total_frames / fps if fps > 0 else 0
+    session.box_scale = results[0]['box_scale']
+    if raw_path:
+        session.detection_recorder = DetectionRecorder()
+
+    frame_store = None
+    if frames_path and not session.summary_only:
+        frame_store = FrameStore(spill_rows=session.frame_spill_rows,
+                                 spill_dir=session.frame_spill_dir)
+    try:
+        replay_start = time.perf_counter()
+        for result in results:
+            embeddings = None
+            if result['embeddings_path']:
+                embeddings = np.load(result['embeddings_path'], mmap_mode='r')
+            frame_number = result['segment']['start']
+            for detections, features in iterate_detections(result['detections'], embeddings):
+                session.track_frame(None, detections, frame_store, frame_number, fps, features)
+                frame_number += 1
+            del embeddings
+        session.frame_count = frame_number
+        replay_time = time.perf_counter() - replay_start
+
+        final_results = session.generate_final_analysis(fps, duration, session.running_summary)
+        persist_start = time.perf_counter()
+        if frame_store is not None:
+            frame_store.save(frames_path)
+            final_results['frames_path'] = frames_path
+    finally:
+        if frame_store is not None:
+            frame_store.close()
+        for result in results:
+            if result['embeddings_path'] and os.path.exists(result['embeddings_path']):
+                os.remove(result['embeddings_path'])
+
+    performances = [result['performance'] for result in results]
+    skipped = sum(result['skipped_static_frames'] for result in results)
+    if raw_path:
+        save_raw_results(raw_path, session.track_store.trajectories(),
+                         session.detection_recorder.arrays(), fps, duration,
+                         performances[0]['analysis_stride'], skipped)
+        final_results['raw_path'] = raw_path
+    session.stage_timings.get('persist').observe(time.perf_counter() - persist_start)
+    
+    # Decode and inference timings of all segments (tracking ran in the merge)
+    for result in results:
+        session.stage_timings.merge(result['instrumentation']['stages'])
+        session.queue_depths.merge(result['instrumentation']['queue_depth'])
+    frame_count = session.running_summary.frames
+    busy_time = sum(p['processing_time'] for p in performances) + replay_time
+    elapsed = elapsed if elapsed is not None else max(p['processing_time'] for p in performances)
+    inference_stats = {
+        'detected_frames': sum(p['detected_frames'] for p in performances),
+        'detection_time': sum(p['detection_time'] for p in performances)
+    }
+    final_results['summary']['analysis_stride'] = performances[0]['analysis_stride']
+    final_results['summary']['skipped_static_frames'] = skipped
+    final_results['performance'] = {
+        **performances[0],
+        'detected_frames': inference_stats['detected_frames'],
+        'skipped_static_frames': skipped,
+        'detection_time': round(inference_stats['detection_time'], 3),
+        'processing_time': round(elapsed, 3),
+        'frames_per_second': round(frame_count / elapsed, 2) if elapsed > 0 else 0,
+        'speedup': session._detection_speedup(busy_time, frame_count, inference_stats),
+        # Wall-clock gain over running the segments one after another
+        'parallel_speedup': round(busy_time / elapsed, 2) if elapsed > 0 else 1.0,
+        'track_store_bytes': session.track_store.nbytes,
+        'summary_only': session.summary_only,
+        'segments': [
+            {'index': result['segment']['index'], 'start': result['segment']['start'],
+             'end': result['segment']['end'], 'processing_time': p['processing_time'],
+             'frames_per_second': p['frames_per_second']}
+            for result, p in zip(results, performances)
+        ],
+        'tracking_time': round(replay_time, 3),
+        'stages': session.stage_timings.summary()
+    }
+    final_results['instrumentation'] = session.instrumentation()
+
+    logger.info(f"Merged {len(results)} segments (tracking {replay_time:.2f}s, "
+                f"{final_results['performance']['frames_per_second']} frames/s)")
+    return final_results
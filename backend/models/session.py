@@ -0,0 +1,1047 @@
+import cv2
+import numpy as np
+import logging
+from contextlib import nullcontext
+from typing import Callable, Dict, List, Optional
+import os
+import tempfile
+import time
+
+from models.calibration import (
+    DEFAULT_INFERENCE_SIZES, calibrate_inference_size, sample_frames
+)
+from models.detectors import BaseDetector, DetectionBatch
+from models.raw_results import DetectionRecorder, save_raw_results
+from models.segments import DetectionLog
+from models.trackers import create_tracker
+from models.track_store import TrackStore
+from utils.frame_store import FrameStore
+from utils.kinematics import CASA_METRICS, compute_track_kinematics
+from utils.metrics import QUEUE_DEPTH_BUCKETS, HistogramSet
+from utils.motion_gate import MotionGate, RecordedMotionGate
+from utils.pipeline import StagePipeline
+from utils.renderer import FrameRenderer
+from utils.running_stats import RunningSummary, bucket_edges
+from utils.video_decoder import open_video
+from utils.video_encoder import open_video_writer
+
+logger = logging.getLogger(__name__)
+
+class AnalysisSession:
+    """
+    جلسة تحليل فيديو واحد
+    
+    A session owns everything that changes during one analysis: the
+    parameters, the tracker, the track store, the running summary and the
+    per-frame results. The detector (and the DeepSORT embedder) are the
+    only objects shared with other sessions and are used read-only, so
+    several sessions can analyze videos at the same time in one process.
+    """
+    
+    def __init__(self, detector: BaseDetector, parameters: Optional[Dict] = None,
+                 detector_lock=None, embedder=None, tracker: str = "deepsort",
+                 confidence_threshold: float = 0.5, batch_size: int = 8, queue_size: int = 16,
+                 frame_spill_rows: int = 100000, frame_spill_dir: Optional[str] = None,
+                 auto_resolution: bool = False, video_decoder: str = "auto",
+                 decoder_threads: int = 0, video_encoder: str = "auto"):
+        """
+        تهيئة الجلسة
+        
+        Args:
+            detector: محرك الكشف المحمّل (مشترك، للقراءة فقط)
+            parameters: معاملات التحليل
+            detector_lock: قفل الاستدلال لمحركات الكشف غير الآمنة للخيوط (None = بدون قفل)
+            embedder: شبكة التضمين المشتركة لـ DeepSORT أو None
+            tracker: المتتبع الافتراضي (deepsort أو iou)
+            confidence_threshold: حد الثقة الافتراضي
+            batch_size: حجم الدفعة الافتراضي
+            queue_size: حجم الطوابير الافتراضي
+            frame_spill_rows: عدد الإطارات الذي تنتقل بعده نتائج الإطارات إلى ملفات مربوطة بالذاكرة
+            frame_spill_dir: مجلد ملفات نتائج الإطارات المؤقتة
+            auto_resolution: معايرة دقة الاستدلال عند بدء التحليل
+            video_decoder: مفكك ترميز الفيديو (auto أو ffmpeg أو opencv)
+            decoder_threads: خيوط فك الترميز لـ ffmpeg (0 = تلقائي)
+            video_encoder: مرمز فيديو النتائج المرسوم (auto أو ffmpeg أو opencv)
+        """
+        parameters = parameters or {}
+        self.detector = detector
+        self.detector_lock = detector_lock
+        self.parameters = parameters
+        
+        # Analysis parameters (defaults come from the analyzer configuration)
+        self.confidence_threshold = parameters.get('confidence_threshold', confidence_threshold)
+        self.batch_size = max(1, int(parameters.get('batch_size', batch_size)))
+        self.queue_size = max(self.batch_size, int(parameters.get('queue_size', queue_size)))
+        self.analysis_stride = max(1, int(parameters.get('analysis_stride', 1)))
+        self.tiling = None
+        if parameters.get('tile_size'):
+            self.tiling = {
+                'tile_size': int(parameters['tile_size']),
+                'overlap': int(parameters.get('tile_overlap', 64)),
+                'workers': int(parameters.get('tile_workers', 0))
+            }
+        self.tracker_name = parameters.get('tracker') or tracker
+        self.motion_gate = None
+        if parameters.get('motion_gate'):
+            self.motion_gate = MotionGate(
+                threshold=float(parameters.get('motion_threshold', 0.0001)),
+                max_skip=int(parameters.get('motion_max_skip', 30))
+            )
+        self.summary_only = bool(parameters.get('summary_only', False))
+        self.frame_spill_rows = int(parameters.get('frame_spill_rows', frame_spill_rows))
+        self.frame_spill_dir = frame_spill_dir
+        self.video_decoder = parameters.get('video_decoder') or video_decoder
+        self.decoder_threads = int(parameters.get('decoder_threads', decoder_threads))
+        
+        # Post-processing parameters: they only turn the tracks into metrics,
+        # so a raw results file can be re-derived with new values
+        self.motility_threshold = float(parameters.get('motility_threshold', 20))
+        self.motility_buckets = bucket_edges(parameters.get('motility_buckets') or (30, 70),
+                                             'motility_buckets')
+        self.velocity_buckets = bucket_edges(parameters.get('velocity_buckets') or (20, 50),
+                                             'velocity_buckets')
+        self.density_area = float(parameters.get('density_area', 640 * 480))
+        self.density_unit = float(parameters.get('density_unit', 10000))
+        
+        # Annotated video rendering (only when run() gets a render_path)
+        self.video_encoder = parameters.get('video_encoder') or video_encoder
+        self.render_trail_length = int(parameters.get('render_trail_length', 30))
+        self.render_crf = int(parameters.get('render_crf', 23))
+        self.render_path: Optional[str] = None
+        self.render_stats: Optional[Dict] = None
+        
+        # Inference resolution: frames are downscaled once at decode time to
+        # frame_size and boxes are mapped back to native coordinates
+        self.auto_resolution = bool(auto_resolution if parameters.get('auto_resolution') is None
+                                    else parameters['auto_resolution'])
+        self.inference_sizes = parameters.get('inference_sizes') or DEFAULT_INFERENCE_SIZES
+        self.resolution_tolerance = float(parameters.get('resolution_tolerance', 0.05))
+        self.calibration_frames = int(parameters.get('calibration_frames', 5))
+        self.resolution: Optional[Dict] = None
+        self.inference_size: Optional[int] = None
+        self.frame_size = None
+        self.box_scale: Optional[np.ndarray] = None
+        
+        # Tracking state (fresh for every session)
+        tracker_kwargs = {'embedder': embedder} if embedder is not None else {}
+        self.tracking_max_age = int(parameters.get('tracking_max_age', 50))
+        self.tracker = create_tracker(
+            self.tracker_name,
+            max_age=self.tracking_max_age,
+            **tracker_kwargs
+        )
+        self.track_store = TrackStore(window=int(parameters.get('track_window', 0)))
+        self.running_summary = self.make_running_summary()
+        self.detection_recorder: Optional[DetectionRecorder] = None
+        
+        # Per-stage timings (seconds per frame, per batch for inference) and
+        # queue depths; every histogram is written by one stage thread only
+        self.stage_timings = HistogramSet()
+        self.queue_depths = HistogramSet(QUEUE_DEPTH_BUCKETS)
+        self.inference_stats = {'detected_frames': 0, 'detection_time': 0.0,
+                                'skipped_static_frames': 0}
+        self.frame_count = 0
+    
+    def make_running_summary(self) -> RunningSummary:
+        """ملخص متدفق جديد بحدود فئات الجلسة"""
+        return RunningSummary(self.motility_buckets, self.velocity_buckets)
+    
+    def run(self, video_path: str, frames_path: Optional[str] = None,
+            progress_callback: Optional[Callable[[int, int, Dict], None]] = None,
+            render_path: Optional[str] = None, raw_path: Optional[str] = None) -> Dict:
+        """
+        تحليل الفيديو
+        
+        Args:
+            video_path: مسار الفيديو
+            frames_path: مسار حفظ نتائج الإطارات بصيغة .npz (None = لا تُحفظ نتائج كل إطار)
+            progress_callback: دالة تستدعى كل 30 إطاراً بـ (الإطارات المعالجة، إجمالي الإطارات، الملخص الحالي)
+            render_path: مسار فيديو MP4 المرسوم بنتائج التتبع (اختياري)
+            raw_path: مسار حفظ الكشوفات الخام ومسارات التتبع بصيغة .npz (اختياري)
+            
+        Returns:
+            نتائج التحليل الكاملة
+        """
+        try:
+            if raw_path:
+                self.detection_recorder = DetectionRecorder()
+            # Aggregates are updated per frame; per-frame rows are only kept
+            # (in the frames file) when the client wants more than the summary
+            frame_store = None
+            if frames_path and not self.summary_only:
+                frame_store = FrameStore(spill_rows=self.frame_spill_rows,
+                                         spill_dir=self.frame_spill_dir)
+            try:
+                video = self._process(video_path, frame_store, progress_callback,
+                                      render_path=render_path)
+                
+                # Generate final analysis
+                final_results = self.generate_final_analysis(video['fps'], video['duration'],
+                                                             self.running_summary)
+                persist_start = time.perf_counter()
+                if frame_store is not None:
+                    frame_store.save(frames_path)
+                    final_results['frames_path'] = frames_path
+            finally:
+                if frame_store is not None:
+                    frame_store.close()
+            final_results['summary']['analysis_stride'] = self.analysis_stride
+            final_results['summary']['skipped_static_frames'] = self.inference_stats['skipped_static_frames']
+            if raw_path:
+                save_raw_results(raw_path, self.track_store.trajectories(),
+                                 self.detection_recorder.arrays(), video['fps'], video['duration'],
+                                 self.analysis_stride, self.inference_stats['skipped_static_frames'])
+                final_results['raw_path'] = raw_path
+            self.stage_timings.get('persist').observe(time.perf_counter() - persist_start)
+            final_results['performance'] = self.performance(video['elapsed'], self.frame_count)
+            final_results['instrumentation'] = self.instrumentation()
+            if self.render_stats is not None:
+                final_results['performance']['render'] = self.render_stats
+                if self.render_stats['error'] is None:
+                    final_results['annotated_video_path'] = render_path
+            
+            logger.info(f"Video analysis completed successfully "
+                        f"({final_results['performance']['frames_per_second']} frames/s, "
+                        f"batch size {self.batch_size})")
+            return final_results
+            
+        except Exception as e:
+            logger.error(f"Error in analyze_video: {str(e)}")
+            raise
+    
+    def detect_segment(self, video_path: str, segment: Dict) -> Dict:
+        """
+        كشف الحيوانات المنوية في مقطع زمني (للتحليل المتوازي للمقاطع)
+        
+        Only detection runs here: for every frame of the segment the log
+        keeps what the tracker would receive (the detections, or None for a
+        frame without a detector pass) and, for trackers that use
+        appearance, the features of the detections. Tracking runs afterwards
+        over all segments in frame order (merge_segments), so the result is
+        the same as a serial run. With a motion gate the segment follows the
+        decisions of the serial scan (prepare_video_segments) instead of
+        starting its own gate, from the last frame the gate detected on, so
+        static frames at its start reuse the same detections. The inference
+        resolution calibrated for the whole video comes with the segment.
+        
+        Args:
+            video_path: مسار الفيديو
+            segment: المقطع من prepare_segments (start, end، و resolution مع المعايرة،
+                و reference_frame و motion مع بوابة الحركة)
+            
+        Returns:
+            نتيجة المقطع: سجل الكشوفات وملف الميزات والأداء
+        """
+        try:
+            first_frame = segment['start']
+            if self.motion_gate is not None and segment.get('motion') is not None:
+                self.motion_gate = RecordedMotionGate(segment['motion'])
+                first_frame = segment['reference_frame']
+            log = DetectionLog(skip_frames=segment['start'] - first_frame)
+            video = self._process(video_path, None, start_frame=first_frame,
+                                  end_frame=segment['end'], detection_log=log,
+                                  resolution=segment.get('resolution'))
+            detections = log.arrays()
+            
+            if first_frame < segment['start']:
+                # Only the reference frame was detected before the segment,
+                # the gate skipped the other stride frames there
+                self.inference_stats['detected_frames'] -= 1
+                self.inference_stats['skipped_static_frames'] -= (
+                    -(-(segment['start'] - first_frame) // self.analysis_stride) - 1)
+            
+            # Appearance features can be large: they go to a temporary file
+            # that the merge maps and deletes
+            embeddings = detections.pop('embeddings')
+            embeddings_path = None
+            if embeddings is not None:
+                if self.frame_spill_dir:
+                    os.makedirs(self.frame_spill_dir, exist_ok=True)
+                fd, embeddings_path = tempfile.mkstemp(prefix='embeddings_', suffix='.npy',
+                                                       dir=self.frame_spill_dir)
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, embeddings)
+            
+            return {
+                'segment': {key: segment[key] for key in ('index', 'start', 'end')},
+                'fps': video['fps'],
+                'total_frames': video['total_frames'],
+                'detections': detections,
+                'embeddings_path': embeddings_path,
+                'box_scale': self.box_scale,
+                'skipped_static_frames': self.inference_stats['skipped_static_frames'],
+                'performance': self.performance(video['elapsed'], self.frame_count - segment['start']),
+                'instrumentation': self.instrumentation()
+            }
+            
+        except Exception as e:
+            logger.error(f"Error analyzing segment {segment.get('index')}: {str(e)}")
+            raise
+    
+    def scan_motion(self, video_path: str) -> np.ndarray:
+        """
+        قرارات بوابة الحركة لكامل الفيديو (مسح تسلسلي بدون كشف)
+        
+        The gate compares every frame with the last frame the detector ran
+        on, so its decisions depend on all earlier frames. They are made
+        once, in order, on the frames the inference stage would see, and
+        each segment replays its part of them.
+        
+        Args:
+            video_path: مسار الفيديو
+            
+        Returns:
+            قرار الكشف لكل إطار يمر بالبوابة (كل analysis_stride إطار)
+        """
+        if self.auto_resolution and self.resolution is None:
+            self.calibrate_video(video_path)
+        # The gate sees the frames at the inference resolution
+        cap = self.open_video(video_path, self.frame_size)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {video_path}")
+        
+        decisions = []
+        try:
+            frame_index = 0
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                if frame_index % self.analysis_stride == 0:
+                    decisions.append(self.motion_gate.should_detect(frame))
+                frame_index += 1
+        finally:
+            cap.release()
+            self.motion_gate.reset()
+        return np.asarray(decisions, dtype=bool)
+    
+    def _process(self, video_path: str, frame_store: Optional[FrameStore],
+                 progress_callback: Optional[Callable[[int, int, Dict], None]] = None,
+                 start_frame: int = 0, end_frame: Optional[int] = None,
+                 render_path: Optional[str] = None,
+                 detection_log: Optional[DetectionLog] = None,
+                 resolution: Optional[Dict] = None) -> Dict:
+        """
+        تشغيل خط المعالجة على إطارات الفيديو
+        
+        Args:
+            video_path: مسار الفيديو
+            frame_store: مخزن نتائج الإطارات أو None
+            progress_callback: دالة التقدم أو None
+            start_frame: أول إطار
+            end_frame: الإطار الذي يتوقف عنده التحليل (None = نهاية الفيديو)
+            render_path: مسار الفيديو المرسوم أو None
+            detection_log: سجل الكشوفات بدل التتبع (مقاطع التحليل المتوازي) أو None
+            resolution: نتيجة معايرة سابقة للفيديو (None = المعايرة هنا)
+            
+        Returns:
+            خصائص الفيديو (fps, total_frames, duration) وزمن المعالجة
+        """
+        # Open video (the decoder ring also covers the render queue)
+        self.render_path = render_path
+        cap = self.open_video(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {video_path}")
+        
+        try:
+            # Get video properties
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            duration = total_frames / fps if fps > 0 else 0
+            
+            logger.info(f"Video properties: {width}x{height}, {fps} FPS, {duration:.2f}s")
+            
+            if self.auto_resolution:
+                if resolution is not None:
+                    self.apply_resolution(resolution, width, height)
+                else:
+                    self.calibrate_resolution(cap)
+                if self.frame_size is not None:
+                    # Reopen so the decoder downscales while decoding
+                    cap.release()
+                    cap = self.open_video(video_path, self.frame_size)
+            
+            # Frame numbers (and timestamps) stay relative to the whole video
+            if start_frame > 0:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            self.frame_count = start_frame
+            frame_limit = None if end_frame is None else max(0, end_frame - start_frame)
+            
+            inference_stats = self.inference_stats
+            start_time = time.perf_counter()
+            
+            # Decode and inference run in their own threads, connected by
+            # bounded queues; tracking and metrics consume results in order
+            pipeline = StagePipeline()
+            frame_queue = pipeline.make_queue(self.queue_size)
+            detection_queue = pipeline.make_queue(self.queue_size)
+            pipeline.start_stage('decode', self._decode_stage, pipeline, cap, frame_queue,
+                                 frame_limit)
+            pipeline.start_stage('inference', self._inference_stage, pipeline,
+                                 frame_queue, detection_queue, self.batch_size,
+                                 self.analysis_stride, inference_stats, self.tiling,
+                                 self.motion_gate)
+            
+            # Optional render stage: draws on the decoded frames after
+            # tracking and feeds the encoder, so the video is not decoded twice
+            render_queue = render_thread = None
+            if render_path:
+                render_queue = pipeline.make_queue(self.queue_size)
+                render_thread = pipeline.start_stage('render', self._render_stage, pipeline,
+                                                     render_queue, render_path, fps)
+            
+            frame_queue_depth = self.queue_depths.get('frames')
+            detection_queue_depth = self.queue_depths.get('detections')
+            try:
+                for frame, detections in pipeline.iterate(detection_queue):
+                    frame_count = self.frame_count
+                    frame_queue_depth.observe(frame_queue.qsize())
+                    detection_queue_depth.observe(detection_queue.qsize())
+                    
+                    if detection_log is not None:
+                        # Segment: keep what the tracker would receive
+                        embeddings = (self.tracker.embed(detections, frame)
+                                      if detections is not None else None)
+                        detection_log.add(detections, embeddings)
+                    else:
+                        tracks, frame_metrics = self.track_frame(frame, detections, frame_store,
+                                                                 frame_count, fps)
+                        if render_queue is not None:
+                            pipeline.put(render_queue, (frame, tracks, frame_metrics))
+                    
+                    self.frame_count += 1
+                    
+                    # Progress update (for real-time monitoring)
+                    if self.frame_count % 30 == 0:  # Every 30 frames
+                        progress = (self.frame_count / total_frames) * 100
+                        logger.info(f"Processing progress: {progress:.1f}% "
+                                    f"({self.stage_timings.format()})")
+                        if progress_callback is not None:
+                            progress_callback(self.frame_count, total_frames,
+                                              self.running_summary.summary())
+                
+                if render_thread is not None:
+                    # Let the encoder finish the queued frames
+                    pipeline.put(render_queue, StagePipeline.END)
+                    render_thread.join()
+            finally:
+                pipeline.close()
+            
+            return {'fps': fps, 'total_frames': total_frames, 'duration': duration,
+                    'elapsed': time.perf_counter() - start_time}
+        finally:
+            cap.release()
+    
+    def track_frame(self, frame: Optional[np.ndarray], detections: Optional[DetectionBatch],
+                    frame_store: Optional[FrameStore], frame_number: int, fps: float,
+                    embeddings: Optional[np.ndarray] = None):
+        """
+        تتبع إطار واحد وتسجيل مقاييسه
+        
+        Args:
+            frame: إطار الفيديو (None إذا أعطيت ميزات المظهر أو لمتتبع بدون مظهر)
+            detections: دفعة الكشوفات أو None (تنبؤ فقط)
+            frame_store: مخزن نتائج الإطارات أو None
+            frame_number: رقم الإطار
+            fps: معدل الإطارات
+            embeddings: ميزات المظهر المحسوبة مسبقاً أو None
+            
+        Returns:
+            (قائمة التتبع، مقاييس الإطار)
+        """
+        # Run tracking
+        tracking_start = time.perf_counter()
+        tracks = self.track_sperm(detections, frame, embeddings)
+        
+        # Calculate metrics
+        metrics_start = time.perf_counter()
+        self.stage_timings.get('tracking').observe(metrics_start - tracking_start)
+        frame_metrics = self.calculate_frame_metrics(tracks, frame_number, fps)
+        
+        # Store results (running aggregates, one row in the columnar store)
+        self.running_summary.update(frame_metrics)
+        if self.detection_recorder is not None:
+            self.detection_recorder.add(detections, self.box_scale)
+        if frame_store is not None:
+            frame_store.append(
+                frame_number,
+                frame_number / fps,
+                len(detections) if detections is not None else 0,
+                len(tracks),
+                frame_metrics
+            )
+        self.stage_timings.get('metrics').observe(time.perf_counter() - metrics_start)
+        return tracks, frame_metrics
+    
+    def process_live_frame(self, frame: np.ndarray, frame_number: int, fps: float) -> Dict:
+        """
+        تحليل إطار واحد من بث مباشر
+        
+        Live streams drop frames under load. The motion model is advanced
+        over the frames dropped since the previous call (at most
+        tracking_max_age times) and the track store skips all of them, so
+        its frame indices are the capture frame numbers and velocities use
+        the real gap without recording predicted positions.
+        
+        Args:
+            frame: إطار BGR
+            frame_number: رقم الإطار في البث (يشمل الإطارات المتروكة)
+            fps: معدل التقاط الإطارات
+            
+        Returns:
+            مقاييس الإطار وعدد الكشوفات
+        """
+        # Tracks are gone after tracking_max_age predictions: longer gaps add nothing
+        gap = max(0, frame_number - self.frame_count)
+        for _ in range(min(gap, self.tracking_max_age)):
+            self.tracker.predict()
+        self.track_store.skip_frames(gap)
+        self.frame_count = frame_number
+        
+        start_time = time.perf_counter()
+        detections = self.detect_sperm_batch([frame], self.tiling)[0]
+        tracking_start = time.perf_counter()
+        self.inference_stats['detection_time'] += tracking_start - start_time
+        self.inference_stats['detected_frames'] += 1
+        
+        tracks = self.track_sperm(detections, frame)
+        metrics_start = time.perf_counter()
+        frame_metrics = self.calculate_frame_metrics(tracks, frame_number, fps)
+        self.running_summary.update(frame_metrics)
+        self.frame_count += 1
+        
+        end_time = time.perf_counter()
+        self.stage_timings.get('inference').observe(tracking_start - start_time)
+        self.stage_timings.get('tracking').observe(metrics_start - tracking_start)
+        self.stage_timings.get('metrics').observe(end_time - metrics_start)
+        
+        return {'detections': len(detections), 'tracks': len(tracks), 'metrics': frame_metrics}
+    
+    def performance(self, elapsed: float, frame_count: int) -> Dict:
+        """
+        مقاييس أداء الجلسة
+        
+        Args:
+            elapsed: زمن المعالجة بالثواني
+            frame_count: عدد الإطارات المعالجة
+            
+        Returns:
+            قاموس الأداء
+        """
+        inference_stats = self.inference_stats
+        return {
+            'batch_size': self.batch_size,
+            'queue_size': self.queue_size,
+            'analysis_stride': self.analysis_stride,
+            'tracker': self.tracker_name,
+            'tiling': self.tiling,
+            'motion_gate': self.motion_gate is not None,
+            'detected_frames': inference_stats['detected_frames'],
+            'skipped_static_frames': inference_stats['skipped_static_frames'],
+            'detection_time': round(inference_stats['detection_time'], 3),
+            'processing_time': round(elapsed, 3),
+            'frames_per_second': round(frame_count / elapsed, 2) if elapsed > 0 else 0,
+            'speedup': self._detection_speedup(elapsed, frame_count, inference_stats),
+            'track_store_bytes': self.track_store.nbytes,
+            'summary_only': self.summary_only,
+            'inference_size': self.inference_size,
+            'resolution': self.resolution,
+            'stages': self.stage_timings.summary()
+        }
+    
+    def instrumentation(self) -> Dict:
+        """
+        نسخ مدرجات المراحل وأعماق الطوابير (تُدمج في مقاييس /metrics)
+        
+        Returns:
+            stages و queue_depth
+        """
+        return {'stages': self.stage_timings.snapshot(), 'queue_depth': self.queue_depths.snapshot()}
+    
+    def open_video(self, video_path: str, size=None):
+        """
+        فتح الفيديو بمفكك الترميز المحدد
+        
+        The ffmpeg reader fills a ring of reusable buffers, so the ring must
+        hold every frame that can be alive at once: both queues (three when
+        rendering), the batch being collected and the frames held by the
+        stage threads.
+        
+        Args:
+            video_path: مسار الفيديو
+            size: أبعاد الإطارات بعد فك الترميز (العرض، الارتفاع) أو None
+            
+        Returns:
+            قارئ الفيديو
+        """
+        buffers = 2 * self.queue_size + self.batch_size * self.analysis_stride + 4
+        if self.render_path:
+            buffers += self.queue_size + 1
+        return open_video(video_path, decoder=self.video_decoder, threads=self.decoder_threads,
+                          size=size, buffers=buffers)
+    
+    def calibrate_resolution(self, cap):
+        """
+        اختيار دقة الاستدلال لهذا الفيديو من إطارات عينة
+        
+        Args:
+            cap: قارئ الفيديو (يعاد إلى البداية بعد أخذ العينة)
+        """
+        try:
+            if self.tiling:
+                # Tiling already detects at native resolution
+                logger.info("Resolution calibration skipped: tiled detection")
+                return
+            
+            frames = sample_frames(cap, self.calibration_frames)
+            if not frames:
+                return
+            
+            self.resolution = calibrate_inference_size(
+                self.detector, frames, self.confidence_threshold,
+                sizes=self.inference_sizes, tolerance=self.resolution_tolerance,
+                detector_lock=self.detector_lock
+            )
+            if self.resolution['inference_size'] is None:
+                return
+            
+            height, width = frames[0].shape[:2]
+            self.apply_resolution(self.resolution, width, height)
+            
+        except Exception as e:
+            logger.error(f"Error calibrating inference resolution: {str(e)}")
+            self.inference_size = None
+            self.frame_size = None
+            self.box_scale = None
+    
+    def calibrate_video(self, video_path: str):
+        """
+        معايرة دقة الاستدلال لفيديو قبل تحليله (مرة واحدة لكل مقاطعه)
+        
+        Args:
+            video_path: مسار الفيديو
+        """
+        cap = self.open_video(video_path)
+        if not cap.isOpened():
+            raise Exception(f"Cannot open video file: {video_path}")
+        try:
+            self.calibrate_resolution(cap)
+        finally:
+            cap.release()
+    
+    def apply_resolution(self, resolution: Dict, width: int, height: int):
+        """
+        استخدام دقة استدلال معايرة
+        
+        Args:
+            resolution: نتيجة المعايرة (calibrate_inference_size)
+            width: عرض الفيديو الأصلي
+            height: ارتفاع الفيديو الأصلي
+        """
+        self.resolution = resolution
+        if resolution['inference_size'] is None:
+            return
+        
+        self.inference_size = resolution['input_size']
+        frame_width, frame_height = resolution['frame_size']
+        if (frame_width, frame_height) != (width, height):
+            self.frame_size = (frame_width, frame_height)
+            scale_x, scale_y = width / frame_width, height / frame_height
+            self.box_scale = np.array([scale_x, scale_y, scale_x, scale_y])
+    
+    def _decode_stage(self, pipeline: StagePipeline, cap, frame_queue,
+                      frame_limit: Optional[int] = None):
+        """
+        مرحلة فك ترميز الفيديو: قراءة الإطارات ووضعها في الطابور
+        
+        When calibration picked a smaller inference resolution the reader
+        was opened with frame_size, so frames are downscaled once while
+        decoding and every later stage works on the small frames.
+        
+        Args:
+            pipeline: خط المعالجة
+            cap: قارئ الفيديو
+            frame_queue: طابور الإطارات
+            frame_limit: أقصى عدد إطارات (None = حتى نهاية الفيديو)
+        """
+        decoded = 0
+        decode_timing = self.stage_timings.get('decode')
+        while not pipeline.stop_event.is_set():
+            if frame_limit is not None and decoded >= frame_limit:
+                break
+            start_time = time.perf_counter()
+            ret, frame = cap.read()
+            decoded += 1
+            if not ret:
+                break
+            decode_timing.observe(time.perf_counter() - start_time)
+            if not pipeline.put(frame_queue, frame):
+                return
+        
+        pipeline.put(frame_queue, StagePipeline.END)
+    
+    def _render_stage(self, pipeline: StagePipeline, render_queue, render_path: str, fps: float):
+        """
+        مرحلة رسم نتائج التتبع وترميز الفيديو
+        
+        Frames arrive already decoded and tracked; boxes, ids and trails are
+        drawn in place and the frame is handed to the encoder (an ffmpeg
+        process when available). A rendering failure is logged and the
+        remaining frames are drained, so it never aborts the analysis.
+        
+        Args:
+            pipeline: خط المعالجة
+            render_queue: طابور (الإطار، المسارات، مقاييس الإطار)
+            render_path: مسار فيديو MP4
+            fps: معدل الإطارات
+        """
+        renderer = FrameRenderer(self.render_trail_length, self.box_scale)
+        render_timing = self.stage_timings.get('render')
+        writer = None
+        stats = {'path': render_path, 'encoder': None, 'frames': 0, 'render_time': 0.0, 'error': None}
+        self.render_stats = stats
+        
+        try:
+            while True:
+                item = pipeline.get(render_queue)
+                if item is StagePipeline.END:
+                    break
+                if stats['error'] is not None:
+                    continue
+                
+                try:
+                    frame, tracks, frame_metrics = item
+                    start_time = time.perf_counter()
+                    if writer is None:
+                        writer = open_video_writer(render_path, fps, (frame.shape[1], frame.shape[0]),
+                                                   encoder=self.video_encoder, crf=self.render_crf,
+                                                   threads=self.decoder_threads)
+                        stats['encoder'] = type(writer).__name__
+                        if not writer.isOpened():
+                            raise Exception(f"Cannot open video writer: {render_path}")
+                    writer.write(renderer.draw(frame, tracks, frame_metrics))
+                    stats['frames'] += 1
+                    elapsed = time.perf_counter() - start_time
+                    stats['render_time'] += elapsed
+                    render_timing.observe(elapsed)
+                except Exception as e:
+                    logger.error(f"Error rendering analysis video: {str(e)}")
+                    stats['error'] = str(e)
+        finally:
+            if writer is not None and not writer.release() and stats['error'] is None:
+                stats['error'] = "Video encoder failed"
+            stats['render_time'] = round(stats['render_time'], 3)
+    
+    def _inference_stage(self, pipeline: StagePipeline, frame_queue, detection_queue,
+                         batch_size: int, analysis_stride: int = 1, stats: Dict = None,
+                         tiling: Optional[Dict] = None, motion_gate: Optional[MotionGate] = None):
+        """
+        مرحلة الكشف: تجميع الإطارات في دفعات وتشغيل النموذج عليها
+        
+        Only every analysis_stride-th frame is sent to the detector; the
+        other frames are passed on with None so the tracker predicts them.
+        With a motion gate, near-static frames reuse the previous detections.
+        
+        Args:
+            pipeline: خط المعالجة
+            frame_queue: طابور الإطارات
+            detection_queue: طابور الكشوفات
+            batch_size: حجم الدفعة
+            analysis_stride: تشغيل الكشف على كل k إطار فقط
+            stats: عدادات الكشف (عدد الإطارات المكشوفة وزمن الكشف)
+            tiling: إعدادات الكشف بالبلاطات (tile_size, overlap, workers) أو None
+            motion_gate: بوابة الحركة لتخطي الإطارات الساكنة أو None
+        """
+        stats = stats if stats is not None else {}
+        stats.setdefault('detected_frames', 0)
+        stats.setdefault('detection_time', 0.0)
+        stats.setdefault('skipped_static_frames', 0)
+        max_pending = batch_size * analysis_stride
+        inference_timing = self.stage_timings.get('inference')
+        last_detections = DetectionBatch()
+        frame_index = 0
+        finished = False
+        while not finished:
+            # Collect frames until the batch has batch_size frames to detect.
+            # Each frame is detected, predicted by the tracker (stride) or
+            # given the previous detections again (static, per the motion gate)
+            pending = []
+            to_detect = 0
+            while to_detect < batch_size and len(pending) < max_pending:
+                frame = pipeline.get(frame_queue)
+                if frame is StagePipeline.END:
+                    finished = True
+                    break
+                if frame_index % analysis_stride != 0:
+                    mode = 'predict'
+                elif motion_gate is not None and not motion_gate.should_detect(frame):
+                    mode = 'reuse'
+                    stats['skipped_static_frames'] += 1
+                else:
+                    mode = 'detect'
+                    to_detect += 1
+                pending.append((frame, mode))
+                frame_index += 1
+            
+            if not pending:
+                continue
+            
+            frames = [frame for frame, mode in pending if mode == 'detect']
+            batch_detections = iter(())
+            if frames:
+                detect_start = time.perf_counter()
+                batch_detections = iter(self.detect_sperm_batch(frames, tiling))
+                elapsed = time.perf_counter() - detect_start
+                stats['detection_time'] += elapsed
+                stats['detected_frames'] += len(frames)
+                inference_timing.observe(elapsed)
+            
+            for frame, mode in pending:
+                if mode == 'detect':
+                    last_detections = next(batch_detections)
+                    detections = last_detections
+                elif mode == 'reuse':
+                    # Batches are never modified downstream, so sharing is safe
+                    detections = last_detections
+                else:
+                    detections = None
+                if not pipeline.put(detection_queue, (frame, detections)):
+                    return
+        
+        pipeline.put(detection_queue, StagePipeline.END)
+    
+    def _detection_speedup(self, elapsed: float, frame_count: int, stats: Dict) -> float:
+        """
+        حساب التسريع المقاس مقارنة بتشغيل الكشف على كل إطار
+        
+        The full-detection time is extrapolated from the measured per-frame
+        detector cost on the frames that were actually detected.
+        
+        Args:
+            elapsed: زمن التحليل الفعلي
+            frame_count: عدد الإطارات
+            stats: عدادات الكشف
+            
+        Returns:
+            نسبة التسريع
+        """
+        detected_frames = stats['detected_frames']
+        if elapsed <= 0 or detected_frames == 0:
+            return 1.0
+        
+        skipped_frames = frame_count - detected_frames
+        per_frame_detection = stats['detection_time'] / detected_frames
+        full_detection_elapsed = elapsed + skipped_frames * per_frame_detection
+        return round(full_detection_elapsed / elapsed, 2)
+    
+    def detect_sperm_batch(self, frames: List[np.ndarray],
+                           tiling: Optional[Dict] = None) -> List[DetectionBatch]:
+        """
+        كشف الحيوانات المنوية في دفعة من الإطارات باستدعاء واحد للنموذج
+        
+        Args:
+            frames: قائمة إطارات الفيديو
+            tiling: إعدادات الكشف بالبلاطات المتداخلة (None = الإطار كاملاً)
+            
+        Returns:
+            دفعة الكشوفات لكل إطار بنفس ترتيب الإطارات
+        """
+        try:
+            # Run YOLOv8 detection on the whole batch (serialized when the
+            # shared backend is not thread-safe)
+            with self.detector_lock or nullcontext():
+                if tiling:
+                    return self.detector.predict_tiled(frames, conf=self.confidence_threshold, **tiling)
+                return self.detector.predict(frames, conf=self.confidence_threshold,
+                                             imgsz=self.inference_size)
+            
+        except Exception as e:
+            logger.error(f"Error in detect_sperm: {str(e)}")
+            return [DetectionBatch() for _ in frames]
+    
+    def track_sperm(self, detections: Optional[DetectionBatch], frame: Optional[np.ndarray],
+                    embeddings: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        تتبع الحيوانات المنوية
+        
+        Args:
+            detections: دفعة الكشوفات (None لإطار بدون كشف: التنبؤ بالحركة فقط)
+            frame: إطار الفيديو
+            embeddings: ميزات المظهر المحسوبة مسبقاً (بدل حسابها من الإطار) أو None
+            
+        Returns:
+            قائمة التتبع
+        """
+        try:
+            if detections is None:
+                # No detector pass on this frame: advance the motion model only
+                tracks = self.tracker.predict()
+            else:
+                tracks = self.tracker.update(detections, frame, embeddings)
+            
+            # Boxes back to native resolution when frames were downscaled
+            boxes = np.array([track.ltrb for track in tracks], dtype=np.float64).reshape(-1, 4)
+            if self.box_scale is not None:
+                boxes *= self.box_scale
+            
+            # Record all confirmed positions of this frame in one append
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            self.track_store.add_frame([track.track_id for track in tracks], centers)
+            
+            # Process confirmed tracks
+            track_results = []
+            for track, box, (center_x, center_y) in zip(tracks, boxes, centers.tolist()):
+                track_results.append({
+                    'track_id': track.track_id,
+                    'bbox': box,
+                    'center': [center_x, center_y],
+                    'velocity': self.calculate_velocity(track.track_id),
+                    'confidence': track.confidence
+                })
+            
+            return track_results
+            
+        except Exception as e:
+            logger.error(f"Error in track_sperm: {str(e)}")
+            return []
+    
+    def calculate_velocity(self, track_id: int) -> float:
+        """
+        حساب سرعة الحيوان المنوي
+        
+        Args:
+            track_id: معرف التتبع
+            
+        Returns:
+            السرعة بالبكسل في الثانية
+        """
+        try:
+            # Distance between the last two observations of the track
+            step = self.track_store.last_step(track_id)
+            if step is None:
+                return 0.0
+            distance, frame_gap = step
+            
+            # Assume 30 FPS for time calculation
+            time_diff = max(frame_gap, 1) / 30.0
+            velocity = distance / time_diff
+            
+            return velocity
+            
+        except Exception as e:
+            logger.error(f"Error calculating velocity: {str(e)}")
+            return 0.0
+    
+    def calculate_frame_metrics(self, tracks: List[Dict], frame_number: int, fps: float) -> Dict:
+        """
+        حساب مقاييس الإطار
+        
+        Args:
+            tracks: قائمة التتبع
+            frame_number: رقم الإطار
+            fps: معدل الإطارات في الثانية
+            
+        Returns:
+            مقاييس الإطار
+        """
+        try:
+            # Count active sperm
+            active_sperm = len(tracks)
+            
+            # Calculate motility metrics
+            motile_sperm = 0
+            total_velocity = 0
+            
+            for track in tracks:
+                velocity = track['velocity']
+                if velocity > self.motility_threshold:  # Threshold for motile sperm (pixels/second)
+                    motile_sperm += 1
+                total_velocity += velocity
+            
+            # Calculate motility percentage
+            motility_percentage = (motile_sperm / active_sperm * 100) if active_sperm > 0 else 0
+            
+            # Calculate average velocity
+            avg_velocity = total_velocity / active_sperm if active_sperm > 0 else 0
+            
+            # Calculate density (sperm per density_unit pixels of density_area)
+            density = active_sperm / self.density_area * self.density_unit
+            
+            metrics = {
+                'active_sperm': active_sperm,
+                'motile_sperm': motile_sperm,
+                'motility_percentage': motility_percentage,
+                'average_velocity': avg_velocity,
+                'density': density,
+                'timestamp': frame_number / fps
+            }
+            
+            return metrics
+            
+        except Exception as e:
+            logger.error(f"Error calculating frame metrics: {str(e)}")
+            return {}
+    
+    def generate_final_analysis(self, fps: float, duration: float,
+                                running_summary: RunningSummary) -> Dict:
+        """
+        إنشاء التحليل النهائي
+        
+        Per-frame results and the time series are not part of it: they stay
+        in the frames file and are built on request (FrameStore.to_records,
+        FrameStore.time_series).
+        
+        Args:
+            fps: معدل الإطارات في الثانية
+            duration: مدة الفيديو
+            running_summary: الملخص المتدفق المحدث أثناء التحليل
+            
+        Returns:
+            التحليل النهائي الكامل
+        """
+        try:
+            # Kinematics of all tracks in one vectorized pass
+            track_ids, offsets, positions, frames = self.track_store.trajectories()
+            kinematics = compute_track_kinematics(offsets, positions, frames, fps)
+            
+            # Generate detailed track analysis (tracks with at least two positions)
+            moving = np.flatnonzero(kinematics['points'] > 1)
+            columns = {key: values[moving].tolist() for key, values in kinematics.items()}
+            track_analysis = []
+            for i, track_id in enumerate(track_ids[moving].tolist()):
+                track_analysis.append({
+                    'track_id': track_id,
+                    'duration': columns['duration'][i],
+                    'total_distance': columns['total_distance'][i],
+                    'average_speed': columns['average_speed'][i],
+                    'positions_count': int(columns['points'][i]),
+                    'is_motile': columns['average_speed'][i] > self.motility_threshold,
+                    **{metric: round(columns[metric][i], 4) for metric in CASA_METRICS}
+                })
+            
+            casa_statistics = {
+                metric: round(float(kinematics[metric][moving].mean()), 4) if len(moving) else 0.0
+                for metric in CASA_METRICS
+            }
+            # Final results: aggregates come from the running summary
+            final_results = {
+                'summary': {
+                    'total_sperm_detected': self.track_store.total_tracks,
+                    **running_summary.summary(),
+                    'video_duration': round(duration, 2),
+                    'fps': fps
+                },
+                'tracks': track_analysis,
+                'statistics': {
+                    **running_summary.statistics(),
+                    'casa': casa_statistics
+                }
+            }
+            
+            return final_results
+            
+        except Exception as e:
+            logger.error(f"Error generating final analysis: {str(e)}")
+            raise
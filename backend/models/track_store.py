@@ -0,0 +1,218 @@
+import numpy as np
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TrackMeta:
+    """بيانات وصفية لمسار واحد"""
+
+    __slots__ = ('track_id', 'first_frame', 'last_frame', 'observations', 'last_row', 'prev_row')
+
+    def __init__(self, track_id: int, frame_index: int):
+        self.track_id = track_id
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.observations = 0
+        self.last_row = -1
+        self.prev_row = -1
+
+class TrackStore:
+    """
+    مخزن مضغوط لسجل مواقع المسارات
+
+    Positions (float32), frame indices and track ids are appended to
+    fixed-size preallocated chunks, so growth never copies existing rows
+    and memory is a few bytes per observation instead of a Python list per
+    point. Each track keeps only __slots__ metadata with the rows of its two
+    latest observations (for the per-frame velocity).
+
+    With a window (live mode) the store works as a ring buffer: chunks that
+    only hold frames older than the window are recycled for new rows and
+    stale tracks are dropped.
+    """
+
+    def __init__(self, chunk_size: int = 16384, window: int = 0):
+        """
+        تهيئة المخزن
+
+        Args:
+            chunk_size: عدد الصفوف في كل جزء مخصص مسبقاً
+            window: عدد الإطارات الأخيرة المحتفظ بها (0 = الفيديو كاملاً)
+        """
+        self.chunk_size = max(1, int(chunk_size))
+        self.window = max(0, int(window))
+        self.chunks = deque()
+        self.spare_chunks = []
+        self.base_row = 0
+        self.rows = 0
+        self.frame_count = 0
+        self.meta: Dict[int, TrackMeta] = {}
+        self.total_tracks = 0
+
+    def _allocate_chunk(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """تخصيص جزء جديد (أو إعادة استخدام جزء محرر)"""
+        if self.spare_chunks:
+            return self.spare_chunks.pop()
+        return (np.empty((self.chunk_size, 2), dtype=np.float32),
+                np.empty(self.chunk_size, dtype=np.int32),
+                np.empty(self.chunk_size, dtype=np.int32))
+
+    def _locate(self, row: int) -> Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray], int]:
+        """تحديد الجزء والإزاحة لصف عام"""
+        chunk_index, offset = divmod(row - self.base_row, self.chunk_size)
+        return self.chunks[chunk_index], offset
+
+    def add_frame(self, track_ids: np.ndarray, centers: np.ndarray) -> int:
+        """
+        إضافة مواقع المسارات في الإطار التالي
+
+        Args:
+            track_ids: معرفات المسارات (N,)
+            centers: مراكز المسارات (N, 2)
+
+        Returns:
+            رقم الإطار
+        """
+        frame_index = self.frame_count
+        self.frame_count += 1
+
+        track_ids = np.asarray(track_ids, dtype=np.int32).reshape(-1)
+        centers = np.asarray(centers, dtype=np.float32).reshape(-1, 2)
+        first_row = self.rows
+
+        written = 0
+        while written < len(track_ids):
+            used = self.rows - self.base_row - (len(self.chunks) - 1) * self.chunk_size
+            if not self.chunks or used == self.chunk_size:
+                self.chunks.append(self._allocate_chunk())
+                used = 0
+
+            count = min(len(track_ids) - written, self.chunk_size - used)
+            positions, frames, ids = self.chunks[-1]
+            positions[used:used + count] = centers[written:written + count]
+            frames[used:used + count] = frame_index
+            ids[used:used + count] = track_ids[written:written + count]
+            written += count
+            self.rows += count
+
+        for row, track_id in enumerate(track_ids.tolist(), start=first_row):
+            meta = self.meta.get(track_id)
+            if meta is None:
+                meta = self.meta[track_id] = TrackMeta(track_id, frame_index)
+                self.total_tracks += 1
+            meta.prev_row = meta.last_row
+            meta.last_row = row
+            meta.last_frame = frame_index
+            meta.observations += 1
+
+        if self.window:
+            self._evict(frame_index - self.window)
+
+        return frame_index
+
+    def skip_frames(self, count: int):
+        """
+        تخطي إطارات بدون ملاحظات (إطارات متروكة في البث المباشر)
+
+        Frame indices stay equal to the capture frame numbers, so the next
+        last_step spans the real gap whatever its length.
+
+        Args:
+            count: عدد الإطارات المتخطاة
+        """
+        count = max(0, int(count))
+        if count:
+            self.frame_count += count
+            if self.window:
+                self._evict(self.frame_count - 1 - self.window)
+
+    def _evict(self, cutoff: int):
+        """تحرير الأجزاء والمسارات الأقدم من النافذة"""
+        evicted = False
+        # Only full chunks (not the one being written) can be recycled
+        while len(self.chunks) > 1 and self.chunks[0][1][-1] < cutoff:
+            self.spare_chunks.append(self.chunks.popleft())
+            self.base_row += self.chunk_size
+            evicted = True
+
+        if evicted:
+            stale = [track_id for track_id, meta in self.meta.items() if meta.last_frame < cutoff]
+            for track_id in stale:
+                del self.meta[track_id]
+
+    @classmethod
+    def from_trajectories(cls, track_ids: np.ndarray, offsets: np.ndarray, positions: np.ndarray,
+                          frames: np.ndarray) -> 'TrackStore':
+        """
+        إنشاء مخزن من مسارات محفوظة (بصيغة trajectories)
+
+        The rows are kept as one chunk in track order, which trajectories()
+        returns unchanged. Only meant for reading: last_step is not
+        available and add_frame must not be called.
+
+        Args:
+            track_ids: معرفات المسارات (T,)
+            offsets: بدايات المقاطع (T,)
+            positions: المواقع (M, 2)
+            frames: أرقام الإطارات (M,)
+
+        Returns:
+            المخزن
+        """
+        rows = len(frames)
+        store = cls(chunk_size=max(1, rows))
+        lengths = np.diff(np.append(offsets, rows))
+        store.chunks.append((np.asarray(positions, dtype=np.float32).reshape(-1, 2),
+                             np.asarray(frames, dtype=np.int32),
+                             np.repeat(np.asarray(track_ids, dtype=np.int32), lengths)))
+        store.rows = rows
+        store.frame_count = int(frames.max()) + 1 if rows else 0
+        store.total_tracks = len(track_ids)
+        return store
+
+    def last_step(self, track_id: int) -> Optional[Tuple[float, int]]:
+        """
+        آخر إزاحة للمسار
+
+        Args:
+            track_id: معرف المسار
+
+        Returns:
+            (المسافة بالبكسل، عدد الإطارات بين الملاحظتين) أو None
+        """
+        meta = self.meta.get(track_id)
+        if meta is None or meta.prev_row < self.base_row:
+            return None
+
+        (positions, frames, _), last = self._locate(meta.last_row)
+        (prev_positions, prev_frames, _), prev = self._locate(meta.prev_row)
+        dx, dy = positions[last] - prev_positions[prev]
+        return float(np.hypot(dx, dy)), int(frames[last] - prev_frames[prev])
+
+    def trajectories(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        جميع المسارات المحتفظ بها متتالية ومرتبة حسب المسار ثم الإطار
+
+        Returns:
+            (معرفات المسارات (T,)، بدايات المقاطع (T,)، المواقع (M, 2)، أرقام الإطارات (M,))
+        """
+        used = self.rows - self.base_row
+        if used == 0:
+            return (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64),
+                    np.empty((0, 2), dtype=np.float32), np.empty(0, dtype=np.int32))
+
+        positions = np.concatenate([chunk[0] for chunk in self.chunks])[:used]
+        frames = np.concatenate([chunk[1] for chunk in self.chunks])[:used]
+        ids = np.concatenate([chunk[2] for chunk in self.chunks])[:used]
+
+        # Rows are appended in frame order, so a stable sort keeps each track chronological
+        order = np.argsort(ids, kind='stable')
+        track_ids, offsets = np.unique(ids[order], return_index=True)
+        return track_ids, offsets, positions[order], frames[order]
+
+    @property
+    def nbytes(self) -> int:
+        """الذاكرة المخصصة للمصفوفات بالبايت"""
+        return sum(array.nbytes for chunk in list(self.chunks) + self.spare_chunks for array in chunk)
@@ -0,0 +1,382 @@
+import numpy as np
+import logging
+from scipy.optimize import linear_sum_assignment
+from typing import List, Optional
+
+from models.detectors import DetectionBatch
+
+logger = logging.getLogger(__name__)
+
+class TrackState:
+    """حالة مسار مؤكد في الإطار الحالي"""
+
+    __slots__ = ('track_id', 'ltrb', 'confidence')
+
+    def __init__(self, track_id: int, ltrb: np.ndarray, confidence: float = 0.0):
+        self.track_id = track_id
+        self.ltrb = ltrb
+        self.confidence = confidence
+
+class BaseTracker:
+    """
+    الواجهة المشتركة للمتتبعات خلف track_sperm
+
+    update() associates a frame's detections with the tracks; predict()
+    only advances the motion model (frames without a detector pass).
+    Both return the confirmed tracks. embed() computes the appearance
+    features update() would compute from the frame, so they can be
+    computed elsewhere (segment workers) and passed to update() instead.
+    """
+
+    name = 'base'
+
+    def embed(self, detections: DetectionBatch, frame: np.ndarray) -> Optional[np.ndarray]:
+        """
+        ميزات المظهر للكشوفات كما يحسبها update
+
+        Args:
+            detections: دفعة الكشوفات
+            frame: إطار الفيديو
+
+        Returns:
+            مصفوفة الميزات (N, D)، أو None لمتتبع لا يستخدم المظهر
+        """
+        return None
+
+    def update(self, detections: DetectionBatch, frame: Optional[np.ndarray],
+               embeddings: Optional[np.ndarray] = None) -> List[TrackState]:
+        """
+        تحديث المتتبع بكشوفات الإطار
+
+        Args:
+            detections: دفعة الكشوفات
+            frame: إطار الفيديو (None إذا أعطيت الميزات)
+            embeddings: ميزات المظهر المحسوبة مسبقاً (embed) أو None
+
+        Returns:
+            المسارات المؤكدة
+        """
+        raise NotImplementedError
+
+    def predict(self) -> List[TrackState]:
+        """
+        التنبؤ بمواقع المسارات بدون كشوفات
+
+        Returns:
+            المسارات المؤكدة
+        """
+        raise NotImplementedError
+
+def create_embedder():
+    """
+    إنشاء شبكة تضمين المظهر لـ DeepSORT (MobileNetV2)
+
+    Returns:
+        شبكة التضمين
+    """
+    import torch
+    from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
+
+    return MobileNetv2_Embedder(
+        half=True,
+        max_batch_size=16,
+        bgr=True,
+        gpu=torch.cuda.is_available(),
+        model_wts_path=None
+    )
+
+class DeepSortTracker(BaseTracker):
+    """متتبع DeepSORT مع شبكة تضمين المظهر"""
+
+    name = 'deepsort'
+
+    def __init__(self, max_age: int = 50, n_init: int = 3, embedder=None):
+        """
+        تهيئة DeepSORT
+
+        Args:
+            max_age: أقصى عدد إطارات بدون تطابق قبل حذف المسار
+            n_init: عدد التطابقات اللازمة لتأكيد المسار
+            embedder: شبكة تضمين مشتركة (من سجل النماذج)، None = إنشاء شبكة خاصة
+        """
+        from deep_sort_realtime.deepsort_tracker import DeepSort
+
+        self.deep_sort = DeepSort(
+            max_age=max_age,
+            n_init=n_init,
+            nms_max_overlap=1.0,
+            max_cosine_distance=0.3,
+            nn_budget=None,
+            override_track_class=None,
+            embedder=None,
+            polygon=False,
+            today=None
+        )
+        # The appearance CNN is stateless, so one instance can serve many trackers
+        self.deep_sort.embedder = embedder if embedder is not None else create_embedder()
+
+    def _confirmed(self, tracks) -> List[TrackState]:
+        """تحويل مسارات DeepSORT المؤكدة إلى TrackState"""
+        return [
+            TrackState(int(track.track_id), track.to_ltrb(), track.get_det_conf() or 0.0)
+            for track in tracks if track.is_confirmed()
+        ]
+
+    @staticmethod
+    def _detection_list(detections: DetectionBatch) -> List:
+        """الكشوفات بصيغة DeepSORT: [left, top, width, height], الثقة، الفئة"""
+        ltwh = np.concatenate([detections.boxes[:, :2], detections.sizes], axis=1)
+        return [
+            [box, confidence, 'sperm']
+            for box, confidence in zip(ltwh.tolist(), detections.confidences.tolist())
+        ]
+
+    def embed(self, detections: DetectionBatch, frame: np.ndarray) -> Optional[np.ndarray]:
+        # Same crops as update_tracks: boxes without area are dropped first
+        detection_list = [d for d in self._detection_list(detections) if d[0][2] > 0 and d[0][3] > 0]
+        if not detection_list:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray(self.deep_sort.generate_embeds(frame, detection_list))
+
+    def update(self, detections: DetectionBatch, frame: Optional[np.ndarray],
+               embeddings: Optional[np.ndarray] = None) -> List[TrackState]:
+        detection_list = self._detection_list(detections)
+        if embeddings is not None:
+            return self._confirmed(self.deep_sort.update_tracks(detection_list, embeds=embeddings))
+        return self._confirmed(self.deep_sort.update_tracks(detection_list, frame=frame))
+
+    def predict(self) -> List[TrackState]:
+        # Advance the Kalman filter without marking tracks as missed
+        self.deep_sort.tracker.predict()
+        return self._confirmed(self.deep_sort.tracker.tracks)
+
+class IoUKalmanTracker(BaseTracker):
+    """
+    متتبع حركة خفيف (بأسلوب SORT) بمرشح كالمان وتطابق IoU
+
+    Sperm cells look alike, so appearance embeddings add cost without much
+    identity information. This tracker keeps every active track in NumPy
+    arrays: the Kalman predict/update steps and the association cost
+    matrix are computed for all tracks at once, and the assignment is
+    solved with the Hungarian algorithm.
+
+    State per track: [cx, cy, w, h, vx, vy, vw, vh] (constant velocity).
+    """
+
+    name = 'iou'
+
+    # Process/measurement noise relative to box size (as in DeepSORT)
+    std_weight_position = 1.0 / 20
+    std_weight_velocity = 1.0 / 160
+
+    def __init__(self, max_age: int = 50, n_init: int = 3, iou_threshold: float = 0.1,
+                 distance_gate: float = 2.0):
+        """
+        تهيئة المتتبع
+
+        Args:
+            max_age: أقصى عدد إطارات بدون تطابق قبل حذف المسار
+            n_init: عدد التطابقات اللازمة لتأكيد المسار
+            iou_threshold: أقل IoU لقبول التطابق
+            distance_gate: أقصى مسافة بين المراكز (بأضعاف قطر الصندوق) عند انعدام التداخل
+        """
+        self.max_age = max_age
+        self.n_init = n_init
+        self.iou_threshold = iou_threshold
+        self.distance_gate = distance_gate
+        self.next_id = 1
+
+        self.transition = np.eye(8)
+        self.transition[:4, 4:] = np.eye(4)
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.means = np.empty((0, 8))
+        self.covariances = np.empty((0, 8, 8))
+        self.hits = np.empty(0, dtype=np.int64)
+        self.time_since_update = np.empty(0, dtype=np.int64)
+        self.confirmed = np.empty(0, dtype=bool)
+        self.confidences = np.empty(0)
+
+    @staticmethod
+    def _to_xyxy(boxes: np.ndarray) -> np.ndarray:
+        """تحويل [cx, cy, w, h] إلى [x1, y1, x2, y2]"""
+        half = boxes[:, 2:4] / 2
+        return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+    def _kalman_predict(self):
+        """خطوة التنبؤ لجميع المسارات دفعة واحدة"""
+        if len(self.ids) == 0:
+            return
+
+        size = np.maximum(self.means[:, 2], self.means[:, 3])
+        std_pos = self.std_weight_position * size
+        std_vel = self.std_weight_velocity * size
+        noise = np.stack([std_pos] * 4 + [std_vel] * 4, axis=1) ** 2
+
+        self.means = self.means @ self.transition.T
+        self.covariances = self.transition @ self.covariances @ self.transition.T
+        diagonal = np.arange(8)
+        self.covariances[:, diagonal, diagonal] += noise
+        self.time_since_update += 1
+
+    def _kalman_update(self, indices: np.ndarray, measurements: np.ndarray):
+        """
+        خطوة التصحيح للمسارات المطابقة دفعة واحدة
+
+        Args:
+            indices: مؤشرات المسارات
+            measurements: القياسات [cx, cy, w, h]
+        """
+        means = self.means[indices]
+        covariances = self.covariances[indices]
+
+        size = np.maximum(means[:, 2], means[:, 3])
+        measurement_noise = (self.std_weight_position * size)[:, None] ** 2 * np.ones(4)
+
+        projected = covariances[:, :4, :4].copy()
+        diagonal = np.arange(4)
+        projected[:, diagonal, diagonal] += measurement_noise
+
+        # K = P H^T S^-1 for every matched track at once
+        gain = np.linalg.solve(projected, covariances[:, :4, :]).transpose(0, 2, 1)
+        innovation = measurements - means[:, :4]
+
+        self.means[indices] = means + np.einsum('tij,tj->ti', gain, innovation)
+        self.covariances[indices] = covariances - gain @ projected @ gain.transpose(0, 2, 1)
+
+    def _cost_matrix(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        مصفوفة تكلفة التطابق بين المسارات والكشوفات
+
+        IoU matches cost 1 - IoU (< 1); non-overlapping pairs within the
+        distance gate cost 1 + normalized distance (in [1, 2]); everything
+        else is infeasible.
+        """
+        track_boxes = self._to_xyxy(self.means[:, :4])
+
+        top_left = np.maximum(track_boxes[:, None, :2], boxes[None, :, :2])
+        bottom_right = np.minimum(track_boxes[:, None, 2:], boxes[None, :, 2:])
+        intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+        track_area = np.prod(track_boxes[:, 2:] - track_boxes[:, :2], axis=1)
+        det_area = np.prod(boxes[:, 2:] - boxes[:, :2], axis=1)
+        iou = intersection / (track_area[:, None] + det_area[None, :] - intersection + 1e-9)
+
+        track_centers = self.means[:, :2]
+        det_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        distance = np.linalg.norm(track_centers[:, None, :] - det_centers[None, :, :], axis=2)
+        diagonal = np.hypot(self.means[:, 2], self.means[:, 3])[:, None] + 1e-9
+        normalized = distance / (self.distance_gate * diagonal)
+
+        cost = np.full(iou.shape, np.inf)
+        cost = np.where(normalized <= 1.0, 1.0 + normalized, cost)
+        cost = np.where(iou >= self.iou_threshold, 1.0 - iou, cost)
+        return cost
+
+    def _associate(self, boxes: np.ndarray):
+        """حل مسألة التعيين بخوارزمية المجري"""
+        if len(self.ids) == 0 or len(boxes) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        cost = self._cost_matrix(boxes)
+        feasible = np.where(np.isfinite(cost), cost, 1e6)
+        rows, cols = linear_sum_assignment(feasible)
+        valid = np.isfinite(cost[rows, cols])
+        return rows[valid], cols[valid]
+
+    def _keep(self, mask: np.ndarray):
+        """الاحتفاظ بالمسارات المحددة فقط"""
+        self.ids = self.ids[mask]
+        self.means = self.means[mask]
+        self.covariances = self.covariances[mask]
+        self.hits = self.hits[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.confirmed = self.confirmed[mask]
+        self.confidences = self.confidences[mask]
+
+    def _spawn(self, boxes: np.ndarray, confidences: np.ndarray):
+        """إنشاء مسارات جديدة للكشوفات غير المطابقة"""
+        count = len(boxes)
+        if count == 0:
+            return
+
+        measurements = np.concatenate([(boxes[:, :2] + boxes[:, 2:]) / 2,
+                                       boxes[:, 2:] - boxes[:, :2]], axis=1)
+        size = np.maximum(measurements[:, 2], measurements[:, 3])
+        std = np.stack([2 * self.std_weight_position * size] * 4 +
+                       [10 * self.std_weight_velocity * size] * 4, axis=1)
+
+        covariances = np.zeros((count, 8, 8))
+        diagonal = np.arange(8)
+        covariances[:, diagonal, diagonal] = std ** 2
+
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+        self.next_id += count
+        self.means = np.concatenate([self.means, np.concatenate([measurements, np.zeros((count, 4))], axis=1)])
+        self.covariances = np.concatenate([self.covariances, covariances])
+        self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+        self.time_since_update = np.concatenate([self.time_since_update, np.zeros(count, dtype=np.int64)])
+        self.confirmed = np.concatenate([self.confirmed, np.full(count, self.n_init <= 1)])
+        self.confidences = np.concatenate([self.confidences, confidences])
+
+    def _confirmed_states(self) -> List[TrackState]:
+        """المسارات المؤكدة بصيغة TrackState"""
+        boxes = self._to_xyxy(self.means[:, :4])
+        return [
+            TrackState(int(self.ids[i]), boxes[i], float(self.confidences[i]))
+            for i in np.flatnonzero(self.confirmed)
+        ]
+
+    def update(self, detections: DetectionBatch, frame: Optional[np.ndarray] = None,
+               embeddings: Optional[np.ndarray] = None) -> List[TrackState]:
+        boxes = detections.boxes.astype(np.float64)
+        confidences = detections.confidences.astype(np.float64)
+
+        self._kalman_predict()
+        rows, cols = self._associate(boxes)
+
+        if len(rows):
+            matched = boxes[cols]
+            measurements = np.concatenate([(matched[:, :2] + matched[:, 2:]) / 2,
+                                           matched[:, 2:] - matched[:, :2]], axis=1)
+            self._kalman_update(rows, measurements)
+            self.hits[rows] += 1
+            self.time_since_update[rows] = 0
+            self.confidences[rows] = confidences[cols]
+            self.confirmed[rows] |= self.hits[rows] >= self.n_init
+
+        # Unmatched tentative tracks die immediately, confirmed ones after max_age
+        alive = np.ones(len(self.ids), dtype=bool)
+        missed = self.time_since_update > 0
+        alive &= ~(missed & ~self.confirmed)
+        alive &= self.time_since_update <= self.max_age
+        self._keep(alive)
+
+        unmatched = np.setdiff1d(np.arange(len(boxes)), cols)
+        self._spawn(boxes[unmatched], confidences[unmatched])
+
+        return self._confirmed_states()
+
+    def predict(self) -> List[TrackState]:
+        self._kalman_predict()
+        self._keep(self.time_since_update <= self.max_age)
+        return self._confirmed_states()
+
+TRACKERS = {
+    DeepSortTracker.name: DeepSortTracker,
+    IoUKalmanTracker.name: IoUKalmanTracker,
+}
+
+def create_tracker(name: str = 'deepsort', **kwargs) -> BaseTracker:
+    """
+    إنشاء متتبع جديد (حالة مستقلة لكل تحليل)
+
+    Args:
+        name: اسم المتتبع (deepsort, iou)
+        kwargs: معاملات المتتبع
+
+    Returns:
+        المتتبع
+    """
+    if name not in TRACKERS:
+        raise ValueError(f"Unsupported tracker: {name}. Available: {', '.join(TRACKERS)}")
+    return TRACKERS[name](**kwargs)
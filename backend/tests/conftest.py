@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+
+from benchmark import write_synthetic_video
+from models import detectors
+from models.analyzer import SpermAnalyzer
+from models.detectors import BaseDetector, DetectionBatch
+
+
+class BlobDetector(BaseDetector):
+    """
+    كاشف حتمي للاختبارات: المكونات المتصلة من البكسلات الساطعة
+
+    Needs no weights and returns the same boxes for the same frame, so
+    the results of two runs can be compared exactly.
+    """
+
+    name = 'blob'
+    thread_safe = True
+
+    def load(self):
+        """لا يوجد نموذج للتحميل"""
+
+    def predict(self, frames, conf, imgsz=None):
+        batches = []
+        for frame in frames:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            _, _, stats, _ = cv2.connectedComponentsWithStats((gray > 128).astype(np.uint8))
+            # Label 0 is the background
+            left, top, width, height = stats[1:, :4].astype(np.float32).T
+            boxes = np.stack([left - 1, top - 1, left + width + 1, top + height + 1], axis=1)
+            batches.append(DetectionBatch(boxes, np.full(len(boxes), 0.9)))
+        return batches
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    """محلل بالكاشف الحتمي ومتتبع IoU"""
+    monkeypatch.setitem(detectors.DETECTOR_BACKENDS, BlobDetector.name, BlobDetector)
+    return SpermAnalyzer(detector_backend=BlobDetector.name, tracker='iou',
+                         confidence_threshold=0.25)
+
+
+@pytest.fixture(scope='session')
+def synthetic_videos(tmp_path_factory):
+    """ثلاثة فيديوهات اصطناعية لخلايا متحركة"""
+    directory = tmp_path_factory.mktemp('videos')
+    return [
+        write_synthetic_video(str(directory / f'synthetic_{seed}.avi'), num_cells=20,
+                              num_frames=120, seed=seed)
+        for seed in range(3)
+    ]
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from benchmark import comparable_results
+from models.segments import plan_segments
+
+
+def test_plan_segments_cover_video_on_stride_boundaries():
+    """المقاطع متجاورة وتغطي الفيديو وحدودها من مضاعفات الخطوة"""
+    plan = plan_segments(100, 3, stride=4)
+    assert [segment['index'] for segment in plan] == [0, 1, 2]
+    assert plan[0]['start'] == 0 and plan[-1]['end'] == 100
+    for previous, segment in zip(plan, plan[1:]):
+        assert segment['start'] == previous['end']
+        assert segment['start'] % 4 == 0
+    # Too short for the requested segments: fewer are planned
+    assert len(plan_segments(40, 8)) == 1
+
+
+@pytest.mark.parametrize('parameters', [
+    {},
+    {'analysis_stride': 2, 'motion_gate': True},
+])
+@pytest.mark.parametrize('segments', [2, 3])
+def test_segmented_analysis_matches_serial(analyzer, synthetic_videos, tmp_path, parameters,
+                                           segments):
+    """التحليل المقسم إلى مقاطع يطابق التحليل التسلسلي"""
+    video = synthetic_videos[0]
+    serial = analyzer.analyze_video(video, dict(parameters),
+                                    frames_path=str(tmp_path / 'serial.npz'),
+                                    raw_path=str(tmp_path / 'serial_raw.npz'))
+    # Threads instead of the spawned processes, which would not see the test detector
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        segmented = analyzer.analyze_video_segments(
+            video, {**parameters, 'segments': segments},
+            frames_path=str(tmp_path / 'segmented.npz'), executor=executor,
+            raw_path=str(tmp_path / 'segmented_raw.npz'))
+
+    assert len(segmented['performance']['segments']) == segments
+    assert serial['summary']['total_sperm_detected'] > 0
+    assert segmented['summary'] == serial['summary']
+    assert len(segmented['tracks']) == len(serial['tracks'])
+    assert comparable_results(segmented) == comparable_results(serial)
+    with np.load(serial['raw_path']) as expected, np.load(segmented['raw_path']) as raw:
+        assert sorted(raw.files) == sorted(expected.files)
+        for name in expected.files:
+            np.testing.assert_array_equal(raw[name], expected[name], err_msg=name)
@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import comparable_results
+
+
+def test_concurrent_sessions_match_serial(analyzer, synthetic_videos, tmp_path):
+    """التحليلات المتزامنة على محلل واحد تطابق التحليل التسلسلي"""
+    # Every analysis runs in its own AnalysisSession; job-specific
+    # parameters make a setting leaking between sessions show up
+    parameters = [{'batch_size': 1 + i, 'track_window': 0} for i in range(len(synthetic_videos))]
+
+    serial = [
+        analyzer.analyze_video(video, params, frames_path=str(tmp_path / f'serial_{i}.npz'))
+        for i, (video, params) in enumerate(zip(synthetic_videos, parameters))
+    ]
+    frames_paths = [str(tmp_path / f'concurrent_{i}.npz') for i in range(len(synthetic_videos))]
+    with ThreadPoolExecutor(max_workers=len(synthetic_videos)) as executor:
+        concurrent = list(executor.map(analyzer.analyze_video, synthetic_videos, parameters,
+                                       frames_paths))
+
+    for expected, result in zip(serial, concurrent):
+        assert expected['summary']['total_sperm_detected'] > 0
+        assert result['summary'] == expected['summary']
+        assert len(result['tracks']) == len(expected['tracks'])
+        assert comparable_results(result) == comparable_results(expected)
@@ -0,0 +1,132 @@
+import logging
+import os
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Intra-op threads per analysis when nothing is configured: small YOLO
+# models stop scaling past a few threads, extra cores serve more jobs
+DEFAULT_THREADS_PER_JOB = 4
+
+# Thread-pool variables read by OpenMP/BLAS runtimes when they initialize
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                   'NUMEXPR_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+
+def available_cores() -> List[int]:
+    """
+    الأنوية المتاحة للعملية الحالية (مع احترام قيود cgroup/taskset)
+
+    Returns:
+        أرقام الأنوية
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def plan_cpu_budget(jobs: int = 0, threads_per_job: int = 0, reserved_cores: int = 0,
+                    cores: Optional[List[int]] = None) -> Dict:
+    """
+    تقسيم الأنوية على التحليلات المتزامنة
+
+    Each concurrent analysis gets a disjoint slice of cores and a thread
+    count equal to its slice, so torch, OpenCV and the BLAS runtime of all
+    jobs together never run more threads than there are cores.
+
+    Args:
+        jobs: عدد التحليلات المتزامنة (0 = حسب عدد الأنوية)
+        threads_per_job: عدد الخيوط لكل تحليل (0 = تلقائي)
+        reserved_cores: أنوية محجوزة لخادم API وعمليات الإدخال/الإخراج
+        cores: الأنوية المتاحة (None = أنوية العملية الحالية)
+
+    Returns:
+        الخطة: عدد التحليلات وشريحة الأنوية وعدد الخيوط لكل تحليل
+    """
+    cores = list(cores) if cores is not None else available_cores()
+    reserved = min(max(0, int(reserved_cores)), len(cores) - 1)
+    usable = cores[reserved:]
+
+    if jobs <= 0:
+        per_job = threads_per_job if threads_per_job > 0 else min(DEFAULT_THREADS_PER_JOB, len(usable))
+        jobs = max(1, len(usable) // max(1, per_job))
+    jobs = max(1, int(jobs))
+
+    # Contiguous slices (neighbouring cores share caches); leftover cores go
+    # to the first slices. With more jobs than cores, slices share cores.
+    slices = []
+    if jobs <= len(usable):
+        size, extra = divmod(len(usable), jobs)
+        start = 0
+        for index in range(jobs):
+            end = start + size + (1 if index < extra else 0)
+            slices.append(usable[start:end])
+            start = end
+    else:
+        slices = [[usable[index % len(usable)]] for index in range(jobs)]
+
+    return {
+        'host_cores': os.cpu_count() or 1,
+        'available_cores': cores,
+        'reserved_cores': cores[:reserved],
+        'jobs': jobs,
+        'slices': [
+            {
+                'job': index,
+                'cores': cpu_slice,
+                'threads': threads_per_job if threads_per_job > 0 else len(cpu_slice)
+            }
+            for index, cpu_slice in enumerate(slices)
+        ]
+    }
+
+def apply_cpu_slice(cores: Optional[List[int]], threads: int, pin: bool = True) -> Dict:
+    """
+    تطبيق شريحة الأنوية على العملية الحالية
+
+    Pins the process to its cores and sizes the torch, OpenCV and BLAS
+    thread pools to match. Environment variables only affect runtimes that
+    have not started yet, so this should run first in a new worker process.
+
+    Args:
+        cores: أنوية الشريحة (None = بدون تثبيت)
+        threads: عدد الخيوط
+        pin: تثبيت العملية على الأنوية
+
+    Returns:
+        الإعدادات المطبقة
+    """
+    threads = max(1, int(threads))
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+
+    pinned = False
+    if pin and cores and hasattr(os, 'sched_setaffinity'):
+        try:
+            os.sched_setaffinity(0, cores)
+            pinned = True
+        except OSError as e:
+            logger.error(f"Error pinning process to cores {cores}: {str(e)}")
+
+    import cv2
+    cv2.setNumThreads(threads)
+
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # BLAS pools that are already running (numpy imported earlier)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+    applied = {
+        'pid': os.getpid(),
+        'cores': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'pinned': pinned,
+        'threads': threads
+    }
+    logger.info(f"CPU slice applied: {applied}")
+    return applied
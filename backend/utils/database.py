@@ -1,12 +1,15 @@
 import sqlite3
 import json
 import logging
+import itertools
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from pathlib import Path
 import asyncio
 import aiosqlite
 
+from utils.frame_store import load_frame_store
+
 logger = logging.getLogger(__name__)
 
 class Database:
@@ -195,8 +198,21 @@ class Database:
                     WHERE id = ?
                 ''', (results_path, json.dumps(results), current_time, analysis_id))
                 
-                # Save frame metrics
-                if 'detections' in results:
+                # Save frame metrics (columns of the frame store when available)
+                frame_store = load_frame_store(results.get('frames_path'))
+                if frame_store is not None:
+                    columns = [frame_store.column(name).tolist() for name in (
+                        'frame_number', 'timestamp', 'active_sperm', 'motile_sperm',
+                        'motility_percentage', 'average_velocity', 'density'
+                    )]
+                    await db.executemany('''
+                        INSERT INTO analysis_metrics 
+                        (analysis_id, frame_number, timestamp, active_sperm, motile_sperm,
+                         motility_percentage, average_velocity, density)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', zip(itertools.repeat(analysis_id), *columns))
+                
+                elif 'detections' in results:
                     for detection in results['detections']:
                         metrics = detection.get('metrics', {})
                         await db.execute('''
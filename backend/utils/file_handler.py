@@ -12,8 +12,30 @@ import tempfile
 import aiofiles
 import asyncio
 
+from utils.frame_store import load_frame_store
+
 logger = logging.getLogger(__name__)
 
+# Frame store columns exported to CSV/Excel, with their headers
+CSV_COLUMNS = {
+    'frame_number': 'frame_number',
+    'timestamp': 'timestamp',
+    'active_sperm': 'active_sperm',
+    'motile_sperm': 'motile_sperm',
+    'motility_percentage': 'motility_percentage',
+    'average_velocity': 'average_velocity',
+    'density': 'density'
+}
+EXCEL_COLUMNS = {
+    'frame_number': 'رقم الإطار',
+    'timestamp': 'الوقت',
+    'active_sperm': 'الحيوانات النشطة',
+    'motile_sperm': 'الحيوانات المتحركة',
+    'motility_percentage': 'نسبة الحركة',
+    'average_velocity': 'متوسط السرعة',
+    'density': 'الكثافة'
+}
+
 class FileHandler:
     """
     معالج الملفات لإدارة الرفع والتحميل وعمليات الملفات
@@ -158,7 +180,38 @@ class FileHandler:
             logger.error(f"Error calculating file hash: {str(e)}")
             return ""
     
-    def save_uploaded_file(self, file_content: bytes, filename: str, 
+    def save_upload_stream(self, source, file_path: str, algorithm: str = 'sha256',
+                           chunk_size: int = 1024 * 1024) -> str:
+        """
+        حفظ ملف مرفوع من مجرى مع حساب hash أثناء النسخ
+
+        The hash is updated with every chunk as it is written, so the
+        upload is read once and never re-read from disk for hashing.
+
+        Args:
+            source: كائن ملف المصدر (مثل UploadFile.file)
+            file_path: مسار الحفظ
+            algorithm: خوارزمية الـ hash
+            chunk_size: حجم الجزء المنسوخ بالبايت
+
+        Returns:
+            hash الملف (نفس نتيجة calculate_file_hash)
+        """
+        try:
+            hash_obj = hashlib.new(algorithm)
+
+            with open(file_path, 'wb') as f:
+                for chunk in iter(lambda: source.read(chunk_size), b""):
+                    hash_obj.update(chunk)
+                    f.write(chunk)
+
+            return hash_obj.hexdigest()
+
+        except Exception as e:
+            logger.error(f"Error saving upload stream: {str(e)}")
+            raise
+
+    def save_uploaded_file(self, file_content: bytes, filename: str,
                           analysis_id: str) -> str:
         """
         حفظ الملف المرفوع
@@ -293,8 +346,13 @@ class FileHandler:
         try:
             import pandas as pd
             
+            # Frame columns straight from the frame store when available
+            frame_store = load_frame_store(results.get('frames_path'))
+            if frame_store is not None:
+                frame_store.to_dataframe(CSV_COLUMNS).to_csv(file_path, index=False, encoding='utf-8')
+            
             # Create DataFrame from detections
-            if 'detections' in results and results['detections']:
+            elif 'detections' in results and results['detections']:
                 detections_data = []
                 for detection in results['detections']:
                     metrics = detection.get('metrics', {})
@@ -334,7 +392,12 @@ class FileHandler:
                     summary_df.to_excel(writer, sheet_name='ملخص', index=False)
                 
                 # Detections sheet
-                if 'detections' in results and results['detections']:
+                frame_store = load_frame_store(results.get('frames_path'))
+                if frame_store is not None:
+                    detections_df = frame_store.to_dataframe(EXCEL_COLUMNS)
+                    detections_df.to_excel(writer, sheet_name='التحليلات', index=False)
+                
+                elif 'detections' in results and results['detections']:
                     detections_data = []
                     for detection in results['detections']:
                         metrics = detection.get('metrics', {})
@@ -381,6 +444,10 @@ class FileHandler:
                     if result_file.exists():
                         zipf.write(result_file, result_file.name)
                 
+                frames_file = self.results_dir / f"{analysis_id}_frames.npz"
+                if frames_file.exists():
+                    zipf.write(frames_file, frames_file.name)
+                
                 # Add video file if exists
                 video_files = list(self.upload_dir.glob(f"{analysis_id}_*"))
                 for video_file in video_files:
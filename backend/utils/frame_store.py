@@ -0,0 +1,249 @@
+import numpy as np
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Column name -> dtype, in export order
+FRAME_COLUMNS = {
+    'frame_number': np.int64,
+    'timestamp': np.float64,
+    'detections': np.int64,
+    'tracks': np.int64,
+    'active_sperm': np.int64,
+    'motile_sperm': np.int64,
+    'motility_percentage': np.float64,
+    'average_velocity': np.float64,
+    'density': np.float64,
+}
+
+METRIC_COLUMNS = ('active_sperm', 'motile_sperm', 'motility_percentage',
+                  'average_velocity', 'density', 'timestamp')
+
+class FrameStore:
+    """
+    مخزن عمودي لنتائج الإطارات
+
+    Each per-frame value lives in its own NumPy column instead of a nested
+    dict per frame. Columns grow by doubling in memory; past spill_rows they
+    move to memory-mapped files in a temporary directory, so hour-long
+    videos keep only the pages in use resident. The store is persisted as
+    an .npz file next to the JSON results and read back by the exports;
+    per-frame records and the time series are only built from it when an
+    endpoint asks for them.
+    """
+
+    def __init__(self, spill_rows: int = 100000, spill_dir: Optional[str] = None,
+                 capacity: int = 1024):
+        """
+        تهيئة المخزن
+
+        Args:
+            spill_rows: عدد الصفوف الذي تنتقل بعده الأعمدة إلى ملفات مربوطة بالذاكرة (0 = بدون)
+            spill_dir: مجلد الملفات المؤقتة (None = مجلد النظام المؤقت)
+            capacity: السعة الابتدائية بالصفوف
+        """
+        self.spill_rows = max(0, int(spill_rows))
+        self.spill_dir = spill_dir
+        self.spill_path: Optional[str] = None
+        self.capacity = max(1, int(capacity))
+        self.rows = 0
+        self.data: Dict[str, np.ndarray] = {
+            name: np.empty(self.capacity, dtype=dtype) for name, dtype in FRAME_COLUMNS.items()
+        }
+
+    @property
+    def spilled(self) -> bool:
+        """هل الأعمدة مربوطة بملفات على القرص"""
+        return self.spill_path is not None
+
+    def _column_file(self, name: str) -> str:
+        return os.path.join(self.spill_path, f"{name}.bin")
+
+    def _grow(self):
+        """مضاعفة السعة (مع الانتقال إلى القرص عند تجاوز الحد)"""
+        capacity = max(1, self.capacity * 2)
+
+        if self.spill_rows and (self.spilled or capacity > self.spill_rows):
+            if not self.spilled:
+                if self.spill_dir:
+                    os.makedirs(self.spill_dir, exist_ok=True)
+                self.spill_path = tempfile.mkdtemp(prefix='frames_', dir=self.spill_dir)
+                logger.info(f"Frame store spilling to memory-mapped files in {self.spill_path}")
+
+            for name, dtype in FRAME_COLUMNS.items():
+                old = self.data[name]
+                path = self._column_file(name)
+                if isinstance(old, np.memmap):
+                    # Extend the file in place; existing pages are not copied
+                    old.flush()
+                    del old
+                    with open(path, 'r+b') as f:
+                        f.truncate(capacity * np.dtype(dtype).itemsize)
+                    self.data[name] = np.memmap(path, dtype=dtype, mode='r+', shape=(capacity,))
+                else:
+                    column = np.memmap(path, dtype=dtype, mode='w+', shape=(capacity,))
+                    column[:self.rows] = old[:self.rows]
+                    self.data[name] = column
+        else:
+            for name, old in self.data.items():
+                column = np.empty(capacity, dtype=old.dtype)
+                column[:self.rows] = old[:self.rows]
+                self.data[name] = column
+
+        self.capacity = capacity
+
+    def append(self, frame_number: int, timestamp: float, detections: int, tracks: int,
+               metrics: Dict):
+        """
+        إضافة نتيجة إطار واحد
+
+        Args:
+            frame_number: رقم الإطار
+            timestamp: الطابع الزمني
+            detections: عدد الكشوفات
+            tracks: عدد التتبعات
+            metrics: مقاييس الإطار
+        """
+        if self.rows >= self.capacity:
+            self._grow()
+
+        row = self.rows
+        data = self.data
+        data['frame_number'][row] = frame_number
+        data['timestamp'][row] = timestamp
+        data['detections'][row] = detections
+        data['tracks'][row] = tracks
+        for name in METRIC_COLUMNS[:-1]:
+            data[name][row] = metrics.get(name, 0)
+        self.rows += 1
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def column(self, name: str) -> np.ndarray:
+        """عمود واحد (عرض على الصفوف المستخدمة بدون نسخ)"""
+        return self.data[name][:self.rows]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """جميع الأعمدة بترتيب التصدير"""
+        return {name: self.column(name) for name in FRAME_COLUMNS}
+
+    def to_records(self) -> List[Dict]:
+        """
+        بناء نتائج الإطارات بصيغة JSON (FrameResult) عند الحاجة فقط
+
+        Returns:
+            قائمة قواميس الإطارات
+        """
+        columns = {name: column.tolist() for name, column in self.columns().items()}
+        return [
+            {
+                'frame_number': columns['frame_number'][i],
+                'timestamp': columns['timestamp'][i],
+                'detections': columns['detections'][i],
+                'tracks': columns['tracks'][i],
+                'metrics': {name: columns[name][i] for name in METRIC_COLUMNS}
+            }
+            for i in range(self.rows)
+        ]
+
+    def time_series(self) -> List[Dict]:
+        """
+        بناء بيانات السلسلة الزمنية للرسوم (TimeSeriesData) عند الحاجة فقط
+
+        Returns:
+            قائمة قواميس السلسلة الزمنية
+        """
+        return [
+            {'time': time, 'sperm_count': count, 'motility': motility,
+             'velocity': velocity, 'density': density}
+            for time, count, motility, velocity, density in zip(*[
+                self.column(name).tolist() for name in
+                ('timestamp', 'active_sperm', 'motility_percentage', 'average_velocity', 'density')
+            ])
+        ]
+
+    def to_dataframe(self, labels: Optional[Dict[str, str]] = None):
+        """
+        تحويل الأعمدة إلى DataFrame مباشرة
+
+        Args:
+            labels: الأعمدة المطلوبة وأسماؤها في الملف (None = جميع الأعمدة)
+
+        Returns:
+            pandas.DataFrame
+        """
+        import pandas as pd
+
+        columns = self.columns()
+        if labels:
+            columns = {label: columns[name] for name, label in labels.items()}
+        return pd.DataFrame(columns, copy=False)
+
+    def save(self, path: str):
+        """
+        حفظ الأعمدة كملف .npz
+
+        Args:
+            path: مسار الملف
+        """
+        with open(path, 'wb') as f:
+            np.savez(f, **self.columns())
+
+    @classmethod
+    def from_columns(cls, columns) -> 'FrameStore':
+        """
+        إنشاء مخزن من أعمدة جاهزة (بدون نسخ إذا طابق النوع)
+
+        Args:
+            columns: اسم العمود -> المصفوفة (جميع أعمدة FRAME_COLUMNS)
+
+        Returns:
+            المخزن
+        """
+        store = cls(spill_rows=0)
+        for name, dtype in FRAME_COLUMNS.items():
+            store.data[name] = np.asarray(columns[name]).astype(dtype, copy=False)
+        store.rows = store.capacity = len(store.data['frame_number'])
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> 'FrameStore':
+        """
+        تحميل مخزن محفوظ
+
+        Args:
+            path: مسار ملف .npz
+
+        Returns:
+            المخزن
+        """
+        with np.load(path) as data:
+            return cls.from_columns({name: data[name] for name in FRAME_COLUMNS})
+
+    def close(self):
+        """تحرير الأعمدة وحذف الملفات المؤقتة"""
+        if self.spilled:
+            # Views handed out earlier keep their mapping until released
+            self.data = {name: np.empty(0, dtype=dtype) for name, dtype in FRAME_COLUMNS.items()}
+            self.rows = self.capacity = 0
+            shutil.rmtree(self.spill_path, ignore_errors=True)
+            self.spill_path = None
+
+def load_frame_store(path: Optional[str]) -> Optional[FrameStore]:
+    """
+    تحميل مخزن نتائج الإطارات إن وُجد
+
+    Args:
+        path: مسار ملف .npz
+
+    Returns:
+        المخزن أو None (نتائج قديمة بدون ملف أعمدة)
+    """
+    if path and os.path.exists(path):
+        return FrameStore.load(path)
+    return None
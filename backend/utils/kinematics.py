@@ -0,0 +1,116 @@
+import numpy as np
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+CASA_METRICS = ('vcl', 'vsl', 'vap', 'lin', 'str', 'alh', 'bcf')
+
+def _segment_sum(values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """جمع القيم لكل مقطع (مسار) بعملية واحدة"""
+    if len(values) == 0:
+        return np.zeros(len(offsets))
+    return np.add.reduceat(values, offsets, axis=0)
+
+def compute_track_kinematics(offsets: np.ndarray, positions: np.ndarray, frames: np.ndarray,
+                             fps: float, smoothing_window: int = 5) -> Dict[str, np.ndarray]:
+    """
+    حساب مقاييس الحركة لجميع المسارات دفعة واحدة
+
+    Trajectories are concatenated (grouped by track, in frame order) and
+    described by their segment offsets, so every metric is a handful of
+    array operations over all tracks instead of a Python loop per track.
+    Velocities use the frame span of each track; the average path is a
+    centered moving average of smoothing_window points inside each track.
+
+    CASA metrics (pixels and seconds):
+        VCL: curvilinear velocity (path length / time)
+        VSL: straight-line velocity (first-to-last distance / time)
+        VAP: average path velocity (smoothed path length / time)
+        LIN: linearity VSL / VCL
+        STR: straightness VSL / VAP
+        ALH: amplitude of lateral head displacement (2 x mean deviation from the average path)
+        BCF: beat-cross frequency (crossings of the average path per second)
+
+    Args:
+        offsets: بدايات المسارات في المصفوفات المتتالية (T,)
+        positions: المواقع (M, 2)
+        frames: أرقام الإطارات (M,)
+        fps: معدل الإطارات في الثانية
+        smoothing_window: عدد النقاط في المتوسط المتحرك للمسار المتوسط
+
+    Returns:
+        قاموس مصفوفات (T,) لكل مقياس: points, duration, total_distance,
+        average_speed ومقاييس CASA
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+    frames = np.asarray(frames, dtype=np.int64)
+    fps = fps if fps > 0 else 30.0
+
+    ends = np.append(offsets[1:], len(positions))
+    points = ends - offsets
+    track_of_row = np.repeat(np.arange(len(offsets)), points)
+    start_of_row = offsets[track_of_row]
+    end_of_row = ends[track_of_row]
+
+    # Steps between consecutive rows; the first row of each track has no step
+    first_rows = np.zeros(len(positions), dtype=bool)
+    first_rows[offsets[points > 0]] = True
+    steps = np.diff(positions, axis=0, prepend=positions[:1])
+    steps[first_rows] = 0.0
+    step_lengths = np.hypot(steps[:, 0], steps[:, 1])
+    total_distance = _segment_sum(step_lengths, offsets)
+
+    last = np.maximum(ends - 1, offsets)
+    frame_span = (frames[last] - frames[offsets]) if len(frames) else np.zeros(len(offsets))
+    time_span = frame_span / fps
+    valid = time_span > 0
+    safe_time = np.where(valid, time_span, 1.0)
+
+    straight = positions[last] - positions[offsets] if len(positions) else np.zeros((len(offsets), 2))
+    straight_distance = np.hypot(straight[:, 0], straight[:, 1])
+
+    # Average path: centered moving average, narrowed symmetrically near the
+    # ends of each track so the endpoints stay on the trajectory
+    rows = np.arange(len(positions))
+    half = np.minimum(max(1, int(smoothing_window)) // 2,
+                      np.minimum(rows - start_of_row, end_of_row - 1 - rows))
+    low = rows - half
+    high = rows + half
+    cumulative = np.vstack([np.zeros((1, 2)), np.cumsum(positions, axis=0)])
+    average_path = (cumulative[high + 1] - cumulative[low]) / (high - low + 1)[:, None]
+
+    average_steps = np.diff(average_path, axis=0, prepend=average_path[:1])
+    average_steps[first_rows] = 0.0
+    average_distance = _segment_sum(np.hypot(average_steps[:, 0], average_steps[:, 1]), offsets)
+
+    # Lateral deviation and its side relative to the average path direction
+    deviation = positions - average_path
+    deviation_lengths = np.hypot(deviation[:, 0], deviation[:, 1])
+    direction = np.diff(average_path, axis=0, append=average_path[-1:])
+    last_rows = np.zeros(len(positions), dtype=bool)
+    last_rows[last[points > 0]] = True
+    direction[last_rows] = average_steps[last_rows]
+    side = np.sign(direction[:, 0] * deviation[:, 1] - direction[:, 1] * deviation[:, 0])
+    crossings = np.zeros(len(positions))
+    crossings[1:] = (side[1:] * side[:-1]) < 0
+    crossings[first_rows] = 0.0
+
+    vcl = np.where(valid, total_distance / safe_time, 0.0)
+    vsl = np.where(valid, straight_distance / safe_time, 0.0)
+    vap = np.where(valid, average_distance / safe_time, 0.0)
+
+    return {
+        'points': points,
+        'duration': points / fps,
+        'total_distance': total_distance,
+        'average_speed': np.where(points > 0, total_distance / np.maximum(points / fps, 1e-9), 0.0),
+        'vcl': vcl,
+        'vsl': vsl,
+        'vap': vap,
+        'lin': np.divide(vsl, vcl, out=np.zeros_like(vsl), where=vcl > 0),
+        'str': np.divide(vsl, vap, out=np.zeros_like(vsl), where=vap > 0),
+        'alh': 2 * _segment_sum(deviation_lengths, offsets) / np.maximum(points, 1),
+        'bcf': np.where(valid, _segment_sum(crossings, offsets) / safe_time, 0.0)
+    }
@@ -0,0 +1,204 @@
+import asyncio
+import cv2
+import numpy as np
+import logging
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from utils.video_decoder import ffmpeg_path
+
+logger = logging.getLogger(__name__)
+
+LIVE_FORMATS = ('jpeg', 'h264')
+
+class LiveFrame:
+    """إطار مستلم من البث: بيانات JPEG أو إطار مفكوك"""
+
+    __slots__ = ('frame_number', 'data', 'received_at')
+
+    def __init__(self, frame_number: int, data, received_at: float):
+        self.frame_number = frame_number
+        self.data = data
+        self.received_at = received_at
+
+class LatestFrameSlot:
+    """
+    خانة تحتفظ بأحدث إطار فقط
+
+    The receiver never waits for the analysis: a frame that arrives while
+    the previous one is still waiting replaces it and counts as dropped.
+    Memory and latency stay bounded whatever the client's frame rate.
+    Used from the event loop only (put_threadsafe from other threads).
+    """
+
+    def __init__(self):
+        self._frame: Optional[LiveFrame] = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame: LiveFrame):
+        """إضافة إطار (يستبدل الإطار المنتظر إن وجد)"""
+        if self._closed:
+            return
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self.received += 1
+        self._event.set()
+
+    def put_threadsafe(self, loop: asyncio.AbstractEventLoop, frame: LiveFrame):
+        """إضافة إطار من خيط آخر"""
+        loop.call_soon_threadsafe(self.put, frame)
+
+    async def get(self) -> Optional[LiveFrame]:
+        """
+        انتظار الإطار التالي
+
+        Returns:
+            أحدث إطار، أو None بعد إغلاق الخانة
+        """
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+    def close(self):
+        """إغلاق الخانة (يبقى الإطار المنتظر متاحاً)"""
+        self._closed = True
+        self._event.set()
+
+class RateMeter:
+    """معدل الأحداث في الثانية خلال نافذة زمنية منزلقة"""
+
+    def __init__(self, window: float = 2.0):
+        self.window = window
+        self.times = deque()
+
+    def tick(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        self.times.append(now)
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def rate(self) -> float:
+        if len(self.times) < 2:
+            return 0.0
+        elapsed = self.times[-1] - self.times[0]
+        return (len(self.times) - 1) / elapsed if elapsed > 0 else 0.0
+
+class H264StreamDecoder:
+    """
+    فك ترميز بث H.264 (Annex-B) عبر عملية ffmpeg
+
+    Chunks from the client are written to ffmpeg's stdin; a reader thread
+    takes decoded frames from stdout as soon as they are complete and
+    hands them to on_frame, so ffmpeg never blocks on a full pipe.
+    """
+
+    def __init__(self, width: int, height: int, on_frame: Callable[[np.ndarray], None],
+                 threads: int = 0):
+        """
+        بدء عملية فك الترميز
+
+        Args:
+            width: عرض الإطارات المطلوبة
+            height: ارتفاع الإطارات المطلوبة
+            on_frame: دالة تستدعى بكل إطار BGR مفكوك (من خيط القراءة)
+            threads: خيوط فك الترميز (0 = تلقائي)
+        """
+        if not ffmpeg_path():
+            raise Exception("H.264 streams need ffmpeg, which is not installed")
+        self.width = int(width)
+        self.height = int(height)
+        self.on_frame = on_frame
+        command = [
+            ffmpeg_path(), '-nostdin', '-v', 'error', '-threads', str(max(0, int(threads))),
+            # Emit every frame as soon as it is decoded (no B-frame reordering delay)
+            '-flags', 'low_delay', '-f', 'h264', '-i', 'pipe:0',
+            '-an', '-vf', f'scale={self.width}:{self.height}:flags=area',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1'
+        ]
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=self._stderr)
+        self.thread = threading.Thread(target=self._read_frames, name='live-h264', daemon=True)
+        self.thread.start()
+
+    def feed(self, data: bytes):
+        """
+        تمرير جزء من البث لـ ffmpeg
+
+        Args:
+            data: بايتات H.264
+        """
+        self.process.stdin.write(data)
+        self.process.stdin.flush()
+
+    def _read_frames(self):
+        """خيط القراءة: تقطيع المخرجات إلى إطارات"""
+        frame_bytes = self.width * self.height * 3
+        while True:
+            # One fresh buffer per frame: the frame may wait in the slot
+            frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+            view = memoryview(frame).cast('B')
+            filled = 0
+            while filled < frame_bytes:
+                count = self.process.stdout.readinto(view[filled:])
+                if not count:
+                    return
+                filled += count
+            self.on_frame(frame)
+
+    def close(self, timeout: float = 5.0):
+        """إنهاء البث وانتظار آخر الإطارات"""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.thread.join(timeout=timeout)
+        self.process.stdout.close()
+        if self.process.returncode not in (0, -9):
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors='replace').strip()
+            if message:
+                logger.error(f"Error decoding live stream with ffmpeg: {message}")
+        self._stderr.close()
+        self.process = None
+
+def analyze_live_frame(session, frame: LiveFrame, fps: float) -> Optional[Dict]:
+    """
+    تحليل إطار من البث (تعمل في خيط البث المباشر)
+
+    JPEG frames are decoded here, only for the frames that are analyzed,
+    so dropped frames cost nothing but their upload.
+
+    Args:
+        session: جلسة التحليل (AnalysisSession)
+        frame: إطار البث
+        fps: معدل التقاط الإطارات
+
+    Returns:
+        نتيجة الإطار، أو None إذا تعذر فك ترميز الصورة
+    """
+    image = frame.data
+    if isinstance(image, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            return None
+    return session.process_live_frame(image, frame.frame_number, fps)
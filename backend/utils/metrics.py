@@ -0,0 +1,277 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from sub-millisecond frame stages to whole jobs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+QUEUE_DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+class LocalHistogram:
+    """
+    مدرج تكراري يحدثه خيط واحد بدون قفل
+
+    Used on the hot path: one bisect and three additions per value. Each
+    pipeline stage owns its histograms, so no two threads write the same
+    one; readers only take snapshots.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One count per bucket plus the +Inf bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        """إضافة قيمة (في أول فئة حدها >= القيمة)"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict:
+        """نسخة قابلة للتسلسل من القيم الحالية"""
+        return {'buckets': list(self.buckets), 'counts': list(self.counts),
+                'sum': self.sum, 'count': self.count}
+
+    def merge(self, snapshot: Dict):
+        """إضافة نسخة مدرج بنفس الفئات"""
+        if tuple(snapshot['buckets']) != self.buckets:
+            raise ValueError("Cannot merge histograms with different buckets")
+        for index, count in enumerate(snapshot['counts']):
+            self.counts[index] += count
+        self.sum += snapshot['sum']
+        self.count += snapshot['count']
+
+class HistogramSet:
+    """مدرجات تكرارية مسماة (مثل أزمنة مراحل خط المعالجة) لجلسة واحدة"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str, LocalHistogram] = {}
+
+    def get(self, name: str) -> LocalHistogram:
+        """
+        مدرج باسم (يُنشأ عند أول استخدام)
+
+        Args:
+            name: اسم المدرج (المرحلة)
+
+        Returns:
+            المدرج
+        """
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms.setdefault(name, LocalHistogram(self.buckets))
+        return histogram
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """نسخ جميع المدرجات"""
+        return {name: histogram.snapshot() for name, histogram in list(self.histograms.items())}
+
+    def merge(self, snapshot: Dict[str, Dict]):
+        """إضافة نسخ مدرجات (من مقطع أو عملية أخرى)"""
+        for name, histogram in snapshot.items():
+            self.get(name).merge(histogram)
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        العدد والزمن الكلي والمتوسط لكل مدرج
+
+        Returns:
+            الاسم -> count, total_time, mean_ms
+        """
+        return {
+            name: {
+                'count': histogram.count,
+                'total_time': round(histogram.sum, 4),
+                'mean_ms': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0.0
+            }
+            for name, histogram in list(self.histograms.items())
+        }
+
+    def format(self) -> str:
+        """متوسطات المدرجات بالمللي ثانية لسطر السجل"""
+        return ", ".join(f"{name} {values['mean_ms']:.2f} ms"
+                         for name, values in self.summary().items())
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """أساس المقاييس: الاسم والوصف وأسماء التسميات"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple, float]]] = None):
+        """
+        Args:
+            name: اسم المقياس
+            help_text: وصف المقياس
+            labels: أسماء التسميات
+            collect: دالة تعطي القيم عند القراءة فقط (قيم التسميات -> القيمة) أو None
+        """
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def samples(self) -> Dict[Tuple, float]:
+        if self.collect is not None:
+            return self.collect()
+        with self._lock:
+            return dict(self.values)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """عداد متزايد فقط"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """قيمة حالية"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    """مدرج تكراري بتسميات (تحديث تحت قفل، مناسب لخارج المسار الساخن)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[Tuple, LocalHistogram] = {}
+
+    def _histogram(self, labels: Dict) -> LocalHistogram:
+        key = self._key(labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LocalHistogram(self.buckets)
+        return histogram
+
+    def observe(self, value: float, **labels):
+        with self._lock:
+            self._histogram(labels).observe(value)
+
+    def merge(self, snapshot: Dict, **labels):
+        """
+        إضافة نسخة مدرج (LocalHistogram.snapshot) بنفس الفئات
+
+        Args:
+            snapshot: نسخة المدرج
+            labels: قيم التسميات
+        """
+        with self._lock:
+            self._histogram(labels).merge(snapshot)
+
+    @contextmanager
+    def time(self, **labels):
+        """قياس زمن كتلة كود"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            snapshots = {key: histogram.snapshot() for key, histogram in self.histograms.items()}
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for key, snapshot in sorted(snapshots.items()):
+            cumulative = 0
+            for bound, count in zip([*self.buckets, float('inf')], snapshot['counts']):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(float(snapshot['sum']))}")
+            lines.append(f"{self.name}_count{labels} {snapshot['count']}")
+        return "\n".join(lines)
+
+class MetricsRegistry:
+    """
+    سجل المقاييس بصيغة Prometheus النصية
+
+    Counters and histograms are updated with a short lock per call;
+    values that already exist elsewhere (cache statistics, open streams)
+    are read by collect callbacks at scrape time only, so scraping never
+    touches the analysis hot path.
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = (),
+                collect: Optional[Callable[[], Dict[Tuple, float]]] = None) -> Counter:
+        return self.register(Counter(name, help_text, labels, collect))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (),
+              collect: Optional[Callable[[], Dict[Tuple, float]]] = None) -> Gauge:
+        return self.register(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """
+        جميع المقاييس بصيغة العرض النصية
+
+        Returns:
+            النص
+        """
+        blocks = []
+        for metric in self.metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                logger.error(f"Error collecting metric {metric.name}: {str(e)}")
+        return "\n".join(blocks) + "\n"
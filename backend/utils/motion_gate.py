@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class MotionGate:
+    """
+    بوابة حركة رخيصة تقرر إعادة تشغيل الكشف أو إعادة استخدام الكشوفات السابقة
+
+    Each frame is compared, on a downscaled and blurred grayscale copy, with
+    the last frame the detector actually ran on. Comparing against that
+    reference (not the previous frame) means slow drift still accumulates
+    until it triggers a new detection. The threshold is a fraction of changed
+    pixels, low enough by default that a single moving cell on a sparse slide
+    still counts as motion.
+    """
+
+    def __init__(self, threshold: float = 0.0001, pixel_delta: int = 15,
+                 downscale_width: int = 320, max_skip: int = 30):
+        """
+        تهيئة بوابة الحركة
+
+        Args:
+            threshold: نسبة البكسلات المتغيرة التي تعتبر حركة
+            pixel_delta: أقل فرق في مستوى الرمادي لاعتبار البكسل متغيراً
+            downscale_width: عرض الإطار المصغر المستخدم للمقارنة
+            max_skip: أقصى عدد إطارات متتالية بدون كشف
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.downscale_width = downscale_width
+        self.max_skip = max_skip
+        self.reference: Optional[np.ndarray] = None
+        self.skipped_in_row = 0
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        """تصغير الإطار وتحويله إلى الرمادي"""
+        h, w = frame.shape[:2]
+        if w > self.downscale_width:
+            size = (self.downscale_width, max(1, int(round(h * self.downscale_width / w))))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Light blur so sensor noise does not count as motion
+        return cv2.GaussianBlur(frame, (5, 5), 0)
+
+    def changed_fraction(self, small: np.ndarray) -> float:
+        """نسبة البكسلات المتغيرة مقارنة بالإطار المرجعي"""
+        diff = cv2.absdiff(small, self.reference)
+        return float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """
+        تحديد ما إذا كان الإطار يحتاج تشغيل الكشف
+
+        Args:
+            frame: الإطار
+
+        Returns:
+            True إذا تغير المشهد (أو انتهت مهلة التخطي)، False لإطار ساكن
+        """
+        small = self._prepare(frame)
+
+        if (self.reference is None or small.shape != self.reference.shape
+                or self.skipped_in_row >= self.max_skip
+                or self.changed_fraction(small) > self.threshold):
+            self.reference = small
+            self.skipped_in_row = 0
+            return True
+
+        self.skipped_in_row += 1
+        return False
+
+    def reset(self):
+        """إعادة تعيين البوابة لفيديو جديد"""
+        self.reference = None
+        self.skipped_in_row = 0
+
+class RecordedMotionGate:
+    """
+    بوابة تعيد قرارات بوابة حركة مسجلة مسبقاً
+
+    A segment of a video cannot run its own gate: the first decisions
+    depend on the reference frame chosen before the segment starts. The
+    decisions of a serial scan are replayed instead, in order; past the
+    recorded ones every frame is detected.
+    """
+
+    def __init__(self, decisions):
+        """
+        Args:
+            decisions: قرارات الكشف بالترتيب (True = تشغيل الكشف)
+        """
+        self.decisions = [bool(decision) for decision in decisions]
+        self._next = iter(self.decisions)
+
+    def should_detect(self, frame: np.ndarray) -> bool:
+        """القرار المسجل للإطار التالي"""
+        return next(self._next, True)
+
+    def reset(self):
+        """العودة إلى أول قرار"""
+        self._next = iter(self.decisions)
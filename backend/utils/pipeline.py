@@ -0,0 +1,129 @@
+import queue
+import threading
+import logging
+from typing import Any, Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class StagePipeline:
+    """
+    خط معالجة متعدد المراحل يعمل بخيوط منفصلة وطوابير محدودة الحجم
+
+    Each stage runs in its own thread and hands items to the next stage
+    through a bounded queue, so a slow consumer blocks its producer instead
+    of letting decoded frames pile up in memory.
+    """
+
+    END = object()
+
+    def __init__(self, poll_interval: float = 0.1):
+        """
+        تهيئة خط المعالجة
+
+        Args:
+            poll_interval: فترة فحص إشارة الإيقاف أثناء الانتظار (بالثواني)
+        """
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.error: Optional[BaseException] = None
+
+    def make_queue(self, maxsize: int) -> queue.Queue:
+        """
+        إنشاء طابور محدود بين مرحلتين
+
+        Args:
+            maxsize: أقصى عدد عناصر في الطابور
+
+        Returns:
+            الطابور
+        """
+        return queue.Queue(maxsize=max(1, int(maxsize)))
+
+    def start_stage(self, name: str, target: Callable, *args) -> threading.Thread:
+        """
+        تشغيل مرحلة في خيط منفصل
+
+        Args:
+            name: اسم المرحلة
+            target: دالة المرحلة
+            args: معاملات الدالة
+
+        Returns:
+            خيط المرحلة
+        """
+        def run():
+            try:
+                target(*args)
+            except BaseException as e:
+                logger.error(f"Error in pipeline stage {name}: {str(e)}")
+                if self.error is None:
+                    self.error = e
+                self.stop_event.set()
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return thread
+
+    def put(self, q: queue.Queue, item: Any) -> bool:
+        """
+        إضافة عنصر للطابور مع الانتظار عند امتلائه
+
+        Args:
+            q: الطابور
+            item: العنصر
+
+        Returns:
+            False إذا تم إيقاف خط المعالجة قبل الإضافة
+        """
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self, q: queue.Queue) -> Any:
+        """
+        سحب عنصر من الطابور مع الانتظار عند فراغه
+
+        Args:
+            q: الطابور
+
+        Returns:
+            العنصر، أو END عند إيقاف خط المعالجة
+        """
+        while True:
+            try:
+                return q.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    return self.END
+
+    def iterate(self, q: queue.Queue) -> Iterator[Any]:
+        """
+        استهلاك عناصر الطابور بالترتيب حتى نهاية البيانات
+
+        Args:
+            q: طابور المرحلة الأخيرة
+
+        Returns:
+            مولد العناصر
+        """
+        while True:
+            item = self.get(q)
+            if item is self.END:
+                break
+            yield item
+
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """إيقاف جميع المراحل وانتظار انتهاء خيوطها"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
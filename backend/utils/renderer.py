@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FrameRenderer:
+    """
+    رسم نتائج التتبع على إطارات الفيديو
+
+    Draws each track's box, id and recent trail plus the frame counters.
+    Trails are kept per track in bounded deques and forgotten once a track
+    has not been seen for trail_length frames, so memory stays constant
+    over long videos.
+    """
+
+    def __init__(self, trail_length: int = 30, box_scale: Optional[np.ndarray] = None):
+        """
+        تهيئة الرسام
+
+        Args:
+            trail_length: عدد المواقع الأخيرة المرسومة لكل مسار
+            box_scale: معاملات تحويل المربعات من دقة الفيديو الأصلية إلى دقة الإطارات (None = نفس الدقة)
+        """
+        self.trail_length = max(0, int(trail_length))
+        self.inverse_scale = None if box_scale is None else 1.0 / np.asarray(box_scale, dtype=np.float64)
+        self.trails: Dict[int, deque] = {}
+        self.last_seen: Dict[int, int] = {}
+        self.frame_index = 0
+
+    @staticmethod
+    def track_color(track_id: int):
+        """لون ثابت لكل مسار"""
+        hue = (track_id * 47) % 180
+        color = cv2.cvtColor(np.uint8([[[hue, 220, 255]]]), cv2.COLOR_HSV2BGR)[0, 0]
+        return tuple(int(c) for c in color)
+
+    def draw(self, frame: np.ndarray, tracks: List[Dict], metrics: Dict) -> np.ndarray:
+        """
+        رسم إطار واحد (يعدل الإطار في مكانه)
+
+        Args:
+            frame: إطار BGR
+            tracks: المسارات (track_id و bbox بدقة الفيديو الأصلية)
+            metrics: مقاييس الإطار
+
+        Returns:
+            الإطار المرسوم
+        """
+        for track in tracks:
+            track_id = track['track_id']
+            box = np.asarray(track['bbox'], dtype=np.float64)
+            if self.inverse_scale is not None:
+                box = box * self.inverse_scale
+            left, top, right, bottom = box.round().astype(int).tolist()
+            color = self.track_color(track_id)
+
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 1)
+            cv2.putText(frame, str(track_id), (left, max(top - 3, 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+            if self.trail_length:
+                trail = self.trails.get(track_id)
+                if trail is None:
+                    trail = self.trails[track_id] = deque(maxlen=self.trail_length)
+                trail.append(((left + right) // 2, (top + bottom) // 2))
+                self.last_seen[track_id] = self.frame_index
+                if len(trail) > 1:
+                    cv2.polylines(frame, [np.array(trail, dtype=np.int32)], False, color, 1)
+
+        # Frame counters
+        cv2.putText(frame, f"Sperm Count: {metrics.get('active_sperm', 0)}",
+                    (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.putText(frame, f"Motility: {metrics.get('motility_percentage', 0):.1f}%",
+                    (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        cv2.putText(frame, f"Avg Velocity: {metrics.get('average_velocity', 0):.1f}",
+                    (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Forget trails of tracks that left
+        if self.trail_length and self.frame_index % self.trail_length == 0:
+            cutoff = self.frame_index - self.trail_length
+            for track_id in [t for t, seen in self.last_seen.items() if seen < cutoff]:
+                del self.trails[track_id]
+                del self.last_seen[track_id]
+
+        self.frame_index += 1
+        return frame
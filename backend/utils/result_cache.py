@@ -0,0 +1,239 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when a code change alters analysis results for the same inputs
+CACHE_FORMAT_VERSION = 1
+
+# Request parameters that do not change the results
+UNCACHED_PARAMETERS = ('cache',)
+
+def link_or_copy(source: str, destination: str):
+    """ربط صلب للملف (بدون نسخ البيانات) أو نسخه إذا تعذر الربط"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+class ResultCache:
+    """
+    ذاكرة مؤقتة لنتائج التحليل مفهرسة بمحتوى الفيديو
+
+    The key combines the content hash of the uploaded video, the model
+    version and the analysis parameters, so the same video analyzed with
+    the same model and settings is only analyzed once. Entry files are
+    hard links to the analysis result files when the filesystem allows
+    it, so caching costs no copy and an entry survives the deletion of
+    the analysis it came from. Entries are evicted least recently used
+    first once their total size exceeds max_bytes. All methods are
+    thread-safe (they run in the I/O pool).
+    """
+
+    def __init__(self, cache_dir: str = "results/cache", max_bytes: int = 2048 * 1024 * 1024):
+        """
+        تهيئة الذاكرة المؤقتة
+
+        Args:
+            cache_dir: مجلد ملفات الذاكرة المؤقتة
+            max_bytes: أقصى حجم كلي للمدخلات بالبايت (0 = معطلة)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max(0, int(max_bytes))
+        self.index_path = self.cache_dir / "index.json"
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if self.enabled:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(video_hash: str, model_version: str, parameters: Dict) -> str:
+        """
+        مفتاح الذاكرة المؤقتة
+
+        Args:
+            video_hash: hash محتوى الفيديو
+            model_version: إصدار النموذج (الإعدادات وhash الأوزان)
+            parameters: معاملات التحليل الفعلية
+
+        Returns:
+            المفتاح (sha256)
+        """
+        parameters = {name: value for name, value in parameters.items()
+                      if name not in UNCACHED_PARAMETERS}
+        payload = json.dumps({
+            'format': CACHE_FORMAT_VERSION,
+            'video': video_hash,
+            'model': model_version,
+            'parameters': parameters
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _load_index(self):
+        """تحميل فهرس المدخلات المحفوظة (بترتيب الاستخدام)"""
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading result cache index: {str(e)}")
+            return
+        for key, entry in entries:
+            if all((self.cache_dir / key / name).exists() for name in entry['files'].values()):
+                self.entries[key] = entry
+                self.total_bytes += entry['bytes']
+
+    def _save_index(self):
+        """حفظ الفهرس (يستدعى مع القفل)"""
+        temp_path = self.index_path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self.entries.items()), f)
+        os.replace(temp_path, self.index_path)
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """
+        البحث عن مدخل (يحدث عدادات الإصابة والإخفاق)
+
+        Args:
+            key: المفتاح
+
+        Returns:
+            المدخل (مع مفتاحه) أو None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return {**entry, 'key': key}
+
+    def store(self, key: str, files: Dict[str, str], source_id: str):
+        """
+        حفظ ملفات نتائج تحليل
+
+        Args:
+            key: المفتاح
+            files: نوع الملف -> مسار الملف (results, frames, annotated)
+            source_id: معرف التحليل الأصلي
+        """
+        if not self.enabled:
+            return
+        files = {kind: path for kind, path in files.items() if path and os.path.exists(path)}
+        entry_dir = self.cache_dir / key
+        try:
+            with self._lock:
+                if key in self.entries:
+                    return
+                entry_dir.mkdir(parents=True, exist_ok=True)
+                names = {}
+                size = 0
+                for kind, path in files.items():
+                    name = f"{kind}{Path(path).suffix}"
+                    link_or_copy(path, str(entry_dir / name))
+                    names[kind] = name
+                    size += os.path.getsize(path)
+                self.entries[key] = {'files': names, 'bytes': size, 'source': source_id,
+                                     'created_at': time.time()}
+                self.total_bytes += size
+                self._evict()
+                self._save_index()
+        except Exception as e:
+            logger.error(f"Error storing cached results: {str(e)}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def restore(self, entry: Dict, destinations: Dict[str, str]) -> Dict[str, str]:
+        """
+        نسخ ملفات مدخل إلى مسارات تحليل جديد
+
+        An entry evicted since its lookup raises FileNotFoundError; the
+        caller then analyzes the video.
+
+        Args:
+            entry: المدخل (lookup)
+            destinations: نوع الملف -> المسار الجديد
+
+        Returns:
+            نوع الملف -> المسار الجديد للملفات الموجودة في المدخل
+        """
+        key_dir = self.cache_dir / entry['key']
+        restored = {}
+        for kind, name in entry['files'].items():
+            if kind in destinations:
+                link_or_copy(str(key_dir / name), destinations[kind])
+                restored[kind] = destinations[kind]
+        return restored
+
+    def read_results(self, entry: Dict) -> Dict:
+        """
+        قراءة نتائج JSON لمدخل
+
+        Args:
+            entry: المدخل (lookup)
+
+        Returns:
+            النتائج
+        """
+        with open(self.cache_dir / entry['key'] / entry['files']['results'], "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _evict(self):
+        """حذف الأقدم استخداماً حتى يعود الحجم تحت الحد (يستدعى مع القفل)"""
+        # An entry larger than the whole cache is dropped right away
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry['bytes']
+            self.evictions += 1
+            shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+            logger.info(f"Evicted cached results {key[:12]} ({entry['bytes']} bytes)")
+
+    def clear(self):
+        """حذف جميع المدخلات"""
+        with self._lock:
+            for key in list(self.entries):
+                shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+            self.entries.clear()
+            self.total_bytes = 0
+            if self.enabled:
+                self._save_index()
+
+    def stats(self) -> Dict:
+        """
+        إحصائيات الذاكرة المؤقتة
+
+        Returns:
+            عدد المدخلات والحجم والإصابات والإخفاقات
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
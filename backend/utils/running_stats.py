@@ -0,0 +1,219 @@
+import math
+import logging
+import numpy as np
+from typing import Dict, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class RunningStat:
+    """
+    إحصائيات متدفقة لقيمة واحدة (المتوسط والتباين بطريقة Welford، والحدين الأدنى والأعلى)
+    """
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def update(self, value: float):
+        """إضافة قيمة"""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def update_many(self, values: np.ndarray):
+        """
+        إضافة مصفوفة قيم دفعة واحدة (دمج Chan للمتوسط والتباين)
+
+        Args:
+            values: القيم
+        """
+        values = np.asarray(values, dtype=np.float64)
+        count = len(values)
+        if not count:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, values.min().item())
+        self.max = max(self.max, values.max().item())
+
+    @property
+    def std(self) -> float:
+        """الانحراف المعياري للمجتمع (مثل np.std)"""
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        """القيم الحالية (أصفار قبل أول قيمة)"""
+        if not self.count:
+            return {'min': 0, 'max': 0, 'mean': 0, 'std': 0}
+        return {'min': self.min, 'max': self.max, 'mean': self.mean, 'std': self.std}
+
+def bucket_edges(edges: Sequence[float], name: str = 'buckets') -> Tuple[float, float]:
+    """
+    التحقق من حدود فئات الملخص (فئتان داخليتان لثلاث فئات)
+
+    The summary always reports three buckets (low/medium/high and
+    slow/medium/fast), so exactly two ascending, non-negative edges are
+    accepted.
+
+    Args:
+        edges: الحدود المطلوبة
+        name: اسم المعامل في رسالة الخطأ
+
+    Returns:
+        الحدان كأعداد عشرية
+
+    Raises:
+        ValueError: إذا لم تكن الحدود حدين تصاعديين غير سالبين
+    """
+    try:
+        values = tuple(float(edge) for edge in edges)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a list of two numbers")
+    if len(values) != 2:
+        raise ValueError(f"{name} must have exactly two edges, got {len(values)}")
+    if not all(math.isfinite(value) and value >= 0 for value in values):
+        raise ValueError(f"{name} edges must be finite and non-negative")
+    if values[0] >= values[1]:
+        raise ValueError(f"{name} edges must be ascending")
+    return values
+
+class BucketCounter:
+    """عداد فئات بحدود ثابتة (الفئة الأخيرة مفتوحة)"""
+
+    __slots__ = ('edges', 'labels', 'counts')
+
+    def __init__(self, edges: Sequence[float], labels: Sequence[str]):
+        """
+        Args:
+            edges: الحدود الداخلية للفئات
+            labels: أسماء الفئات (len(edges) + 1)
+        """
+        self.edges = tuple(edges)
+        self.labels = tuple(labels)
+        self.counts = [0] * len(self.labels)
+
+    def update(self, value: float):
+        """إضافة قيمة إلى فئتها"""
+        index = 0
+        for edge in self.edges:
+            if value < edge:
+                break
+            index += 1
+        self.counts[index] += 1
+
+    def update_many(self, values: np.ndarray):
+        """إضافة مصفوفة قيم إلى فئاتها"""
+        indices = np.searchsorted(self.edges, np.asarray(values, dtype=np.float64), side='right')
+        for index, count in enumerate(np.bincount(indices, minlength=len(self.labels)).tolist()):
+            self.counts[index] += count
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(zip(self.labels, self.counts))
+
+class RunningSummary:
+    """
+    ملخص التحليل المحدث إطاراً بإطار بذاكرة ثابتة
+
+    Every aggregate of the final summary (means, maxima, density
+    min/max/mean/std and the motility/velocity buckets) is updated as each
+    frame's metrics arrive, so the summary can be read at any point during
+    the analysis and is complete as soon as the last frame is processed.
+    """
+
+    def __init__(self, motility_edges: Sequence[float] = (30, 70),
+                 velocity_edges: Sequence[float] = (20, 50)):
+        """
+        Args:
+            motility_edges: حدود فئات نسبة الحركة (منخفضة/متوسطة/عالية)
+            velocity_edges: حدود فئات السرعة (بطيئة/متوسطة/سريعة)
+        """
+        self.frames = 0
+        self.sperm_count = RunningStat()
+        self.motility = RunningStat()
+        self.velocity = RunningStat()
+        self.density = RunningStat()
+        self.motility_buckets = BucketCounter(motility_edges, ('low', 'medium', 'high'))
+        self.velocity_buckets = BucketCounter(velocity_edges, ('slow', 'medium', 'fast'))
+
+    def update(self, metrics: Dict):
+        """
+        إضافة مقاييس إطار
+
+        Args:
+            metrics: مقاييس الإطار (calculate_frame_metrics)
+        """
+        motility = metrics.get('motility_percentage', 0)
+        velocity = metrics.get('average_velocity', 0)
+
+        self.frames += 1
+        self.sperm_count.update(metrics.get('active_sperm', 0))
+        self.motility.update(motility)
+        self.velocity.update(velocity)
+        self.density.update(metrics.get('density', 0))
+        self.motility_buckets.update(motility)
+        self.velocity_buckets.update(velocity)
+
+    def update_columns(self, columns: Dict[str, np.ndarray]):
+        """
+        إضافة مقاييس عدة إطارات من أعمدتها (مثل update لكل صف)
+
+        Args:
+            columns: أعمدة المقاييس (active_sperm, motility_percentage, average_velocity, density)
+        """
+        motility = columns['motility_percentage']
+        velocity = columns['average_velocity']
+
+        self.frames += len(motility)
+        self.sperm_count.update_many(columns['active_sperm'])
+        self.motility.update_many(motility)
+        self.velocity.update_many(velocity)
+        self.density.update_many(columns['density'])
+        self.motility_buckets.update_many(motility)
+        self.velocity_buckets.update_many(velocity)
+
+    def summary(self) -> Dict:
+        """
+        قيم الملخص الحالية بنفس مفاتيح summary في النتائج
+
+        Returns:
+            قاموس الملخص
+        """
+        return {
+            'max_concurrent_sperm': int(self.sperm_count.max) if self.frames else 0,
+            'average_sperm_count': round(self.sperm_count.mean, 2),
+            'average_motility_percentage': round(self.motility.mean, 2),
+            'max_motility_percentage': round(self.motility.max, 2) if self.frames else 0,
+            'average_velocity': round(self.velocity.mean, 2),
+            'max_velocity': round(self.velocity.max, 2) if self.frames else 0,
+            'average_density': round(self.density.mean, 4),
+            'max_density': round(self.density.max, 4) if self.frames else 0,
+            'total_frames': self.frames
+        }
+
+    def statistics(self) -> Dict:
+        """
+        توزيعات الحركة والسرعة وإحصائيات الكثافة الحالية
+
+        Returns:
+            قاموس الإحصائيات
+        """
+        return {
+            'motility_distribution': self.motility_buckets.as_dict(),
+            'velocity_distribution': self.velocity_buckets.as_dict(),
+            'density_statistics': self.density.as_dict()
+        }
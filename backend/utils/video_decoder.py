@@ -0,0 +1,345 @@
+import cv2
+import numpy as np
+import json
+import logging
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VIDEO_DECODERS = ('auto', 'ffmpeg', 'opencv')
+
+# Raw pixel formats read from the ffmpeg pipe and their channel counts
+PIXEL_FORMATS = {'bgr24': 3, 'gray': 1}
+
+@lru_cache(maxsize=None)
+def ffmpeg_path() -> Optional[str]:
+    """مسار ffmpeg (None إذا لم يكن مثبتاً)"""
+    return shutil.which('ffmpeg')
+
+@lru_cache(maxsize=None)
+def ffprobe_path() -> Optional[str]:
+    """مسار ffprobe (None إذا لم يكن مثبتاً)"""
+    return shutil.which('ffprobe')
+
+def probe_video(video_path: str) -> Optional[Dict]:
+    """
+    قراءة أبعاد الفيديو ومعدل الإطارات وعدد الإطارات
+
+    Uses ffprobe when it is installed and OpenCV otherwise (OpenCV only
+    opens the container here, no frame is decoded).
+
+    Args:
+        video_path: مسار الفيديو
+
+    Returns:
+        width, height, fps, frame_count أو None إذا تعذر فتح الفيديو
+    """
+    if ffprobe_path():
+        try:
+            result = subprocess.run(
+                [ffprobe_path(), '-v', 'error', '-select_streams', 'v:0',
+                 '-show_entries', 'stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration',
+                 '-of', 'json', video_path],
+                capture_output=True, text=True, timeout=30
+            )
+            streams = json.loads(result.stdout or '{}').get('streams') or []
+            if result.returncode == 0 and streams:
+                stream = streams[0]
+                fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+                frame_count = int(stream.get('nb_frames') or 0)
+                if not frame_count and stream.get('duration'):
+                    frame_count = int(round(float(stream['duration']) * fps))
+                return {'width': int(stream['width']), 'height': int(stream['height']),
+                        'fps': fps, 'frame_count': frame_count}
+        except (subprocess.SubprocessError, ValueError, KeyError) as e:
+            logger.error(f"Error probing video with ffprobe: {str(e)}")
+
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        return {'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                'fps': cap.get(cv2.CAP_PROP_FPS),
+                'frame_count': int(cap.get(cv2.CAP_PROP_FRAME_COUNT))}
+    finally:
+        cap.release()
+
+def _parse_rate(rate: Optional[str]) -> float:
+    """تحويل معدل الإطارات من صيغة 30000/1001"""
+    if not rate:
+        return 0.0
+    numerator, _, denominator = rate.partition('/')
+    denominator = float(denominator or 1)
+    return float(numerator) / denominator if denominator else 0.0
+
+class FFmpegVideoReader:
+    """
+    قارئ فيديو يفك الترميز بعملية ffmpeg متعددة الخيوط
+
+    ffmpeg decodes with its own frame/slice threads, applies the optional
+    select/crop/scale filters and writes raw frames to a pipe; read() fills
+    a preallocated buffer with readinto, so no memory is allocated per
+    frame. Frames come from a ring of `buffers` arrays: a returned frame
+    stays valid until `buffers` more frames have been read, so callers that
+    keep frames (queues, batches) must size the ring accordingly.
+
+    The interface mirrors cv2.VideoCapture (isOpened, read, grab, get, set,
+    release) so it can replace it directly.
+    """
+
+    def __init__(self, video_path: str, pix_fmt: str = 'bgr24', threads: int = 0,
+                 size: Optional[Tuple[int, int]] = None,
+                 crop: Optional[Tuple[int, int, int, int]] = None,
+                 every: int = 1, buffers: int = 2):
+        """
+        فتح الفيديو
+
+        Args:
+            video_path: مسار الفيديو
+            pix_fmt: صيغة البكسلات (bgr24 أو gray)
+            threads: خيوط فك الترميز (0 = تلقائي)
+            size: أبعاد الإخراج (العرض، الارتفاع) أو None
+            crop: منطقة القص (x, y, العرض، الارتفاع) قبل تغيير الأبعاد أو None
+            every: إخراج إطار واحد من كل n إطار (تُسقط البقية داخل ffmpeg)
+            buffers: عدد مخازن الإطارات الدوارة
+        """
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported pixel format: {pix_fmt}")
+        self.video_path = video_path
+        self.pix_fmt = pix_fmt
+        self.threads = max(0, int(threads))
+        self.crop = tuple(crop) if crop else None
+        self.every = max(1, int(every))
+        self.info = probe_video(video_path)
+        self.process: Optional[subprocess.Popen] = None
+        self.position = 0
+        self.buffers = []
+        self._next_buffer = 0
+        self._stderr = None
+        if self.info is None:
+            return
+
+        width, height = (self.crop[2], self.crop[3]) if self.crop else (self.info['width'], self.info['height'])
+        self.size = tuple(size) if size else (width, height)
+        channels = PIXEL_FORMATS[pix_fmt]
+        shape = (self.size[1], self.size[0], channels) if channels > 1 else (self.size[1], self.size[0])
+        self.buffers = [np.empty(shape, dtype=np.uint8) for _ in range(max(1, int(buffers)))]
+        self.frame_bytes = self.buffers[0].nbytes
+        self._start(0)
+
+    def _command(self, start_frame: int) -> list:
+        """سطر أوامر ffmpeg"""
+        command = [ffmpeg_path(), '-nostdin', '-v', 'error', '-threads', str(self.threads)]
+        if start_frame > 0 and self.info['fps'] > 0:
+            # Input seeking is frame-accurate when transcoding
+            command += ['-ss', f"{start_frame / self.info['fps']:.6f}"]
+        command += ['-i', self.video_path, '-an', '-sn', '-dn']
+
+        filters = []
+        if self.every > 1:
+            filters.append(f"select=not(mod(n\\,{self.every}))")
+        if self.crop:
+            x, y, width, height = self.crop
+            filters.append(f"crop={width}:{height}:{x}:{y}")
+        source = (self.crop[2], self.crop[3]) if self.crop else (self.info['width'], self.info['height'])
+        if self.size != source:
+            # Area averaging, like cv2.INTER_AREA, for downscaling
+            filters.append(f"scale={self.size[0]}:{self.size[1]}:flags=area")
+        if filters:
+            command += ['-vf', ','.join(filters)]
+        if self.every > 1:
+            # Keep one output frame per selected frame (no duplication)
+            command += ['-vsync', '0']
+        command += ['-f', 'rawvideo', '-pix_fmt', self.pix_fmt, 'pipe:1']
+        return command
+
+    def _start(self, start_frame: int):
+        """تشغيل عملية ffmpeg من الإطار المحدد"""
+        self._stop()
+        # stderr goes to a file so a chatty decoder can never block the pipe
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(self._command(start_frame), stdout=subprocess.PIPE,
+                                        stderr=self._stderr, bufsize=self.frame_bytes)
+        self.position = start_frame
+
+    def _stop(self):
+        """إيقاف عملية ffmpeg الحالية"""
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process.stdout.close()
+            self.process.wait()
+            if self.process.returncode not in (0, -9) and self._stderr is not None:
+                self._stderr.seek(0)
+                message = self._stderr.read().decode(errors='replace').strip()
+                if message:
+                    logger.error(f"Error decoding video with ffmpeg: {message}")
+            self.process = None
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+
+    def isOpened(self) -> bool:
+        return self.process is not None
+
+    def grab(self) -> bool:
+        return self.read()[0]
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        قراءة الإطار التالي
+
+        Returns:
+            (نجاح القراءة، الإطار) - الإطار عرض لمخزن يعاد استخدامه
+        """
+        if self.process is None:
+            return False, None
+        frame = self.buffers[self._next_buffer]
+        view = memoryview(frame).cast('B')
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False, None
+            filled += count
+        self._next_buffer = (self._next_buffer + 1) % len(self.buffers)
+        self.position += self.every
+        return True, frame
+
+    def get(self, prop: int) -> float:
+        if self.info is None:
+            return 0.0
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.info['fps'])
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.info['frame_count'])
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+
+    def set(self, prop: int, value: float) -> bool:
+        """دعم الانتقال إلى إطار (CAP_PROP_POS_FRAMES) بإعادة تشغيل ffmpeg"""
+        if prop != cv2.CAP_PROP_POS_FRAMES or self.info is None:
+            return False
+        self._start(max(0, int(value)))
+        return True
+
+    def release(self):
+        self._stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+class OpenCVVideoReader:
+    """
+    قارئ OpenCV بنفس واجهة FFmpegVideoReader وخياراتها
+
+    Used when ffmpeg is not installed: crop, resize, gray conversion and
+    frame selection are applied in Python so callers get the same frames
+    from either decoder.
+    """
+
+    def __init__(self, video_path: str, pix_fmt: str = 'bgr24',
+                 size: Optional[Tuple[int, int]] = None,
+                 crop: Optional[Tuple[int, int, int, int]] = None, every: int = 1):
+        if pix_fmt not in PIXEL_FORMATS:
+            raise ValueError(f"Unsupported pixel format: {pix_fmt}")
+        self.cap = cv2.VideoCapture(video_path)
+        self.pix_fmt = pix_fmt
+        self.crop = tuple(crop) if crop else None
+        self.every = max(1, int(every))
+        self.position = 0
+        if self.crop:
+            source = (self.crop[2], self.crop[3])
+        else:
+            source = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                      int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        self.size = tuple(size) if size else source
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def grab(self) -> bool:
+        return self.read()[0]
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        # Frames between selected ones are only grabbed (no color conversion)
+        if self.position % self.every:
+            for _ in range(self.every - self.position % self.every):
+                if not self.cap.grab():
+                    return False, None
+        ret, frame = self.cap.read()
+        self.position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if not ret:
+            return False, None
+        if self.crop:
+            x, y, width, height = self.crop
+            frame = frame[y:y + height, x:x + width]
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if self.pix_fmt == 'gray':
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return True, frame
+
+    def get(self, prop: int) -> float:
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        return self.cap.get(prop)
+
+    def set(self, prop: int, value: float) -> bool:
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def open_video(video_path: str, decoder: str = 'auto', pix_fmt: str = 'bgr24', threads: int = 0,
+               size: Optional[Tuple[int, int]] = None,
+               crop: Optional[Tuple[int, int, int, int]] = None,
+               every: int = 1, buffers: int = 2):
+    """
+    فتح فيديو بمفكك الترميز المطلوب
+
+    Args:
+        video_path: مسار الفيديو
+        decoder: auto (ffmpeg إن وجد) أو ffmpeg أو opencv
+        pix_fmt: صيغة البكسلات (bgr24 أو gray)
+        threads: خيوط فك الترميز لـ ffmpeg (0 = تلقائي)
+        size: أبعاد الإخراج (العرض، الارتفاع) أو None
+        crop: منطقة القص (x, y, العرض، الارتفاع) أو None
+        every: إخراج إطار واحد من كل n إطار
+        buffers: عدد مخازن الإطارات الدوارة لـ ffmpeg
+
+    Returns:
+        قارئ بواجهة cv2.VideoCapture
+    """
+    if decoder not in VIDEO_DECODERS:
+        raise ValueError(f"Unknown video decoder: {decoder}. Available: {', '.join(VIDEO_DECODERS)}")
+
+    if decoder != 'opencv':
+        if ffmpeg_path():
+            return FFmpegVideoReader(video_path, pix_fmt=pix_fmt, threads=threads, size=size,
+                                     crop=crop, every=every, buffers=buffers)
+        if decoder == 'ffmpeg':
+            logger.warning("ffmpeg not found, falling back to OpenCV decoding")
+
+    return OpenCVVideoReader(video_path, pix_fmt=pix_fmt, size=size, crop=crop, every=every)
@@ -0,0 +1,139 @@
+import cv2
+import numpy as np
+import logging
+import subprocess
+import tempfile
+from typing import Optional, Tuple
+
+from utils.video_decoder import ffmpeg_path
+
+logger = logging.getLogger(__name__)
+
+VIDEO_ENCODERS = ('auto', 'ffmpeg', 'opencv')
+
+class FFmpegVideoWriter:
+    """
+    كاتب فيديو MP4 (H.264) عبر أنبوب stdin لعملية ffmpeg
+
+    Raw bgr24 frames are written to ffmpeg's stdin and encoded with
+    libx264 in the ffmpeg process, on its own threads, so encoding
+    overlaps with the analysis instead of running in the Python thread.
+    The interface mirrors cv2.VideoWriter (isOpened, write, release).
+    """
+
+    def __init__(self, output_path: str, fps: float, size: Tuple[int, int],
+                 crf: int = 23, preset: str = 'veryfast', threads: int = 0):
+        """
+        بدء عملية الترميز
+
+        Args:
+            output_path: مسار ملف MP4
+            fps: معدل الإطارات
+            size: أبعاد الإطارات (العرض، الارتفاع)
+            crf: جودة الترميز (أقل = أعلى جودة)
+            preset: سرعة الترميز في libx264
+            threads: خيوط الترميز (0 = تلقائي)
+        """
+        self.output_path = output_path
+        self.size = tuple(size)
+        width, height = self.size
+        # yuv420p needs even dimensions; odd frames are padded by one pixel
+        command = [
+            ffmpeg_path(), '-nostdin', '-v', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            '-r', f'{fps if fps > 0 else 30.0:.6f}', '-i', 'pipe:0',
+            '-an', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-c:v', 'libx264', '-preset', preset, '-crf', str(int(crf)),
+            '-threads', str(max(0, int(threads))),
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart', output_path
+        ]
+        # stderr goes to a file so a chatty encoder can never block the pipe
+        self._stderr = tempfile.TemporaryFile()
+        self.process: Optional[subprocess.Popen] = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stderr=self._stderr)
+
+    def isOpened(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def write(self, frame: np.ndarray):
+        """
+        كتابة إطار
+
+        Args:
+            frame: إطار BGR بأبعاد الكاتب
+        """
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self.process.stdin.write(np.ascontiguousarray(frame).data)
+
+    def release(self) -> bool:
+        """
+        إنهاء الترميز وانتظار كتابة الملف
+
+        Returns:
+            True إذا اكتمل الملف بنجاح
+        """
+        if self.process is None:
+            return False
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self.process = None
+        if returncode != 0:
+            self._stderr.seek(0)
+            message = self._stderr.read().decode(errors='replace').strip()
+            logger.error(f"Error encoding video with ffmpeg: {message}")
+        self._stderr.close()
+        return returncode == 0
+
+class OpenCVVideoWriter:
+    """كاتب فيديو OpenCV (mp4v) بنفس واجهة FFmpegVideoWriter"""
+
+    def __init__(self, output_path: str, fps: float, size: Tuple[int, int]):
+        self.output_path = output_path
+        self.size = tuple(size)
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'),
+                                      fps if fps > 0 else 30.0, self.size)
+
+    def isOpened(self) -> bool:
+        return self.writer.isOpened()
+
+    def write(self, frame: np.ndarray):
+        if (frame.shape[1], frame.shape[0]) != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        self.writer.write(frame)
+
+    def release(self) -> bool:
+        opened = self.writer.isOpened()
+        self.writer.release()
+        return opened
+
+def open_video_writer(output_path: str, fps: float, size: Tuple[int, int], encoder: str = 'auto',
+                      crf: int = 23, preset: str = 'veryfast', threads: int = 0):
+    """
+    فتح كاتب فيديو بالمرمز المطلوب
+
+    Args:
+        output_path: مسار ملف MP4
+        fps: معدل الإطارات
+        size: أبعاد الإطارات (العرض، الارتفاع)
+        encoder: auto (ffmpeg إن وجد) أو ffmpeg أو opencv
+        crf: جودة ترميز H.264
+        preset: سرعة ترميز H.264
+        threads: خيوط الترميز لـ ffmpeg (0 = تلقائي)
+
+    Returns:
+        كاتب بواجهة cv2.VideoWriter
+    """
+    if encoder not in VIDEO_ENCODERS:
+        raise ValueError(f"Unknown video encoder: {encoder}. Available: {', '.join(VIDEO_ENCODERS)}")
+
+    if encoder != 'opencv':
+        if ffmpeg_path():
+            return FFmpegVideoWriter(output_path, fps, size, crf=crf, preset=preset, threads=threads)
+        if encoder == 'ffmpeg':
+            logger.warning("ffmpeg not found, falling back to OpenCV encoding")
+
+    return OpenCVVideoWriter(output_path, fps, size)
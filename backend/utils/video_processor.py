@@ -8,6 +8,8 @@ from pathlib import Path
 import subprocess
 import shutil
 
+from utils.video_decoder import open_video, probe_video
+
 logger = logging.getLogger(__name__)
 
 class VideoProcessor:
@@ -15,11 +17,19 @@ class VideoProcessor:
     معالج الفيديو لاستخراج المعلومات ومعالجة الفيديوهات
     """
     
-    def __init__(self):
-        """تهيئة معالج الفيديو"""
+    def __init__(self, decoder: str = "auto", decoder_threads: int = 0):
+        """
+        تهيئة معالج الفيديو
+        
+        Args:
+            decoder: مفكك ترميز الفيديو (auto أو ffmpeg أو opencv)
+            decoder_threads: خيوط فك الترميز لـ ffmpeg (0 = تلقائي)
+        """
         self.supported_formats = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv']
+        self.decoder = decoder
+        self.decoder_threads = decoder_threads
         
-    async def process_video(self, video_path: str) -> Dict:
+    def process_video(self, video_path: str) -> Dict:
         """
         معالجة الفيديو واستخراج المعلومات
         
@@ -268,7 +278,10 @@ class VideoProcessor:
             # Create output directory
             os.makedirs(output_dir, exist_ok=True)
             
-            cap = cv2.VideoCapture(video_path)
+            # Only every interval-th frame leaves the decoder
+            interval = max(1, interval)
+            cap = open_video(video_path, decoder=self.decoder, threads=self.decoder_threads,
+                             every=interval)
             if not cap.isOpened():
                 return []
             
@@ -280,14 +293,13 @@ class VideoProcessor:
                 if not ret:
                     break
                 
-                if frame_count % interval == 0:
-                    # Save frame
-                    frame_filename = f"frame_{frame_count:06d}.jpg"
-                    frame_path = os.path.join(output_dir, frame_filename)
-                    cv2.imwrite(frame_path, frame)
-                    extracted_frames.append(frame_path)
+                # Save frame
+                frame_filename = f"frame_{frame_count:06d}.jpg"
+                frame_path = os.path.join(output_dir, frame_filename)
+                cv2.imwrite(frame_path, frame)
+                extracted_frames.append(frame_path)
                 
-                frame_count += 1
+                frame_count += interval
             
             cap.release()
             
@@ -441,25 +453,22 @@ class VideoProcessor:
             مقاييس الجودة
         """
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
+            info = probe_video(video_path)
+            if info is None:
                 return {}
-            
-            # Sample frames for quality analysis
-            sample_frames = []
-            frame_count = 0
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            total_frames = info["frame_count"]
             sample_interval = max(1, total_frames // 10)  # Sample 10 frames
             
+            # Sample frames for quality analysis (decoded straight to grayscale;
+            # the decoder drops the frames between samples)
+            cap = open_video(video_path, decoder=self.decoder, pix_fmt="gray",
+                             threads=self.decoder_threads, every=sample_interval, buffers=10)
+            sample_frames = []
             while len(sample_frames) < 10:
                 ret, frame = cap.read()
                 if not ret:
                     break
-                
-                if frame_count % sample_interval == 0:
-                    sample_frames.append(frame)
-                
-                frame_count += 1
+                sample_frames.append(frame)
             
             cap.release()
             
@@ -471,8 +480,7 @@ class VideoProcessor:
             
             # Brightness
             brightness_values = []
-            for frame in sample_frames:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            for gray in sample_frames:
                 brightness = np.mean(gray)
                 brightness_values.append(brightness)
             
@@ -481,8 +489,7 @@ class VideoProcessor:
             
             # Sharpness (using Laplacian variance)
             sharpness_values = []
-            for frame in sample_frames:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            for gray in sample_frames:
                 laplacian = cv2.Laplacian(gray, cv2.CV_64F)
                 sharpness = laplacian.var()
                 sharpness_values.append(sharpness)
@@ -492,8 +499,7 @@ class VideoProcessor:
             
             # Contrast
             contrast_values = []
-            for frame in sample_frames:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            for gray in sample_frames:
                 contrast = gray.std()
                 contrast_values.append(contrast)
             
@@ -0,0 +1,531 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from utils.frame_store import load_frame_store
+
+logger = logging.getLogger(__name__)
+
+# Per-process analysis components, created lazily inside each worker
+_worker_registry = None
+_worker_analyzer = None
+_worker_cpu_slice: Optional[Dict] = None
+_worker_video_processor = None
+_worker_barrier = None
+
+# Seconds a warmed-up worker waits for the other workers to check in
+WARMUP_BARRIER_TIMEOUT = 600.0
+
+def _get_registry():
+    """الحصول على سجل النماذج للعملية الحالية"""
+    global _worker_registry
+    if _worker_registry is None:
+        from config import settings
+        from models.registry import ModelRegistry
+        _worker_registry = ModelRegistry(
+            memory_budget_mb=settings.model_memory_budget_mb,
+            warmup_runs=settings.model_warmup_runs
+        )
+    return _worker_registry
+
+def _detector_threads() -> int:
+    """خيوط محرك الكشف: من الإعدادات، أو من شريحة الأنوية المخصصة للعامل"""
+    from config import settings
+    if settings.detector_threads > 0 or _worker_cpu_slice is None:
+        return settings.detector_threads
+    return _worker_cpu_slice["threads"]
+
+def _configured_models() -> List:
+    """مفاتيح النماذج المحددة في الإعدادات"""
+    from config import settings
+    from models.registry import ModelRegistry
+    keys = [ModelRegistry.detector_key(settings.detector_backend, settings.model_path,
+                                       _detector_threads())]
+    if settings.tracker == "deepsort":
+        keys.append(ModelRegistry.embedder_key())
+    return keys
+
+def warm_up_models() -> Dict:
+    """
+    تحميل النماذج المحددة وإحماؤها في العملية الحالية
+
+    Returns:
+        حالة سجل النماذج وشريحة الأنوية المطبقة
+    """
+    status = _get_registry().preload(_configured_models())
+    status["cpu"] = _worker_cpu_slice
+    return status
+
+def warm_up_worker(timeout: float = WARMUP_BARRIER_TIMEOUT) -> Dict:
+    """
+    إحماء نماذج عامل ثم انتظار وصول جميع العمال (مهمة حالة في warm_up)
+
+    A worker held at the shared barrier cannot take another status task,
+    so the status tasks of one warm-up always land on different processes
+    and return only once every worker has loaded its models.
+
+    Args:
+        timeout: أقصى انتظار لبقية العمال بالثواني
+
+    Returns:
+        حالة سجل النماذج للعملية الحالية
+    """
+    try:
+        return warm_up_models()
+    finally:
+        # Also after a failed load, so the other workers are not held
+        if _worker_barrier is not None:
+            try:
+                _worker_barrier.wait(timeout)
+            except threading.BrokenBarrierError:
+                logger.error("Not all analysis workers checked in before the warm-up timeout")
+
+def _apply_worker_cpu_slice(cpu_slice: Dict, pin: bool):
+    """تطبيق شريحة الأنوية على العملية الحالية"""
+    global _worker_cpu_slice
+    from utils.cpu_budget import apply_cpu_slice
+    applied = apply_cpu_slice(cpu_slice["cores"], cpu_slice["threads"], pin=pin)
+    _worker_cpu_slice = {"job": cpu_slice["job"], **applied}
+
+def _init_worker(slot_counter=None, cpu_plan: Optional[Dict] = None, pin_cores: bool = True,
+                 preload_models: bool = False, barrier=None):
+    """
+    تهيئة عملية العامل: حجز شريحة أنوية ثم إحماء النماذج قبل أول مهمة
+
+    Args:
+        slot_counter: عداد مشترك يمنح كل عملية رقم شريحة مختلفاً
+        cpu_plan: خطة توزيع الأنوية (None = بدون تقسيم)
+        pin_cores: تثبيت العملية على أنوية شريحتها
+        preload_models: إحماء النماذج
+        barrier: حاجز مشترك بين جميع العمال لمهام الإحماء (warm_up_worker)
+    """
+    global _worker_barrier
+    _worker_barrier = barrier
+    if cpu_plan is not None and slot_counter is not None:
+        try:
+            with slot_counter.get_lock():
+                slot = slot_counter.value
+                slot_counter.value += 1
+            slices = cpu_plan["slices"]
+            _apply_worker_cpu_slice(slices[slot % len(slices)], pin_cores)
+        except Exception as e:
+            logger.error(f"Error applying CPU slice: {str(e)}")
+
+    if preload_models:
+        try:
+            warm_up_models()
+        except Exception as e:
+            # Reported by the readiness check, which retries the load
+            logger.error(f"Error warming up worker models: {str(e)}")
+
+def _get_analyzer():
+    """الحصول على محلل العامل الحالي (يُنشأ مرة واحدة لكل عملية)"""
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        from config import settings
+        from models.analyzer import SpermAnalyzer
+        _worker_analyzer = SpermAnalyzer(
+            model_path=settings.model_path,
+            detector_backend=settings.detector_backend,
+            detector_threads=_detector_threads(),
+            tracker=settings.tracker,
+            frame_spill_rows=settings.frame_spill_rows,
+            frame_spill_dir=settings.frame_spill_dir,
+            registry=_get_registry(),
+            auto_resolution=settings.auto_resolution,
+            video_decoder=settings.video_decoder,
+            decoder_threads=settings.decoder_threads,
+            video_encoder=settings.video_encoder
+        )
+    return _worker_analyzer
+
+def _get_video_processor():
+    """الحصول على معالج الفيديو للعامل الحالي"""
+    global _worker_video_processor
+    if _worker_video_processor is None:
+        from config import settings
+        from utils.video_processor import VideoProcessor
+        _worker_video_processor = VideoProcessor(decoder=settings.video_decoder,
+                                                 decoder_threads=settings.decoder_threads)
+    return _worker_video_processor
+
+def run_video_processing(video_path: str) -> Dict:
+    """
+    استخراج معلومات الفيديو (تعمل داخل مجمع الإدخال/الإخراج)
+
+    Args:
+        video_path: مسار الفيديو
+
+    Returns:
+        معلومات الفيديو
+    """
+    return _get_video_processor().process_video(video_path)
+
+def run_video_analysis(video_path: str, parameters: Dict, frames_path: Optional[str] = None,
+                       render_path: Optional[str] = None, raw_path: Optional[str] = None) -> Dict:
+    """
+    تشغيل تحليل الذكاء الاصطناعي (تعمل داخل عملية عامل)
+
+    Args:
+        video_path: مسار الفيديو
+        parameters: معاملات التحليل
+        frames_path: مسار حفظ نتائج الإطارات (.npz)
+        render_path: مسار الفيديو المرسوم (.mp4) أو None
+        raw_path: مسار حفظ الكشوفات الخام (.npz) أو None
+
+    Returns:
+        نتائج التحليل
+    """
+    return _get_analyzer().analyze_video(video_path, parameters, frames_path=frames_path,
+                                         render_path=render_path, raw_path=raw_path)
+
+def run_reanalysis(raw_path: str, parameters: Dict, frames_path: Optional[str] = None) -> Dict:
+    """
+    إعادة حساب النتائج من الكشوفات الخام (تعمل داخل مجمع الإدخال/الإخراج)
+
+    Args:
+        raw_path: مسار ملف النتائج الخام (.npz)
+        parameters: معاملات التحليل
+        frames_path: مسار حفظ نتائج الإطارات (.npz)
+
+    Returns:
+        نتائج التحليل
+    """
+    return _get_analyzer().reanalyze(raw_path, parameters, frames_path=frames_path)
+
+def open_live_session(parameters: Dict, track_window: int = 300):
+    """
+    جلسة تحليل لبث مباشر في العملية الحالية (مدير سياق)
+
+    Live streams keep their session between frames, so they run in the API
+    process with its own analyzer and model registry.
+
+    Args:
+        parameters: معاملات التحليل
+        track_window: عدد الإطارات الأخيرة المحفوظة في سجل المسارات
+
+    Returns:
+        مدير سياق يعطي الجلسة
+    """
+    return _get_analyzer().live_session(parameters, track_window=track_window)
+
+def prepare_segment_analysis(video_path: str, parameters: Dict) -> List[Dict]:
+    """
+    تخطيط مقاطع الفيديو (تعمل داخل عملية عامل)
+
+    Args:
+        video_path: مسار الفيديو
+        parameters: معاملات التحليل
+
+    Returns:
+        قائمة المقاطع
+    """
+    return _get_analyzer().prepare_segments(video_path, parameters)
+
+def run_segment_analysis(video_path: str, parameters: Dict, segment: Dict) -> Dict:
+    """
+    كشف مقطع من الفيديو (تعمل داخل عملية عامل)
+
+    Args:
+        video_path: مسار الفيديو
+        parameters: معاملات التحليل
+        segment: المقطع
+
+    Returns:
+        نتيجة المقطع
+    """
+    return _get_analyzer().analyze_segment(video_path, parameters, segment)
+
+def merge_segment_analysis(parameters: Dict, results: List[Dict], frames_path: Optional[str] = None,
+                           elapsed: Optional[float] = None, raw_path: Optional[str] = None) -> Dict:
+    """
+    دمج نتائج المقاطع (تعمل داخل عملية عامل)
+
+    Args:
+        parameters: معاملات التحليل
+        results: نتائج المقاطع
+        frames_path: مسار حفظ نتائج الإطارات (.npz)
+        elapsed: الزمن الكلي للتحليل
+        raw_path: مسار حفظ الكشوفات الخام (.npz) أو None
+
+    Returns:
+        نتائج التحليل
+    """
+    return _get_analyzer().merge_segment_results(parameters, results, frames_path=frames_path,
+                                                 elapsed=elapsed, raw_path=raw_path)
+
+def write_json(path: str, data: Dict):
+    """
+    كتابة ملف JSON (تعمل داخل مجمع الإدخال/الإخراج)
+
+    Args:
+        path: مسار الملف
+        data: البيانات
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def read_json(path: str) -> Dict:
+    """
+    قراءة ملف JSON (تعمل داخل مجمع الإدخال/الإخراج)
+
+    Args:
+        path: مسار الملف
+
+    Returns:
+        البيانات
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def read_results(path: str) -> Dict:
+    """
+    قراءة نتائج تحليل مع نتائج الإطارات والسلسلة الزمنية (تعمل داخل مجمع الإدخال/الإخراج)
+
+    The JSON results hold no per-frame data; the records are built here
+    from the frames file, only for the request that asks for them.
+    Results without a frames file (summary only, older analyses) keep
+    what the JSON holds.
+
+    Args:
+        path: مسار ملف النتائج
+
+    Returns:
+        النتائج الكاملة
+    """
+    results = read_json(path)
+    frame_store = load_frame_store(results.get("frames_path"))
+    if frame_store is not None:
+        results["detections"] = frame_store.to_records()
+        results["time_series"] = frame_store.time_series()
+    else:
+        results.setdefault("detections", [])
+        results.setdefault("time_series", [])
+    return results
+
+class AnalysisWorkerPool:
+    """
+    مجمع عمال لتشغيل التحليلات خارج حلقة الأحداث
+
+    CPU-bound analysis runs in a process pool (or a thread pool when
+    configured), blocking I/O runs in a separate thread pool, and the
+    event loop only awaits the returned futures. With a CPU plan each
+    process worker claims its own slice of cores at startup.
+    """
+
+    def __init__(self, max_workers: int = 2, executor_type: str = "process",
+                 io_workers: int = 4, preload_models: bool = False,
+                 cpu_plan: Optional[Dict] = None, pin_cores: bool = True,
+                 live_workers: int = 2):
+        """
+        تهيئة مجمع العمال
+
+        Args:
+            max_workers: عدد عمال التحليل (يُتجاهل مع خطة الأنوية)
+            executor_type: نوع المنفذ (process أو thread)
+            io_workers: عدد خيوط الإدخال/الإخراج
+            preload_models: إحماء النماذج عند بدء كل عملية عامل
+            cpu_plan: خطة توزيع الأنوية (plan_cpu_budget) أو None
+            pin_cores: تثبيت كل عملية عامل على أنوية شريحتها
+            live_workers: عدد البثوث المباشرة المحللة في نفس الوقت
+        """
+        if executor_type not in ("process", "thread"):
+            raise ValueError(f"Unsupported executor type: {executor_type}")
+
+        if cpu_plan is not None:
+            max_workers = cpu_plan["jobs"]
+        self.max_workers = max(1, int(max_workers))
+        self.cpu_plan = cpu_plan
+        self.pin_cores = pin_cores
+        self.worker_status: List[Dict] = []
+        self.executor_type = executor_type
+        self.io_workers = max(1, int(io_workers))
+        self.preload_models = preload_models
+        self.analysis_executor: Optional[Executor] = None
+        self.io_executor: Optional[Executor] = None
+        self.live_workers = max(1, int(live_workers))
+        self.live_executor: Optional[Executor] = None
+        self.warmup_barrier = None
+
+    @property
+    def workers_ready(self) -> bool:
+        """هل أبلغ كل عامل تحليل عن جاهزية نماذجه"""
+        expected = self.max_workers if self.executor_type == "process" else 1
+        return len(self.worker_status) >= expected
+
+    def start(self):
+        """إنشاء المنفذين"""
+        if self.analysis_executor is not None:
+            return
+
+        if self.executor_type == "process":
+            # spawn keeps torch/OpenCV thread state of the API process out of the workers
+            context = multiprocessing.get_context("spawn")
+            self.warmup_barrier = context.Barrier(self.max_workers)
+            self.analysis_executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(context.Value("i", 0), self.cpu_plan, self.pin_cores,
+                          self.preload_models, self.warmup_barrier)
+            )
+        else:
+            # Thread workers share the process: size its thread pools to one
+            # slice, without pinning
+            if self.cpu_plan is not None:
+                threads = self.cpu_plan["slices"][0]["threads"]
+                _apply_worker_cpu_slice({"job": None, "cores": None, "threads": threads}, False)
+            self.analysis_executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="analysis"
+            )
+
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=self.io_workers,
+            thread_name_prefix="analysis-io"
+        )
+        # One thread per live stream: a stream never waits behind file jobs
+        self.live_executor = ThreadPoolExecutor(
+            max_workers=self.live_workers,
+            thread_name_prefix="analysis-live"
+        )
+
+        logger.info(f"Analysis worker pool started: {self.max_workers} {self.executor_type} workers")
+
+    async def run_analysis(self, func: Callable, *args, **kwargs):
+        """
+        تشغيل مهمة تحليل في مجمع العمال
+
+        Args:
+            func: الدالة (يجب أن تكون قابلة للتسلسل في وضع العمليات)
+            args: معاملات الدالة
+
+        Returns:
+            نتيجة الدالة
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.analysis_executor, partial(func, *args, **kwargs))
+
+    async def run_segmented_analysis(self, video_path: str, parameters: Dict,
+                                     frames_path: Optional[str] = None,
+                                     raw_path: Optional[str] = None) -> Dict:
+        """
+        تحليل فيديو طويل بتوزيع مقاطعه الزمنية على عمال التحليل
+
+        Detection in every segment is an independent task, so idle workers
+        (each with its own core slice) share one long video; planning (with
+        the motion gate scan) and the merge, which tracks all detections in
+        order, also run in a worker to keep the event loop free.
+
+        Args:
+            video_path: مسار الفيديو
+            parameters: معاملات التحليل (segments = عدد المقاطع)
+            frames_path: مسار حفظ نتائج الإطارات (.npz)
+            raw_path: مسار حفظ الكشوفات الخام (.npz) أو None
+
+        Returns:
+            نتائج التحليل
+        """
+        plan = await self.run_analysis(prepare_segment_analysis, video_path, parameters)
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*[
+            self.run_analysis(run_segment_analysis, video_path, parameters, segment)
+            for segment in plan
+        ])
+        return await self.run_analysis(merge_segment_analysis, parameters, list(results),
+                                       frames_path, time.perf_counter() - start_time, raw_path)
+
+    async def run_io(self, func: Callable, *args, **kwargs):
+        """
+        تشغيل مهمة إدخال/إخراج حاجبة في مجمع الخيوط
+
+        Args:
+            func: الدالة
+            args: معاملات الدالة
+
+        Returns:
+            نتيجة الدالة
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, partial(func, *args, **kwargs))
+
+    async def run_live(self, func: Callable, *args, **kwargs):
+        """
+        تشغيل خطوة بث مباشر في خيوط البث
+
+        Args:
+            func: الدالة
+            args: معاملات الدالة
+
+        Returns:
+            نتيجة الدالة
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.live_executor, partial(func, *args, **kwargs))
+
+    async def warm_up(self) -> List[Dict]:
+        """
+        انتظار جاهزية النماذج في جميع عمال التحليل
+
+        Process workers warm up in their initializer; one status task per
+        worker makes the pool start them all. Each task waits at a shared
+        barrier until every worker has checked in, so no process answers
+        twice while another is still loading. Thread workers share the
+        registry of the API process. workers_ready tells whether every
+        worker reported (a worker missing the barrier timeout does not).
+
+        Returns:
+            حالة سجل النماذج لكل عملية
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self.executor_type == "process":
+            if self.warmup_barrier.broken:
+                self.warmup_barrier.reset()
+            futures = [loop.run_in_executor(self.analysis_executor, warm_up_worker)
+                       for _ in range(self.max_workers)]
+            statuses = await asyncio.gather(*futures)
+        else:
+            statuses = [await loop.run_in_executor(self.io_executor, warm_up_models)]
+
+        # After a barrier timeout several tasks may have run on one process
+        self.worker_status = list({status["pid"]: status for status in statuses}.values())
+        return self.worker_status
+
+    def cpu_report(self) -> Dict:
+        """
+        خطة الأنوية والشرائح المطبقة في العمال
+
+        Returns:
+            قاموس الخطة
+        """
+        return {
+            "executor": self.executor_type,
+            "workers": self.max_workers,
+            "pinning": self.pin_cores and self.executor_type == "process",
+            "plan": self.cpu_plan,
+            "applied": [status.get("cpu") for status in self.worker_status]
+        }
+
+    def shutdown(self, wait: bool = True):
+        """إيقاف المنفذين"""
+        if self.analysis_executor is not None:
+            self.analysis_executor.shutdown(wait=wait, cancel_futures=True)
+            self.analysis_executor = None
+        if self.io_executor is not None:
+            self.io_executor.shutdown(wait=wait)
+            self.io_executor = None
+        if self.live_executor is not None:
+            self.live_executor.shutdown(wait=wait)
+            self.live_executor = None
+
+        logger.info("Analysis worker pool stopped")
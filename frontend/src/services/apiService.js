@@ -186,6 +186,33 @@ class ApiService {
     }
   }
 
+  /**
+   * Open a live analysis stream for camera frames
+   * Send frames with socket.send(jpegArrayBuffer) and stop with
+   * socket.send(JSON.stringify({ type: 'stop' })).
+   * @param {object} options - Stream options (format, fps, width, height, parameters)
+   * @param {function} onMessage - Called with every server message (ready, metrics, summary, error)
+   */
+  openLiveAnalysis(options = {}, onMessage = null) {
+    const baseURL = api.defaults.baseURL || getBaseURL();
+    const socket = new WebSocket(`${baseURL.replace(/^http/, 'ws')}/ws/live`);
+    socket.binaryType = 'arraybuffer';
+
+    socket.onopen = () => {
+      socket.send(JSON.stringify({ format: 'jpeg', fps: 30, ...options }));
+    };
+    socket.onmessage = (event) => {
+      if (onMessage) {
+        onMessage(JSON.parse(event.data));
+      }
+    };
+    socket.onerror = (error) => {
+      console.error('Live analysis error:', error.message || error);
+    };
+
+    return socket;
+  }
+
   /**
    * Poll analysis status until completion
    * @param {string} analysisId - The analysis ID
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+INT8 Post-Training Quantization for the Sperm Detector
+تكميم نموذج كشف الحيوانات المنوية إلى INT8 بعد التدريب
+"""
+
+import os
+import sys
+import json
+import argparse
+import logging
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Reuse the backend video processing and analysis code
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from models.analyzer import SpermAnalyzer
+from models.detectors import OnnxRuntimeDetector, OnnxInt8Detector
+from utils.video_processor import VideoProcessor
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+
+def find_videos(videos_dir):
+    """
+    List videos in a directory (e.g. backend/uploads) in a stable order
+
+    Args:
+        videos_dir: Directory to scan
+    """
+    return sorted(
+        str(path) for path in Path(videos_dir).iterdir()
+        if path.suffix.lower() in VIDEO_EXTENSIONS
+    )
+
+def split_videos(videos, holdout_every=5):
+    """
+    Split videos deterministically into calibration and held-out sets
+
+    Args:
+        videos: List of video paths
+        holdout_every: Every N-th video is held out for evaluation
+    """
+    calibration = [v for i, v in enumerate(videos) if (i + 1) % holdout_every != 0]
+    holdout = [v for i, v in enumerate(videos) if (i + 1) % holdout_every == 0]
+    return calibration, holdout
+
+def collect_calibration_frames(videos, output_dir, interval=30, max_frames=300):
+    """
+    Sample calibration frames from videos with VideoProcessor.extract_frames
+
+    Args:
+        videos: Calibration videos
+        output_dir: Directory for the extracted frames
+        interval: Extract every N-th frame
+        max_frames: Maximum number of calibration frames
+    """
+    video_processor = VideoProcessor()
+    frames = []
+
+    for video_path in videos:
+        video_dir = os.path.join(output_dir, Path(video_path).stem)
+        frames.extend(video_processor.extract_frames(video_path, video_dir, interval=interval))
+        if len(frames) >= max_frames:
+            break
+
+    logger.info(f"Collected {len(frames[:max_frames])} calibration frames from {len(videos)} videos")
+    return frames[:max_frames]
+
+def quantize_detector(weights, calibration_frames, imgsz=640):
+    """
+    Produce an INT8 ONNX model stored next to the weights as <name>_int8.onnx
+
+    Args:
+        weights: Path to the FP32 .pt weights
+        calibration_frames: Paths to calibration images
+        imgsz: Model input size
+    """
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    if not calibration_frames:
+        raise ValueError("No calibration frames available")
+
+    fp32_detector = OnnxRuntimeDetector(model_path=weights, imgsz=imgsz)
+    fp32_model = fp32_detector.export_model(weights)
+    int8_model = OnnxInt8Detector(model_path=weights).quantized_path(weights)
+
+    class FrameCalibrationReader(CalibrationDataReader):
+        """Feeds letterboxed calibration frames to the ONNX calibrator"""
+
+        def __init__(self, input_name):
+            self.input_name = input_name
+            self.frame_paths = iter(calibration_frames)
+
+        def get_next(self):
+            for frame_path in self.frame_paths:
+                frame = cv2.imread(frame_path)
+                if frame is not None:
+                    batch, _ = fp32_detector.preprocess([frame])
+                    return {self.input_name: batch}
+            return None
+
+    # Shape inference and graph cleanup improve quantization coverage
+    preprocessed_model = fp32_model.with_name(f"{fp32_model.stem}_preprocessed.onnx")
+    quant_pre_process(str(fp32_model), str(preprocessed_model), skip_symbolic_shape=True)
+
+    import onnx
+    input_name = onnx.load(str(preprocessed_model)).graph.input[0].name
+
+    logger.info(f"Quantizing {fp32_model} with {len(calibration_frames)} calibration frames...")
+    quantize_static(
+        str(preprocessed_model),
+        str(int8_model),
+        FrameCalibrationReader(input_name),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+    preprocessed_model.unlink()
+
+    logger.info(f"INT8 model saved to: {int8_model}")
+    return int8_model
+
+def analyze_with_backend(weights, backend, video_path):
+    """
+    Run the full analysis of one video with the given detector backend
+
+    Args:
+        weights: Path to the .pt weights
+        backend: Detector backend name
+        video_path: Video to analyze
+    """
+    analyzer = SpermAnalyzer(model_path=weights, detector_backend=backend)
+    return analyzer.analyze_video(video_path)
+
+def compare_models(weights, holdout_videos, fp32_backend='onnx', tolerance=0.05):
+    """
+    Compare detection counts and motility summary of the FP32 and INT8 models
+
+    Args:
+        weights: Path to the .pt weights
+        holdout_videos: Held-out evaluation videos
+        fp32_backend: Backend used as the FP32 reference
+        tolerance: Maximum accepted relative difference
+    """
+    videos_report = []
+
+    for video_path in holdout_videos:
+        fp32 = analyze_with_backend(weights, fp32_backend, video_path)
+        int8 = analyze_with_backend(weights, 'onnx-int8', video_path)
+
+        fp32_counts = np.array([frame['detections'] for frame in fp32['detections']], dtype=float)
+        int8_counts = np.array([frame['detections'] for frame in int8['detections']], dtype=float)
+        frames = min(len(fp32_counts), len(int8_counts))
+        count_error = np.abs(fp32_counts[:frames] - int8_counts[:frames]).sum()
+        relative_count_error = count_error / max(fp32_counts[:frames].sum(), 1.0)
+
+        summary_delta = {}
+        for key in ['total_sperm_detected', 'average_sperm_count',
+                    'average_motility_percentage', 'average_velocity']:
+            reference = float(fp32['summary'][key])
+            candidate = float(int8['summary'][key])
+            difference = abs(candidate - reference)
+            summary_delta[key] = {
+                'fp32': reference,
+                'int8': candidate,
+                'relative_difference': difference / abs(reference) if reference else difference
+            }
+
+        fp32_fps = fp32['performance']['frames_per_second']
+        int8_fps = int8['performance']['frames_per_second']
+
+        videos_report.append({
+            'video': video_path,
+            'frames': frames,
+            'relative_detection_count_error': round(float(relative_count_error), 4),
+            'summary': summary_delta,
+            'fp32_frames_per_second': fp32_fps,
+            'int8_frames_per_second': int8_fps,
+            'speedup': round(int8_fps / fp32_fps, 2) if fp32_fps else 0
+        })
+
+    worst_error = max(
+        [v['relative_detection_count_error'] for v in videos_report] +
+        [d['relative_difference'] for v in videos_report for d in v['summary'].values()],
+        default=0.0
+    )
+
+    return {
+        'fp32_backend': fp32_backend,
+        'tolerance': tolerance,
+        'worst_relative_difference': round(float(worst_error), 4),
+        'mean_speedup': round(float(np.mean([v['speedup'] for v in videos_report])), 2)
+        if videos_report else 0,
+        'accepted': bool(worst_error <= tolerance),
+        'videos': videos_report
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization of the sperm detector")
+    parser.add_argument('--weights', type=str, default='yolov8n.pt', help='FP32 model weights')
+    parser.add_argument('--videos-dir', type=str, default='../backend/uploads', help='Uploaded videos directory')
+    parser.add_argument('--holdout-every', type=int, default=5, help='Hold out every N-th video')
+    parser.add_argument('--frames-dir', type=str, default='calibration_frames', help='Calibration frames directory')
+    parser.add_argument('--interval', type=int, default=30, help='Sample every N-th frame')
+    parser.add_argument('--max-frames', type=int, default=300, help='Maximum calibration frames')
+    parser.add_argument('--imgsz', type=int, default=640, help='Image size')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='Accepted relative difference')
+    parser.add_argument('--report', type=str, default='quantization_report.json', help='Report output path')
+    parser.add_argument('--skip-quantize', action='store_true', help='Only evaluate an existing INT8 model')
+
+    args = parser.parse_args()
+
+    videos = find_videos(args.videos_dir)
+    if not videos:
+        logger.error(f"No videos found in {args.videos_dir}")
+        return
+
+    calibration_videos, holdout_videos = split_videos(videos, args.holdout_every)
+    logger.info(f"{len(calibration_videos)} calibration videos, {len(holdout_videos)} held-out videos")
+
+    if not args.skip_quantize:
+        frames = collect_calibration_frames(calibration_videos, args.frames_dir,
+                                            args.interval, args.max_frames)
+        quantize_detector(args.weights, frames, args.imgsz)
+
+    if not holdout_videos:
+        logger.warning("No held-out videos, skipping the FP32/INT8 comparison")
+        return
+
+    report = compare_models(args.weights, holdout_videos, tolerance=args.tolerance)
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    verdict = "ACCEPT" if report['accepted'] else "REJECT"
+    logger.info(f"{verdict}: worst relative difference {report['worst_relative_difference']}, "
+                f"mean speedup {report['mean_speedup']}x (report: {args.report})")
+
+if __name__ == "__main__":
+    main()